@@ -25,3 +25,41 @@ SQLITE_PATH = resolve_sqlite_path(
 OLLAMA_BASE_URL = get_env("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = get_env("OLLAMA_MODEL", "mistral")
 RETRIEVAL_MIN_SCORE = int(get_env("RETRIEVAL_MIN_SCORE", "1"))
+RETRIEVAL_ENGINE = get_env("RETRIEVAL_ENGINE", "lexical").lower()
+EMBEDDING_PROVIDER = get_env("EMBEDDING_PROVIDER", "hashing").lower()
+EMBEDDING_MODEL = get_env("EMBEDDING_MODEL", "nomic-embed-text")
+EMBEDDING_DIM = int(get_env("EMBEDDING_DIM", "256"))
+EMBEDDING_BATCH_SIZE = int(get_env("EMBEDDING_BATCH_SIZE", "256"))
+VECTOR_MIN_SIMILARITY = float(get_env("VECTOR_MIN_SIMILARITY", "0.2"))
+VECTOR_IVF_MIN_ROWS = int(get_env("VECTOR_IVF_MIN_ROWS", "20000"))
+VECTOR_IVF_PROBES = int(get_env("VECTOR_IVF_PROBES", "8"))
+HYBRID_RRF_K = int(get_env("HYBRID_RRF_K", "60"))
+HYBRID_CANDIDATES = int(get_env("HYBRID_CANDIDATES", "30"))
+INGEST_CHUNK_SIZE = int(get_env("INGEST_CHUNK_SIZE", "50000"))
+INGEST_WORKERS = int(get_env("INGEST_WORKERS", "2"))
+DB_POOL_SIZE = int(get_env("DB_POOL_SIZE", "8"))
+SQLITE_JOURNAL_MODE = get_env("SQLITE_JOURNAL_MODE", "WAL").upper()
+SQLITE_SYNCHRONOUS = get_env("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_SIZE_KB = int(get_env("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(get_env("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(get_env("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+OLLAMA_TIMEOUT_SECONDS = float(get_env("OLLAMA_TIMEOUT_SECONDS", "120"))
+OLLAMA_MAX_CONNECTIONS = int(get_env("OLLAMA_MAX_CONNECTIONS", "10"))
+OLLAMA_KEEP_ALIVE = get_env("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_PREWARM = get_env("OLLAMA_PREWARM", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_MAX_ENTRIES = int(get_env("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_TTL_SECONDS = float(get_env("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_PERSIST = get_env("ANSWER_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+ROW_CACHE_BUDGET_MB = int(get_env("ROW_CACHE_BUDGET_MB", "256"))
+FRAME_CACHE_MAX_DATASETS = int(get_env("FRAME_CACHE_MAX_DATASETS", "4"))
+LEXICAL_SCORER = get_env("LEXICAL_SCORER", "matrix").lower()
+COLUMNAR_STORAGE = get_env("COLUMNAR_STORAGE", "false").lower() in ("1", "true", "yes")
+CONTEXT_TOKEN_BUDGET = int(get_env("CONTEXT_TOKEN_BUDGET", "1024"))
+CONTEXT_MAX_ROWS = int(get_env("CONTEXT_MAX_ROWS", "20"))
+CHAT_BATCH_MAX_QUESTIONS = int(get_env("CHAT_BATCH_MAX_QUESTIONS", "500"))
+CHAT_BATCH_CONCURRENCY = int(get_env("CHAT_BATCH_CONCURRENCY", "4"))
+FEDERATED_MAX_DATASETS = int(get_env("FEDERATED_MAX_DATASETS", "50"))
+FEDERATED_RETRIEVAL_WORKERS = int(get_env("FEDERATED_RETRIEVAL_WORKERS", "8"))
+LLM_MAX_IN_FLIGHT = int(get_env("LLM_MAX_IN_FLIGHT", "2"))
+LLM_MAX_QUEUE = int(get_env("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(get_env("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
@@ -1,11 +1,15 @@
+import threading
 import time
 
 from fastapi import FastAPI
 from fastapi import Request
 
+from app.config import OLLAMA_PREWARM
 from app.logging_config import configure_logging, get_logger
-from app.routes import chat, health, ingest
-from app.services.db import init_db
+from app.routes import chat, health, ingest, metrics as metrics_routes
+from app.services.db import close_connections, init_db
+from app.services.llm import close_llm_clients, prewarm_model
+from app.services.metrics import metrics
 
 configure_logging()
 logger = get_logger(__name__)
@@ -16,9 +20,17 @@ app = FastAPI(title="Local Dataset AI Assistant API", version="0.1.0")
 @app.on_event("startup")
 def startup() -> None:
     init_db()
+    if OLLAMA_PREWARM:
+        threading.Thread(target=prewarm_model, name="ollama-prewarm", daemon=True).start()
     logger.info("Application started and database initialized.")
 
 
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await close_llm_clients()
+    close_connections()
+
+
 @app.middleware("http")
 async def request_logger(request: Request, call_next):
     start = time.perf_counter()
@@ -27,17 +39,22 @@ async def request_logger(request: Request, call_next):
     except Exception:
         logger.exception("Unhandled error during request %s %s", request.method, request.url.path)
         raise
-    duration_ms = (time.perf_counter() - start) * 1000
+    duration = time.perf_counter() - start
+    # Label by route template so ids in paths do not create a series per request.
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.observe("http_request_duration_seconds", duration, method=request.method, route=route)
+    metrics.inc("http_requests_total", method=request.method, route=route, status=str(response.status_code))
     logger.info(
         "Request %s %s -> %s (%.2fms)",
         request.method,
         request.url.path,
         response.status_code,
-        duration_ms,
+        duration * 1000,
     )
     return response
 
 
 app.include_router(health.router, tags=["health"])
+app.include_router(metrics_routes.router, tags=["metrics"])
 app.include_router(ingest.router, prefix="/api", tags=["ingest"])
 app.include_router(chat.router, prefix="/api", tags=["chat"])
@@ -1,56 +1,397 @@
+import json
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from itertools import accumulate
+from typing import Annotated, AsyncIterator
+
+import pandas as pd
+
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
 
+from app.config import (
+    CHAT_BATCH_CONCURRENCY,
+    CHAT_BATCH_MAX_QUESTIONS,
+    CONTEXT_MAX_ROWS,
+    FEDERATED_MAX_DATASETS,
+    OLLAMA_MODEL,
+)
 from app.logging_config import get_logger
-from app.services.db import dataset_exists, get_latest_dataset_id, init_db
-from app.services.llm import answer_from_context
-from app.services.retrieval import build_context, retrieve_relevant_rows
+from app.services.answer_cache import answer_cache, make_cache_key
+from app.services.context_packer import PackedContext, pack_context
+from app.services.db import (
+    dataset_exists,
+    fetch_dataset_names,
+    fetch_rows_by_index,
+    get_latest_dataset_id,
+    list_dataset_ids_by_tag,
+)
+from app.services.inverted_index import normalize_value
+from app.services.llm import (
+    LLMBusyError,
+    answer_from_context,
+    llm_scheduler,
+    stream_answer_from_context,
+)
+from app.services.metrics import collect_timings, metrics, stage
+from app.services.query_planner import (
+    AggregateAnswer,
+    answer_aggregate,
+    load_dataset_frame,
+    may_plan_aggregate,
+)
+from app.services.retrieval import question_terms, retrieve_across_datasets, retrieve_relevant_rows
+from app.services.row_cache import row_cache
+from app.services.single_flight import SingleFlight
 
 router = APIRouter()
 logger = get_logger(__name__)
+chat_flights = SingleFlight()
+
+NO_CONTEXT_ANSWER = "I don't know based on the uploaded dataset."
 
 
 class ChatRequest(BaseModel):
     question: str = Field(..., min_length=2)
     dataset_id: str | None = None
+    # Ask across several datasets at once, listed explicitly or by tag.
+    dataset_ids: list[str] | None = Field(None, min_length=1, max_length=FEDERATED_MAX_DATASETS)
+    tag: str | None = None
+    timings: bool = False
+
+
+class ChatBatchRequest(BaseModel):
+    questions: list[Annotated[str, Field(min_length=2)]] = Field(
+        ..., min_length=1, max_length=CHAT_BATCH_MAX_QUESTIONS
+    )
+    dataset_id: str | None = None
+
+
+@dataclass
+class _PendingAnswer:
+    question: str
+    packed: PackedContext
+    sources: list[int]
+    cache_key: str
 
 
 @router.post("/chat")
 def chat(request: ChatRequest) -> dict:
-    init_db()
-    dataset_id = request.dataset_id or get_latest_dataset_id()
-    if not dataset_id:
-        logger.warning("Chat rejected: no dataset available.")
-        raise HTTPException(status_code=400, detail="No dataset found. Upload a dataset first.")
-    if not dataset_exists(dataset_id):
-        logger.warning("Chat rejected: dataset not found dataset_id=%s", dataset_id)
-        raise HTTPException(status_code=404, detail="Dataset not found.")
+    dataset_names = _resolve_federated_datasets(request)
+    if dataset_names is not None:
+        scope = ",".join(dataset_names)
+        answer = partial(_answer_federated, dataset_names, request.question)
+    else:
+        scope = _resolve_dataset_id(request.dataset_id)
+        answer = partial(_answer, scope, request.question)
+    # Identical questions arriving together (e.g. a dashboard refresh) share one
+    # retrieval and one model call instead of queueing duplicates behind each other.
+    key = (scope, normalize_value(request.question), OLLAMA_MODEL)
+    started = time.perf_counter()
+    with collect_timings() as timings:
+        try:
+            response, shared = chat_flights.do(key, answer)
+        except LLMBusyError as exc:
+            raise _busy_http_error(scope, exc) from exc
+    if shared:
+        metrics.inc("chat_answers_total", result="coalesced")
+        logger.info("Chat coalesced with in-flight request dataset_id=%s", scope)
+    response = dict(response)
+    if request.timings:
+        # A coalesced request reports only its total; the stages ran in the leading request.
+        response["timings_ms"] = {
+            **{name: round(seconds * 1000, 3) for name, seconds in timings.items()},
+            "total": round((time.perf_counter() - started) * 1000, 3),
+        }
+    return response
 
-    retrieval = retrieve_relevant_rows(dataset_id, request.question, limit=6)
-    rows = retrieval.rows
-    if not rows:
-        logger.info(
-            "Chat has no relevant rows dataset_id=%s tokens=%s best_score=%s",
-            dataset_id,
-            retrieval.question_tokens,
-            retrieval.best_score,
+
+@router.post("/chat/batch")
+def chat_batch(request: ChatBatchRequest) -> dict:
+    """Answer many questions against one dataset in a single request.
+
+    Retrieval structures (and the aggregate frame, if any question needs it)
+    are loaded once; retrieval runs for every question first, then distinct
+    model calls are dispatched with at most CHAT_BATCH_CONCURRENCY in flight.
+    """
+    started = time.perf_counter()
+    dataset_id = _resolve_dataset_id(request.dataset_id)
+    row_cache.get(dataset_id)
+    frame = None
+    if any(may_plan_aggregate([dataset_id], question) for question in request.questions):
+        frame = load_dataset_frame(dataset_id)
+    prepared = [_prepare_answer(dataset_id, question, frame) for question in request.questions]
+
+    pending = {item.cache_key: item for item in prepared if isinstance(item, _PendingAnswer)}
+    with ThreadPoolExecutor(max_workers=CHAT_BATCH_CONCURRENCY, thread_name_prefix="chat-batch") as executor:
+        completed = dict(
+            zip(pending, executor.map(lambda item: _complete_batch_item(dataset_id, item), pending.values()))
         )
+    results = [
+        {"question": question, **(item if isinstance(item, dict) else completed[item.cache_key])}
+        for question, item in zip(request.questions, prepared)
+    ]
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Chat batch answered dataset_id=%s questions=%s model_calls=%s elapsed=%.2fs",
+        dataset_id,
+        len(results),
+        len(pending),
+        elapsed,
+    )
+    return {
+        "dataset_id": dataset_id,
+        "results": results,
+        "model_calls": len(pending),
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+
+@router.get("/cache/stats")
+def cache_stats() -> dict:
+    return answer_cache.stats()
+
+
+@router.get("/llm/stats")
+def llm_stats() -> dict:
+    return {**llm_scheduler.stats(), "coalescing": chat_flights.stats()}
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """Server-sent events: one `meta` event, `token` events as generated, then `done`."""
+    if request.dataset_ids is not None or request.tag is not None:
+        raise HTTPException(status_code=400, detail="Streaming answers from a single dataset_id only.")
+    dataset_id = await run_in_threadpool(_resolve_dataset_id, request.dataset_id)
+    retrieval = await run_in_threadpool(
+        retrieve_relevant_rows, dataset_id, request.question, CONTEXT_MAX_ROWS
+    )
+    with stage("pack_context"):
+        packed = pack_context(retrieval.rows, request.question, retrieval.filters)
+    sources = [row["row_index"] for row in packed.rows]
+    slot_started = None
+    if packed.rows:
+        try:
+            slot_started = await llm_scheduler.acquire_async()
+        except LLMBusyError as exc:
+            raise _busy_http_error(dataset_id, exc) from exc
+
+    def release_slot() -> None:
+        # Runs from the generator's finally and again as the response's background
+        # task, which also covers a client gone before the first event was sent.
+        nonlocal slot_started
+        if slot_started is not None:
+            started, slot_started = slot_started, None
+            llm_scheduler.release(started)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            yield _sse(
+                "meta",
+                {"dataset_id": dataset_id, "sources": sources, "context": _context_summary(packed)},
+            )
+            if not packed.rows:
+                metrics.inc("chat_answers_total", result="no_context")
+                logger.info("Chat stream has no relevant rows dataset_id=%s", dataset_id)
+                yield _sse("token", {"token": NO_CONTEXT_ANSWER})
+                yield _sse("done", {"reason": "no_relevant_context"})
+                return
+            try:
+                with stage("llm_stream"):
+                    async for token in stream_answer_from_context(request.question, packed.text):
+                        yield _sse("token", {"token": token})
+                metrics.inc("chat_answers_total", result="model")
+            except Exception as exc:
+                metrics.inc("chat_answers_total", result="model_error")
+                logger.exception("Chat stream model call failed dataset_id=%s", dataset_id)
+                yield _sse("error", {"detail": f"Model call failed. {exc}"})
+            release_slot()
+            yield _sse("done", {})
+        finally:
+            release_slot()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release_slot),
+    )
+
+
+def _answer(dataset_id: str, question: str) -> dict:
+    prepared = _prepare_answer(dataset_id, question)
+    if isinstance(prepared, dict):
+        return prepared
+    return _complete_answer(dataset_id, prepared)
+
+
+def _prepare_answer(
+    dataset_id: str, question: str, frame: pd.DataFrame | None = None
+) -> dict | _PendingAnswer:
+    """Answer without the model where possible; otherwise return what the model call needs.
+
+    A "who has the highest ..." question is planned as an aggregate that picks
+    the rows holding the extreme; those rows, not retrieval, become the context.
+    """
+    with stage("aggregate"):
+        aggregate = answer_aggregate(dataset_id, question, frame)
+    if aggregate is not None and not aggregate.plan.select_rows:
+        metrics.inc("chat_answers_total", result="aggregate")
+        return {
+            "answer": aggregate.answer,
+            "dataset_id": dataset_id,
+            "sources": [],
+            "aggregate": _aggregate_summary(aggregate),
+        }
+
+    if aggregate is not None:
+        rows = fetch_rows_by_index(dataset_id, aggregate.row_positions)
+        question_tokens, filters = question_terms(question), aggregate.plan.filters
+    else:
+        retrieval = retrieve_relevant_rows(dataset_id, question, limit=CONTEXT_MAX_ROWS)
+        rows, question_tokens, filters = retrieval.rows, retrieval.question_tokens, retrieval.filters
+    if not rows:
+        metrics.inc("chat_answers_total", result="no_context")
+        logger.info("Chat has no relevant rows dataset_id=%s tokens=%s", dataset_id, question_tokens)
+        return {
+            "answer": NO_CONTEXT_ANSWER,
+            "dataset_id": dataset_id,
+            "sources": [],
+            "reason": "no_relevant_context",
+        }
+
+    with stage("pack_context"):
+        packed = pack_context(rows, question, filters)
+    sources = [row["row_index"] for row in packed.rows]
+    cache_key = make_cache_key(dataset_id, question_tokens, packed.rows, OLLAMA_MODEL)
+    with stage("answer_cache"):
+        cached_answer = answer_cache.get(cache_key)
+    if cached_answer is not None:
+        metrics.inc("chat_answers_total", result="cached")
+        logger.info("Chat answered from cache dataset_id=%s source_rows=%s", dataset_id, sources)
         return {
-            "answer": "I don't know based on the uploaded dataset.",
+            "answer": cached_answer,
             "dataset_id": dataset_id,
+            "sources": sources,
+            "context": _context_summary(packed),
+            "cached": True,
+        }
+    return _PendingAnswer(question=question, packed=packed, sources=sources, cache_key=cache_key)
+
+
+def _answer_federated(dataset_names: dict[str, str], question: str) -> dict:
+    """Answer from several datasets: aggregates run over their union, retrieval fans out per dataset.
+
+    Sources name both the dataset and the row. Answers are not put in the
+    answer cache, whose entries are invalidated per single dataset.
+    """
+    dataset_ids = list(dataset_names)
+    scope = ",".join(dataset_ids)
+    hits: list[tuple[str, dict]] | None = None
+    filters: dict[str, list[str]] = {}
+    if may_plan_aggregate(dataset_ids, question):
+        with stage("aggregate"):
+            frames = [load_dataset_frame(dataset_id) for dataset_id in dataset_ids]
+            aggregate = answer_aggregate(scope, question, pd.concat(frames, ignore_index=True))
+        if aggregate is not None and not aggregate.plan.select_rows:
+            metrics.inc("chat_answers_total", result="aggregate")
+            return {
+                "answer": aggregate.answer,
+                "dataset_ids": dataset_ids,
+                "sources": [],
+                "aggregate": _aggregate_summary(aggregate),
+            }
+        if aggregate is not None:
+            hits = _locate_rows(dataset_ids, [len(frame) for frame in frames], aggregate.row_positions)
+            filters = aggregate.plan.filters
+
+    if hits is None:
+        retrieval = retrieve_across_datasets(dataset_ids, question, limit=CONTEXT_MAX_ROWS)
+        hits, filters = retrieval.hits, retrieval.filters
+    if not hits:
+        metrics.inc("chat_answers_total", result="no_context")
+        logger.info("Federated chat has no relevant rows datasets=%s", scope)
+        return {
+            "answer": NO_CONTEXT_ANSWER,
+            "dataset_ids": dataset_ids,
             "sources": [],
             "reason": "no_relevant_context",
         }
 
-    context = build_context(rows)
+    with stage("pack_context"):
+        packed = pack_context(
+            [row for _, row in hits],
+            question,
+            filters,
+            dataset_names=[_dataset_label(dataset_id, dataset_names[dataset_id]) for dataset_id, _ in hits],
+        )
+    sources = [
+        {"dataset_id": dataset_id, "row_index": row["row_index"]}
+        for dataset_id, row in hits[: len(packed.rows)]
+    ]
+    try:
+        with stage("llm"):
+            answer = answer_from_context(question, packed.text)
+        metrics.inc("chat_answers_total", result="model")
+        logger.info("Federated chat answered datasets=%s source_rows=%s", scope, len(sources))
+    except LLMBusyError:
+        raise
+    except Exception as exc:
+        metrics.inc("chat_answers_total", result="model_error")
+        logger.exception("Federated chat model call failed datasets=%s", scope)
+        answer = f"Model call failed. {exc}"
+    return {
+        "answer": answer,
+        "dataset_ids": dataset_ids,
+        "sources": sources,
+        "context": _context_summary(packed),
+    }
+
+
+def _dataset_label(dataset_id: str, name: str) -> str:
+    """Prompt label for a dataset: its filename plus a short id, since filenames repeat across uploads."""
+    return f"{name}#{dataset_id[:8]}"
+
+
+def _locate_rows(dataset_ids: list[str], frame_lengths: list[int], positions: list[int]) -> list[tuple[str, dict]]:
+    """Map positions in the concatenated federated frame back to (dataset_id, row) pairs."""
+    offsets = list(accumulate(frame_lengths, initial=0))
+    wanted: list[tuple[str, int]] = []
+    for position in positions:
+        slot = bisect_right(offsets, position) - 1
+        wanted.append((dataset_ids[slot], position - offsets[slot]))
+    by_dataset: dict[str, list[int]] = {}
+    for dataset_id, row_index in wanted:
+        by_dataset.setdefault(dataset_id, []).append(row_index)
+    fetched = {
+        (dataset_id, row["row_index"]): row
+        for dataset_id, row_indexes in by_dataset.items()
+        for row in fetch_rows_by_index(dataset_id, row_indexes)
+    }
+    return [(key[0], fetched[key]) for key in wanted if key in fetched]
+
+
+def _complete_answer(dataset_id: str, pending: _PendingAnswer) -> dict:
     try:
-        answer = answer_from_context(request.question, context)
+        with stage("llm"):
+            answer = answer_from_context(pending.question, pending.packed.text)
+        metrics.inc("chat_answers_total", result="model")
+        answer_cache.put(pending.cache_key, dataset_id, answer)
         logger.info(
             "Chat answered dataset_id=%s source_rows=%s",
             dataset_id,
-            [row["row_index"] for row in rows],
+            pending.sources,
         )
+    except LLMBusyError:
+        raise
     except Exception as exc:
+        metrics.inc("chat_answers_total", result="model_error")
         logger.exception("Chat model call failed dataset_id=%s", dataset_id)
         answer = (
             "Model call failed. "
@@ -60,6 +401,92 @@ def chat(request: ChatRequest) -> dict:
     return {
         "answer": answer,
         "dataset_id": dataset_id,
-        "sources": [row["row_index"] for row in rows],
+        "sources": pending.sources,
+        "context": _context_summary(pending.packed),
+        "cached": False,
+    }
+
+
+def _complete_batch_item(dataset_id: str, pending: _PendingAnswer) -> dict:
+    try:
+        return _complete_answer(dataset_id, pending)
+    except LLMBusyError as exc:
+        metrics.inc("chat_answers_total", result="model_busy")
+        logger.warning("Chat batch item rejected dataset_id=%s: %s", dataset_id, exc)
+        return {
+            "answer": None,
+            "dataset_id": dataset_id,
+            "sources": pending.sources,
+            "reason": "model_busy",
+            "retry_after": exc.retry_after,
+        }
+
+
+def _busy_http_error(dataset_id: str, exc: LLMBusyError) -> HTTPException:
+    metrics.inc("chat_answers_total", result="model_busy")
+    logger.warning("Chat rejected: model busy dataset_id=%s status=%s: %s", dataset_id, exc.status_code, exc)
+    return HTTPException(
+        status_code=exc.status_code,
+        detail=str(exc),
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _aggregate_summary(aggregate: AggregateAnswer) -> dict:
+    return {
+        "operation": aggregate.plan.operation,
+        "column": aggregate.plan.column,
+        "group_by": aggregate.plan.group_by,
+        "filters": aggregate.plan.filters,
+        "matched_rows": aggregate.matched_rows,
+        "rows": aggregate.rows,
+    }
+
+
+def _context_summary(packed: PackedContext) -> dict:
+    return {
+        "packed_rows": len(packed.rows),
+        "estimated_tokens": packed.estimated_tokens,
+        "columns": packed.columns,
     }
 
+
+def _resolve_dataset_id(requested_id: str | None) -> str:
+    dataset_id = requested_id or get_latest_dataset_id()
+    if not dataset_id:
+        logger.warning("Chat rejected: no dataset available.")
+        raise HTTPException(status_code=400, detail="No dataset found. Upload a dataset first.")
+    if not dataset_exists(dataset_id):
+        logger.warning("Chat rejected: dataset not found dataset_id=%s", dataset_id)
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    return dataset_id
+
+
+def _resolve_federated_datasets(request: ChatRequest) -> dict[str, str] | None:
+    """Map dataset id -> name for a multi-dataset request, or None for a single-dataset one."""
+    if request.dataset_ids is None and request.tag is None:
+        return None
+    if sum(value is not None for value in (request.dataset_id, request.dataset_ids, request.tag)) > 1:
+        raise HTTPException(status_code=400, detail="Use only one of dataset_id, dataset_ids or tag.")
+    if request.tag is not None:
+        dataset_ids = list_dataset_ids_by_tag(request.tag)
+        if not dataset_ids:
+            logger.warning("Chat rejected: no datasets for tag=%s", request.tag)
+            raise HTTPException(status_code=404, detail="No datasets found for tag.")
+        if len(dataset_ids) > FEDERATED_MAX_DATASETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Tag matches {len(dataset_ids)} datasets; at most {FEDERATED_MAX_DATASETS} can be queried.",
+            )
+    else:
+        dataset_ids = list(dict.fromkeys(request.dataset_ids))
+    names = fetch_dataset_names(dataset_ids)
+    missing = [dataset_id for dataset_id in dataset_ids if dataset_id not in names]
+    if missing:
+        logger.warning("Chat rejected: datasets not found dataset_ids=%s", missing)
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {', '.join(missing)}.")
+    return {dataset_id: names[dataset_id] for dataset_id in dataset_ids}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
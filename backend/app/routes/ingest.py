@@ -1,78 +1,168 @@
+import os
+import tempfile
 from datetime import datetime, timezone
+from pathlib import Path
 from uuid import uuid4
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, File, HTTPException, Query, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 
 from app.logging_config import get_logger
-from app.services.db import (
-    init_db,
-    insert_dataset,
-    insert_records,
-    list_datasets,
-)
-from app.services.parsing import parse_tabular_file
+from app.services.db import dataset_exists, fetch_column_profiles, list_datasets, set_dataset_tag
+from app.services.ingestion import append_file, ingest_file
+from app.services.jobs import get_job, submit_ingest_job
+from app.services.metrics import stage
+from app.services.parsing import detect_file_type
 
 router = APIRouter()
 logger = get_logger(__name__)
 
+UPLOAD_SPOOL_CHUNK_BYTES = 1 << 20
+
+
+class DatasetTagRequest(BaseModel):
+    tag: str | None = Field(None, min_length=1, max_length=100)
+
 
 @router.post("/upload")
-async def upload_dataset(file: UploadFile = File(...)) -> dict:
-    init_db()
+async def upload_dataset(
+    response: Response,
+    file: UploadFile = File(...),
+    background: bool = False,
+    tag: str | None = Query(None, min_length=1, max_length=100),
+) -> dict:
     if not file.filename:
         logger.warning("Upload rejected: missing filename.")
         raise HTTPException(status_code=400, detail="Filename is required.")
 
-    content = await file.read()
-    if not content:
-        logger.warning("Upload rejected: empty file (%s).", file.filename)
-        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
-
+    with stage("upload_spool"):
+        spool_path = await _spool_upload(file)
     try:
-        file_type, rows = parse_tabular_file(file.filename, content)
-        logger.info(
-            "Parsed upload file=%s file_type=%s row_count=%s",
-            file.filename,
-            file_type,
-            len(rows),
-        )
-    except ValueError as exc:
-        logger.warning("Upload parse validation failed for file=%s: %s", file.filename, exc)
-        raise HTTPException(status_code=400, detail=str(exc)) from exc
-    except Exception as exc:
-        logger.exception("Unexpected parse failure for file=%s", file.filename)
-        raise HTTPException(status_code=400, detail=f"Failed to parse file: {exc}") from exc
-
-    if not rows:
+        if os.path.getsize(spool_path) == 0:
+            logger.warning("Upload rejected: empty file (%s).", file.filename)
+            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+
+        if background:
+            try:
+                detect_file_type(file.filename)
+            except ValueError as exc:
+                logger.warning("Upload rejected for file=%s: %s", file.filename, exc)
+                raise HTTPException(status_code=400, detail=str(exc)) from exc
+            job = submit_ingest_job(file.filename, spool_path, tag)
+            spool_path = None
+            response.status_code = 202
+            return {"message": "Dataset upload queued for ingestion.", **job.to_dict()}
+
+        dataset_id = str(uuid4())
+        created_at = datetime.now(timezone.utc).isoformat()
+        try:
+            file_type, row_count = await run_in_threadpool(
+                ingest_file, dataset_id, file.filename, spool_path, created_at, tag=tag
+            )
+        except ValueError as exc:
+            logger.warning("Upload parse validation failed for file=%s: %s", file.filename, exc)
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        except Exception as exc:
+            logger.exception("Unexpected parse failure for file=%s", file.filename)
+            raise HTTPException(status_code=400, detail=f"Failed to parse file: {exc}") from exc
+    finally:
+        if spool_path:
+            os.remove(spool_path)
+
+    if not row_count:
         logger.warning("Upload rejected: no rows found in file=%s", file.filename)
         raise HTTPException(status_code=400, detail="No records found in uploaded file.")
 
-    dataset_id = str(uuid4())
-    created_at = datetime.now(timezone.utc).isoformat()
-
-    insert_dataset(
-        dataset_id=dataset_id,
-        name=file.filename,
-        file_type=file_type,
-        row_count=len(rows),
-        created_at=created_at,
-    )
-    insert_records(dataset_id=dataset_id, rows=rows)
-    logger.info("Dataset stored dataset_id=%s name=%s rows=%s", dataset_id, file.filename, len(rows))
+    logger.info("Dataset stored dataset_id=%s name=%s rows=%s", dataset_id, file.filename, row_count)
 
     return {
         "message": "Dataset uploaded and stored successfully.",
         "dataset_id": dataset_id,
         "filename": file.filename,
         "file_type": file_type,
-        "row_count": len(rows),
+        "row_count": row_count,
         "created_at": created_at,
+        "tag": tag,
     }
 
 
+@router.post("/datasets/{dataset_id}/append")
+async def append_dataset(
+    dataset_id: str,
+    file: UploadFile = File(...),
+    key: str | None = Query(None, min_length=1, max_length=200),
+) -> dict:
+    """Add rows to an existing dataset; with `key`, rows sharing a key value replace the stored row."""
+    if not dataset_exists(dataset_id):
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Filename is required.")
+
+    with stage("upload_spool"):
+        spool_path = await _spool_upload(file)
+    try:
+        if os.path.getsize(spool_path) == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+        try:
+            result = await run_in_threadpool(append_file, dataset_id, file.filename, spool_path, key)
+        except ValueError as exc:
+            logger.warning("Append rejected for file=%s dataset_id=%s: %s", file.filename, dataset_id, exc)
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    finally:
+        os.remove(spool_path)
+
+    return {
+        "message": "Rows appended to dataset.",
+        "dataset_id": dataset_id,
+        "filename": file.filename,
+        "file_type": result.file_type,
+        "key": key,
+        "rows_received": result.rows_received,
+        "inserted": result.inserted,
+        "updated": result.updated,
+        "unchanged": result.unchanged,
+        "row_count": result.row_count,
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_ingest_job(job_id: str) -> dict:
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+
 @router.get("/datasets")
 def get_datasets() -> dict:
-    init_db()
     datasets = list_datasets()
     logger.info("Returning dataset list count=%s", len(datasets))
     return {"datasets": datasets}
+
+
+@router.get("/datasets/{dataset_id}/profile")
+def get_dataset_profile(dataset_id: str) -> dict:
+    if not dataset_exists(dataset_id):
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    columns = fetch_column_profiles(dataset_id)
+    logger.info("Returning dataset profile dataset_id=%s columns=%s", dataset_id, len(columns))
+    return {"dataset_id": dataset_id, "columns": columns}
+
+
+@router.put("/datasets/{dataset_id}/tag")
+def put_dataset_tag(dataset_id: str, request: DatasetTagRequest) -> dict:
+    """Set (or, with a null tag, clear) the tag used to chat across related datasets."""
+    if not set_dataset_tag(dataset_id, request.tag):
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    return {"dataset_id": dataset_id, "tag": request.tag}
+
+
+async def _spool_upload(file: UploadFile) -> str:
+    """Copy the upload to a temporary file without holding it in memory."""
+    with tempfile.NamedTemporaryFile(
+        delete=False, suffix=Path(file.filename or "").suffix
+    ) as spool:
+        while chunk := await file.read(UPLOAD_SPOOL_CHUNK_BYTES):
+            spool.write(chunk)
+    return spool.name
@@ -0,0 +1,41 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.routes.chat import chat_flights
+from app.services.answer_cache import answer_cache
+from app.services.llm import llm_scheduler
+from app.services.metrics import metrics
+from app.services.row_cache import row_cache
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    answers = answer_cache.stats()
+    rows = row_cache.stats()
+    llm = llm_scheduler.stats()
+    coalescing = chat_flights.stats()
+    counters = {
+        "answer_cache_lookups_total": {
+            (("result", "hit"),): answers["hits"],
+            (("result", "miss"),): answers["misses"],
+        },
+        "row_cache_lookups_total": {(("result", "hit"),): rows["hits"], (("result", "miss"),): rows["misses"]},
+        "llm_calls_total": {
+            (("result", "completed"),): llm["completed"],
+            (("result", "rejected"),): llm["rejected"],
+            (("result", "timed_out"),): llm["timed_out"],
+        },
+        "chat_coalesced_total": {(): coalescing["shared"]},
+    }
+    gauges = {
+        "answer_cache_entries": {(): answers["entries"]},
+        "row_cache_datasets": {(): rows["datasets"]},
+        "row_cache_used_bytes": {(): rows["used_bytes"]},
+        "llm_in_flight": {(): llm["in_flight"]},
+        "llm_queued": {(): llm["queued"]},
+    }
+    return PlainTextResponse(metrics.render(counters, gauges), media_type=PROMETHEUS_CONTENT_TYPE)
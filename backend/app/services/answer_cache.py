@@ -0,0 +1,132 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_PERSIST, ANSWER_CACHE_TTL_SECONDS
+from app.logging_config import get_logger
+from app.services.db import get_connection
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class _Entry:
+    dataset_id: str
+    answer: str
+    created_at: float
+
+
+class AnswerCache:
+    """LRU + TTL cache of model answers with an optional SQLite tier that survives restarts."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, persist: bool) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry.answer
+        if self.persist:
+            entry = self._load(key, now)
+            if entry is not None:
+                with self._lock:
+                    self._store_in_memory(key, entry)
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                return entry.answer
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, dataset_id: str, answer: str) -> None:
+        entry = _Entry(dataset_id=dataset_id, answer=answer, created_at=time.time())
+        with self._lock:
+            self._store_in_memory(key, entry)
+        if self.persist:
+            with get_connection() as conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO answer_cache (cache_key, dataset_id, answer, created_at)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (key, dataset_id, answer, entry.created_at),
+                )
+
+    def invalidate_dataset(self, dataset_id: str) -> None:
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.dataset_id == dataset_id]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidations"] += 1
+        if self.persist:
+            with get_connection() as conn:
+                conn.execute("DELETE FROM answer_cache WHERE dataset_id = ?", (dataset_id,))
+        logger.info("Invalidated answer cache dataset_id=%s entries=%s", dataset_id, len(stale))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persist": self.persist,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    def _store_in_memory(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _load(self, key: str, now: float) -> _Entry | None:
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT dataset_id, answer, created_at FROM answer_cache WHERE cache_key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row["created_at"] > self.ttl_seconds:
+                conn.execute("DELETE FROM answer_cache WHERE cache_key = ?", (key,))
+                return None
+        return _Entry(dataset_id=row["dataset_id"], answer=row["answer"], created_at=row["created_at"])
+
+
+def make_cache_key(dataset_id: str, question_tokens: list[str], source_rows: list[dict], model: str) -> str:
+    """Key an answer by the question and the content of the rows it was generated from.
+
+    Row text is part of the key, so an answer generated from rows that an
+    append or upsert has since changed can never be served for the new rows,
+    even if it is stored after invalidate_dataset ran.
+    """
+    sources = [[row["row_index"], row["row_text"]] for row in source_rows]
+    payload = json.dumps([dataset_id, question_tokens, sources, model], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+answer_cache = AnswerCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_PERSIST)
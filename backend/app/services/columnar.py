@@ -0,0 +1,233 @@
+import bisect
+import json
+import os
+import shutil
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Iterator
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+INT_PATTERN = r"0|-?[1-9][0-9]{0,17}"
+
+
+def write_segment(root: Path, dataset_id: str, rows: list[dict[str, str]], start_index: int) -> None:
+    """Store one ingest chunk as typed column arrays.
+
+    Columns whose values all round-trip through int64/float64 are stored
+    numerically; everything else is dictionary-encoded (int32 codes plus a
+    JSON list of distinct values, code -1 meaning the key was absent).
+    Rewriting an existing segment writes a new directory and swaps the manifest,
+    so concurrent readers never see a half-written segment. The replaced
+    directory is kept until the next rewrite, and a reader that still loses
+    it retries against the current manifest (_decode_current).
+    """
+    dataset_dir = _dataset_dir(root, dataset_id)
+    manifest = read_manifest(root, dataset_id)
+    retired = manifest.pop("retired", [])
+    previous = next((segment for segment in manifest["segments"] if segment["start"] == start_index), None)
+    segment_name = f"seg_{start_index:012d}"
+    if previous is not None:
+        segment_name = f"{segment_name}_{uuid4().hex[:8]}"
+    segment_dir = dataset_dir / segment_name
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    frame = pd.DataFrame.from_records(rows)
+    columns = []
+    for position, name in enumerate(frame.columns):
+        kind, array, values = _encode_column(frame[name])
+        np.save(segment_dir / f"{position}.npy", array)
+        if values is not None:
+            (segment_dir / f"{position}.values.json").write_text(
+                json.dumps(values, ensure_ascii=True), encoding="utf-8"
+            )
+        columns.append({"name": str(name), "kind": kind})
+
+    manifest["segments"] = [
+        segment for segment in manifest["segments"] if segment["start"] != start_index
+    ]
+    manifest["segments"].append(
+        {"start": start_index, "rows": len(rows), "dir": segment_name, "columns": columns}
+    )
+    manifest["segments"].sort(key=lambda segment: segment["start"])
+    if previous is not None:
+        manifest["retired"] = [previous["dir"]]
+        for stale_dir in retired:
+            shutil.rmtree(dataset_dir / stale_dir, ignore_errors=True)
+    elif retired:
+        manifest["retired"] = retired
+    _write_manifest(root, dataset_id, manifest)
+
+
+def replace_rows(root: Path, dataset_id: str, rows_by_index: dict[int, dict[str, str]]) -> None:
+    """Replace rows in place by rewriting only the segments that hold them."""
+    segments = read_manifest(root, dataset_id)["segments"]
+    starts = [segment["start"] for segment in segments]
+    patches: dict[int, dict[int, dict[str, str]]] = {}
+    for row_index, row in rows_by_index.items():
+        position = bisect.bisect_right(starts, row_index) - 1
+        if position < 0 or row_index - starts[position] >= segments[position]["rows"]:
+            raise IndexError(f"Row {row_index} is not stored for dataset {dataset_id}.")
+        patches.setdefault(position, {})[row_index - starts[position]] = row
+    for position, rows in patches.items():
+        segment = segments[position]
+        segment_rows = _decode_current(root, dataset_id, segment, list(range(segment["rows"])))
+        for offset, row in rows.items():
+            segment_rows[offset] = row
+        write_segment(root, dataset_id, segment_rows, segment["start"])
+
+
+def read_rows(root: Path, dataset_id: str, row_indexes: list[int] | None = None) -> list[tuple[int, dict[str, str]]]:
+    """Rebuild (row_index, row) pairs in row order; all rows when row_indexes is None."""
+    segments = read_manifest(root, dataset_id)["segments"]
+    starts = [segment["start"] for segment in segments]
+    wanted: dict[int, list[int]] = {}
+    if row_indexes is None:
+        for position, segment in enumerate(segments):
+            wanted[position] = list(range(segment["rows"]))
+    else:
+        for row_index in sorted(set(row_indexes)):
+            position = bisect.bisect_right(starts, row_index) - 1
+            if position >= 0 and row_index - starts[position] < segments[position]["rows"]:
+                wanted.setdefault(position, []).append(row_index - starts[position])
+
+    result: list[tuple[int, dict[str, str]]] = []
+    for position, offsets in sorted(wanted.items()):
+        segment = segments[position]
+        result.extend(
+            (segment["start"] + offset, row)
+            for offset, row in zip(offsets, _decode_current(root, dataset_id, segment, offsets))
+        )
+    return result
+
+
+def iter_segments(root: Path, dataset_id: str) -> Iterator[tuple[int, list[dict[str, str]]]]:
+    for segment in read_manifest(root, dataset_id)["segments"]:
+        offsets = list(range(segment["rows"]))
+        yield segment["start"], _decode_current(root, dataset_id, segment, offsets)
+
+
+def load_frame(root: Path, dataset_id: str) -> pd.DataFrame:
+    """Load the whole dataset as a typed DataFrame for vectorised scans."""
+    frames = [
+        _with_current_segment(root, dataset_id, segment, lambda current: _load_segment_frame(root, dataset_id, current))
+        for segment in read_manifest(root, dataset_id)["segments"]
+    ]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def read_manifest(root: Path, dataset_id: str) -> dict:
+    path = _dataset_dir(root, dataset_id) / MANIFEST_NAME
+    if not path.exists():
+        return {"segments": []}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def storage_bytes(root: Path, dataset_id: str) -> int:
+    dataset_dir = _dataset_dir(root, dataset_id)
+    if not dataset_dir.exists():
+        return 0
+    return sum(path.stat().st_size for path in dataset_dir.rglob("*") if path.is_file())
+
+
+def delete_dataset_columns(root: Path, dataset_id: str) -> None:
+    shutil.rmtree(_dataset_dir(root, dataset_id), ignore_errors=True)
+    _load_values.cache_clear()
+
+
+def _encode_column(series: pd.Series) -> tuple[str, np.ndarray, list[str] | None]:
+    missing = series.isna()
+    if not missing.any():
+        values = series.astype(str)
+        if len(values) and values.str.fullmatch(INT_PATTERN).all():
+            return "int", values.astype(np.int64).to_numpy(), None
+        present = values != ""
+        parsed = pd.to_numeric(values[present], errors="coerce")
+        if len(parsed) and parsed.notna().all() and (parsed.map(lambda value: repr(float(value))) == values[present]).all():
+            floats = np.full(len(values), np.nan, dtype=np.float64)
+            floats[present.to_numpy()] = parsed.to_numpy(dtype=np.float64)
+            return "float", floats, None
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return "str", codes.astype(np.int32), [str(value) for value in uniques]
+
+
+def _load_segment_frame(root: Path, dataset_id: str, segment: dict) -> pd.DataFrame:
+    segment_dir = _dataset_dir(root, dataset_id) / segment["dir"]
+    data = {}
+    for position, column in enumerate(segment["columns"]):
+        array = np.load(segment_dir / f"{position}.npy", mmap_mode="r")
+        if column["kind"] == "str":
+            values = _load_values(str(segment_dir / f"{position}.values.json"))
+            data[column["name"]] = pd.Categorical.from_codes(np.asarray(array), categories=pd.Index(values, dtype=object))
+        else:
+            data[column["name"]] = np.asarray(array)
+    return pd.DataFrame(data)
+
+
+def _decode_current(root: Path, dataset_id: str, segment: dict, offsets: list[int]) -> list[dict[str, str]]:
+    return _with_current_segment(
+        root, dataset_id, segment, lambda current: _decode_rows(root, dataset_id, current, offsets)
+    )
+
+
+def _with_current_segment(root: Path, dataset_id: str, segment: dict, load: Callable[[dict], Any]) -> Any:
+    """Run load on a segment, retrying once on its replacement if it was rewritten and removed meanwhile."""
+    try:
+        return load(segment)
+    except FileNotFoundError:
+        current = next(
+            (entry for entry in read_manifest(root, dataset_id)["segments"] if entry["start"] == segment["start"]),
+            None,
+        )
+        if current is None or current["dir"] == segment["dir"]:
+            raise
+        logger.info("Segment rewritten during read; retrying dataset_id=%s dir=%s", dataset_id, current["dir"])
+        return load(current)
+
+
+def _decode_rows(root: Path, dataset_id: str, segment: dict, offsets: list[int]) -> list[dict[str, str]]:
+    segment_dir = _dataset_dir(root, dataset_id) / segment["dir"]
+    index = np.asarray(offsets, dtype=np.int64)
+    decoded_columns: list[tuple[str, list]] = []
+    for position, column in enumerate(segment["columns"]):
+        array = np.load(segment_dir / f"{position}.npy", mmap_mode="r")[index]
+        if column["kind"] == "int":
+            decoded = [str(value) for value in array.tolist()]
+        elif column["kind"] == "float":
+            decoded = ["" if value != value else repr(value) for value in array.tolist()]
+        else:
+            values = _load_values(str(segment_dir / f"{position}.values.json"))
+            decoded = [None if code < 0 else values[code] for code in array.tolist()]
+        decoded_columns.append((column["name"], decoded))
+
+    rows: list[dict[str, str]] = [{} for _ in offsets]
+    for name, decoded in decoded_columns:
+        for row, value in zip(rows, decoded):
+            if value is not None:
+                row[name] = value
+    return rows
+
+
+@lru_cache(maxsize=256)
+def _load_values(path: str) -> list[str]:
+    with open(path, "r", encoding="utf-8") as stream:
+        return json.load(stream)
+
+
+def _write_manifest(root: Path, dataset_id: str, manifest: dict) -> None:
+    path = _dataset_dir(root, dataset_id) / MANIFEST_NAME
+    temp_path = path.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(temp_path, path)
+
+
+def _dataset_dir(root: Path, dataset_id: str) -> Path:
+    return root / dataset_id
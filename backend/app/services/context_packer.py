@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from dataclasses import dataclass
+
+from app.config import CONTEXT_TOKEN_BUDGET
+from app.services.inverted_index import normalize_value, tokenize
+
+# Rough English/CSV ratio; good enough to budget prompt-eval cost without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class PackedContext:
+    text: str
+    rows: list[dict]
+    columns: list[str]
+    estimated_tokens: int
+
+
+def pack_context(
+    rows: list[dict],
+    question: str,
+    filters: dict[str, list[str]] | None = None,
+    budget_tokens: int | None = None,
+    dataset_names: list[str] | None = None,
+) -> PackedContext:
+    """Render ranked rows as one CSV header plus a line per row, within a token budget.
+
+    Rows are taken in rank order until the next line would exceed the budget;
+    the top row is always kept. When the question names columns, only those,
+    the filtered columns, columns holding a question term, and the first
+    (identifying) column are rendered. dataset_names, aligned with rows, adds a
+    leading dataset column for rows merged from several datasets.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    records = [row.get("record") or json.loads(row["row_json"]) for row in rows]
+    columns = select_columns(records, question, filters or {})
+
+    prefix = ["dataset"] if dataset_names is not None else []
+    header = _csv_line([*prefix, "row", *columns])
+    lines = [header]
+    used = estimate_tokens(header)
+    packed: list[dict] = []
+    for position, (row, record) in enumerate(zip(rows, records)):
+        labels = [dataset_names[position]] if dataset_names is not None else []
+        line = _csv_line([*labels, str(row["row_index"]), *(record.get(column, "") for column in columns)])
+        cost = estimate_tokens(line)
+        if packed and used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+        packed.append(row)
+    return PackedContext(text="\n".join(lines), rows=packed, columns=columns, estimated_tokens=used)
+
+
+def select_columns(records: list[dict], question: str, filters: dict[str, list[str]]) -> list[str]:
+    columns: list[str] = []
+    for record in records:
+        columns.extend(column for column in record if column not in columns)
+    question_text = f" {normalize_value(question)} "
+    named = {
+        column
+        for column in columns
+        if (name := normalize_value(column.replace("_", " ")))
+        and any(f" {variant} " in question_text for variant in (name, f"{name}s", name.rstrip("s")) if variant)
+    }
+    if not named:
+        return columns
+
+    terms = set(tokenize(question))
+    keep = named | set(filters) | {columns[0]}
+    for record in records:
+        for column, value in record.items():
+            if column not in keep and terms.intersection(tokenize(str(value))):
+                keep.add(column)
+    return [column for column in columns if column in keep]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _csv_line(values: list[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(values)
+    return buffer.getvalue()
@@ -1,12 +1,42 @@
+import bisect
+import hashlib
 import json
+import queue
 import sqlite3
+import threading
+from array import array
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
-from app.config import SQLITE_PATH
+from app.config import (
+    DB_POOL_SIZE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_PATH,
+    SQLITE_SYNCHRONOUS,
+)
 from app.logging_config import get_logger
+from app.services.columnar import (
+    delete_dataset_columns,
+    iter_segments,
+    read_rows,
+    replace_rows,
+    storage_bytes,
+    write_segment,
+)
+from app.services.inverted_index import (
+    POSTING_TYPECODE,
+    build_field_postings,
+    build_postings,
+    decode_postings,
+    encode_postings,
+    tokenize,
+)
 from app.services.parsing import parse_tabular_file
+from app.services.profiling import DatasetProfiler
 
 logger = get_logger(__name__)
 
@@ -14,90 +44,450 @@ DEFAULT_DATASET_ID = "default-employees"
 DEFAULT_DATASET_NAME = "default_employees.csv"
 DEFAULT_DATASET_CREATED_AT = "1970-01-01T00:00:00+00:00"
 DEFAULT_DATASET_FILE = Path(__file__).resolve().parents[1] / "default_data" / DEFAULT_DATASET_NAME
+POSTINGS_BACKFILL_BATCH_SIZE = 50_000
+PROFILE_BACKFILL_BATCH_SIZE = 50_000
+# Bound on IN (...) parameters per lookup query.
+ROW_LOOKUP_BATCH_SIZE = 500
+STORAGE_ROWS = "rows"
+STORAGE_COLUMNAR = "columnar"
+# Rough ratio between reconstructed row text and compressed column files.
+COLUMNAR_EXPANSION_FACTOR = 2
 
 
-def _ensure_parent_dir() -> None:
-    Path(SQLITE_PATH).parent.mkdir(parents=True, exist_ok=True)
+class ConnectionPool:
+    """Reuses tuned connections to one database file; each checkout is owned by one thread."""
+
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(maxsize=max(size, 0))
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _connect(self) -> sqlite3.Connection:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        logger.debug("Opened SQLite connection path=%s", self.path)
+        return conn
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool() -> ConnectionPool:
+    # SQLITE_PATH is read on every call so tests can point the module at a fresh database.
+    with _pools_lock:
+        pool = _pools.get(SQLITE_PATH)
+        if pool is None:
+            pool = _pools[SQLITE_PATH] = ConnectionPool(SQLITE_PATH, DB_POOL_SIZE)
+        return pool
 
 
 @contextmanager
 def get_connection() -> Iterable[sqlite3.Connection]:
-    _ensure_parent_dir()
-    conn = sqlite3.connect(SQLITE_PATH)
-    conn.row_factory = sqlite3.Row
+    pool = _get_pool()
+    conn = pool.acquire()
     try:
         yield conn
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
     finally:
-        conn.close()
+        pool.release(conn)
+
+
+def close_connections() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
 
 
 def init_db() -> None:
+    """Apply pending schema migrations and seed the default dataset.
+
+    Called once at application startup; request handlers assume the schema exists.
+    """
     with get_connection() as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS datasets (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                file_type TEXT NOT NULL,
-                row_count INTEGER NOT NULL,
-                created_at TEXT NOT NULL
-            )
-            """
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        current = _get_schema_version(conn)
+        for version, migrate in enumerate(SCHEMA_MIGRATIONS[current:], start=current + 1):
+            migrate(conn)
+            _set_schema_version(conn, version)
+            logger.info("Applied schema migration version=%s", version)
+        _seed_default_dataset(conn)
+    logger.info("Database initialized at path=%s schema_version=%s", SQLITE_PATH, len(SCHEMA_MIGRATIONS))
+
+
+def _get_schema_version(conn: sqlite3.Connection) -> int:
+    result = conn.execute("SELECT MAX(version) AS version FROM schema_version").fetchone()
+    return result["version"] or 0
+
+
+def _set_schema_version(conn: sqlite3.Connection, version: int) -> None:
+    conn.execute("DELETE FROM schema_version")
+    conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+
+
+# Migrations use IF NOT EXISTS so databases created before schema versioning
+# upgrade cleanly from version 0.
+def _migrate_base_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS datasets (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            created_at TEXT NOT NULL
         )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                dataset_id TEXT NOT NULL,
-                row_index INTEGER NOT NULL,
-                row_json TEXT NOT NULL,
-                row_text TEXT NOT NULL,
-                FOREIGN KEY(dataset_id) REFERENCES datasets(id)
-            )
-            """
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataset_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            row_json TEXT NOT NULL,
+            row_text TEXT NOT NULL,
+            FOREIGN KEY(dataset_id) REFERENCES datasets(id)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_records_dataset ON records(dataset_id)"
+    )
+
+
+def _migrate_postings(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_records_dataset_row ON records(dataset_id, row_index)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS record_postings (
+            dataset_id TEXT NOT NULL,
+            term TEXT NOT NULL,
+            block INTEGER NOT NULL,
+            row_indexes BLOB NOT NULL,
+            PRIMARY KEY (dataset_id, term, block)
+        ) WITHOUT ROWID
+        """
+    )
+    _backfill_postings(conn)
+
+
+def _migrate_embeddings(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS record_embeddings (
+            dataset_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            embedding BLOB NOT NULL,
+            PRIMARY KEY (dataset_id, row_index)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migrate_fts(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+            row_text,
+            dataset_id,
+            content='records',
+            content_rowid='id'
         )
+        """
+    )
+    conn.execute("INSERT INTO records_fts(records_fts) VALUES ('rebuild')")
+
+
+def _migrate_answer_cache(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS answer_cache (
+            cache_key TEXT PRIMARY KEY,
+            dataset_id TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_answer_cache_dataset ON answer_cache(dataset_id)"
+    )
+
+
+def _migrate_dataset_storage(conn: sqlite3.Connection) -> None:
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(datasets)")}
+    if "storage" not in columns:
         conn.execute(
-            "CREATE INDEX IF NOT EXISTS idx_records_dataset ON records(dataset_id)"
+            f"ALTER TABLE datasets ADD COLUMN storage TEXT NOT NULL DEFAULT '{STORAGE_ROWS}'"
         )
-        _seed_default_dataset(conn)
-    logger.info("Database initialized at path=%s", SQLITE_PATH)
+
+
+def _migrate_column_profiles(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS column_profiles (
+            dataset_id TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            profile_json TEXT NOT NULL,
+            PRIMARY KEY (dataset_id, column_name)
+        )
+        """
+    )
+
+
+def _migrate_field_postings(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS field_postings (
+            dataset_id TEXT NOT NULL,
+            value TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            block INTEGER NOT NULL,
+            row_indexes BLOB NOT NULL,
+            PRIMARY KEY (dataset_id, value, column_name, block)
+        ) WITHOUT ROWID
+        """
+    )
+    _backfill_field_postings(conn)
+
+
+def _migrate_dataset_tags(conn: sqlite3.Connection) -> None:
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(datasets)")}
+    if "tag" not in columns:
+        conn.execute("ALTER TABLE datasets ADD COLUMN tag TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_datasets_tag ON datasets(tag)")
+
+
+def _migrate_change_tracking(conn: sqlite3.Connection) -> None:
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(datasets)")}
+    if "upsert_key" not in columns:
+        conn.execute("ALTER TABLE datasets ADD COLUMN upsert_key TEXT")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS record_hashes (
+            dataset_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            row_hash BLOB NOT NULL,
+            PRIMARY KEY (dataset_id, row_index)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_record_hashes_hash ON record_hashes(dataset_id, row_hash)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS record_keys (
+            dataset_id TEXT NOT NULL,
+            key_value TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            PRIMARY KEY (dataset_id, key_value)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migrate_fts_unindexed_dataset(conn: sqlite3.Connection) -> None:
+    # The dataset id is a filter, not text: keep it out of the index and the
+    # MATCH expression so it never counts as a ranked term.
+    conn.execute("DROP TABLE IF EXISTS records_fts")
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE records_fts USING fts5(
+            row_text,
+            dataset_id UNINDEXED,
+            content='records',
+            content_rowid='id'
+        )
+        """
+    )
+    conn.execute("INSERT INTO records_fts(records_fts) VALUES ('rebuild')")
+
+
+def _migrate_fts_dataset_filter(conn: sqlite3.Connection) -> None:
+    # Index dataset_id again so MATCH itself restricts hits to one dataset;
+    # filtering after the MATCH found and ranked hits across every dataset.
+    # bm25 weights the column 0, so it never affects the ranking.
+    conn.execute("DROP TABLE IF EXISTS records_fts")
+    _migrate_fts(conn)
+
+
+def _migrate_profile_state(conn: sqlite3.Connection) -> None:
+    # Mergeable profiler state next to each finished profile, so appends can
+    # extend a profile instead of rebuilding it. NULL means "rebuild on change".
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(column_profiles)")}
+    if "state_json" not in columns:
+        conn.execute("ALTER TABLE column_profiles ADD COLUMN state_json TEXT")
+
+
+SCHEMA_MIGRATIONS = [
+    _migrate_base_tables,
+    _migrate_postings,
+    _migrate_embeddings,
+    _migrate_fts,
+    _migrate_answer_cache,
+    _migrate_dataset_storage,
+    _migrate_column_profiles,
+    _migrate_field_postings,
+    _migrate_dataset_tags,
+    _migrate_change_tracking,
+    _migrate_fts_unindexed_dataset,
+    _migrate_profile_state,
+    _migrate_fts_dataset_filter,
+]
 
 
 def insert_dataset(
-    dataset_id: str, name: str, file_type: str, row_count: int, created_at: str
+    dataset_id: str,
+    name: str,
+    file_type: str,
+    row_count: int,
+    created_at: str,
+    storage: str = STORAGE_ROWS,
+    tag: str | None = None,
 ) -> None:
     with get_connection() as conn:
         conn.execute(
             """
-            INSERT INTO datasets (id, name, file_type, row_count, created_at)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO datasets (id, name, file_type, row_count, created_at, storage, tag)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-            (dataset_id, name, file_type, row_count, created_at),
+            (dataset_id, name, file_type, row_count, created_at, storage, tag),
         )
     logger.info("Inserted dataset metadata dataset_id=%s row_count=%s", dataset_id, row_count)
 
 
-def insert_records(dataset_id: str, rows: list[dict[str, str]]) -> None:
+def insert_records(dataset_id: str, rows: list[dict[str, str]], start_index: int = 0) -> None:
     with get_connection() as conn:
-        conn.executemany(
+        _insert_rows(conn, dataset_id, rows, start_index)
+        _insert_hashes(conn, dataset_id, rows, start_index)
+    logger.info(
+        "Inserted records dataset_id=%s start_index=%s count=%s", dataset_id, start_index, len(rows)
+    )
+
+
+def insert_columnar_records(
+    dataset_id: str, rows: list[dict[str, str]], start_index: int = 0
+) -> None:
+    """Store rows as typed column files; only the term and field postings go to SQLite."""
+    write_segment(columnar_root(), dataset_id, rows, start_index)
+    with get_connection() as conn:
+        _insert_postings(conn, dataset_id, [row_to_text(row) for row in rows], start_index)
+        _insert_field_postings(conn, dataset_id, rows, start_index)
+        _insert_hashes(conn, dataset_id, rows, start_index)
+    logger.info(
+        "Inserted columnar records dataset_id=%s start_index=%s count=%s",
+        dataset_id,
+        start_index,
+        len(rows),
+    )
+
+
+def insert_column_profiles(dataset_id: str, profiler: DatasetProfiler) -> None:
+    with get_connection() as conn:
+        _insert_column_profiles(conn, dataset_id, profiler)
+
+
+def fetch_column_profiles(dataset_id: str) -> list[dict]:
+    """Return the stored column profiles, profiling the dataset first if it predates them."""
+    with get_connection() as conn:
+        result = conn.execute(
             """
-            INSERT INTO records (dataset_id, row_index, row_json, row_text)
-            VALUES (?, ?, ?, ?)
+            SELECT profile_json
+            FROM column_profiles
+            WHERE dataset_id = ?
+            ORDER BY position ASC
             """,
-            [
-                (dataset_id, idx, json.dumps(row, ensure_ascii=True), _row_to_text(row))
-                for idx, row in enumerate(rows)
-            ],
+            (dataset_id,),
+        ).fetchall()
+    if result:
+        return [json.loads(row["profile_json"]) for row in result]
+    return rebuild_column_profiles(dataset_id)
+
+
+def rebuild_column_profiles(dataset_id: str) -> list[dict]:
+    """Profile every stored row and store the result; used when no mergeable profile exists."""
+    profiler = DatasetProfiler()
+    for _, rows in _iter_row_batches(dataset_id, PROFILE_BACKFILL_BATCH_SIZE):
+        profiler.update(rows)
+    if profiler.columns:
+        insert_column_profiles(dataset_id, profiler)
+        logger.info("Built column profiles dataset_id=%s columns=%s", dataset_id, len(profiler.columns))
+    return profiler.finalize()
+
+
+def columnar_root() -> Path:
+    return Path(SQLITE_PATH).parent / "columns"
+
+
+def get_dataset_storage(dataset_id: str) -> str:
+    with get_connection() as conn:
+        return _dataset_storage(conn, dataset_id)
+
+
+def delete_dataset(dataset_id: str) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO records_fts (records_fts, rowid, row_text, dataset_id)
+            SELECT 'delete', id, row_text, dataset_id
+            FROM records
+            WHERE dataset_id = ?
+            """,
+            (dataset_id,),
         )
-    logger.info("Inserted records dataset_id=%s count=%s", dataset_id, len(rows))
+        conn.execute("DELETE FROM record_postings WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("DELETE FROM field_postings WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("DELETE FROM record_embeddings WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("DELETE FROM column_profiles WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("DELETE FROM record_hashes WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("DELETE FROM record_keys WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("DELETE FROM records WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("DELETE FROM datasets WHERE id = ?", (dataset_id,))
+    delete_dataset_columns(columnar_root(), dataset_id)
+    logger.info("Deleted dataset dataset_id=%s", dataset_id)
 
 
 def list_datasets() -> list[dict]:
     with get_connection() as conn:
         result = conn.execute(
             """
-            SELECT id, name, file_type, row_count, created_at
+            SELECT id, name, file_type, row_count, created_at, storage, tag
             FROM datasets
             ORDER BY created_at DESC
             """
@@ -105,6 +495,30 @@ def list_datasets() -> list[dict]:
     return [dict(row) for row in result]
 
 
+def list_dataset_ids_by_tag(tag: str) -> list[str]:
+    with get_connection() as conn:
+        result = conn.execute(
+            "SELECT id FROM datasets WHERE tag = ? ORDER BY created_at ASC", (tag,)
+        ).fetchall()
+    return [row["id"] for row in result]
+
+
+def set_dataset_tag(dataset_id: str, tag: str | None) -> bool:
+    with get_connection() as conn:
+        updated = conn.execute("UPDATE datasets SET tag = ? WHERE id = ?", (tag, dataset_id)).rowcount
+    logger.info("Set dataset tag dataset_id=%s tag=%s", dataset_id, tag)
+    return updated > 0
+
+
+def fetch_dataset_names(dataset_ids: list[str]) -> dict[str, str]:
+    placeholders = ",".join("?" for _ in dataset_ids)
+    with get_connection() as conn:
+        result = conn.execute(
+            f"SELECT id, name FROM datasets WHERE id IN ({placeholders})", dataset_ids
+        ).fetchall()
+    return {row["id"]: row["name"] for row in result}
+
+
 def dataset_exists(dataset_id: str) -> bool:
     with get_connection() as conn:
         result = conn.execute(
@@ -113,6 +527,12 @@ def dataset_exists(dataset_id: str) -> bool:
     return result is not None
 
 
+def fetch_row_count(dataset_id: str) -> int | None:
+    with get_connection() as conn:
+        result = conn.execute("SELECT row_count FROM datasets WHERE id = ?", (dataset_id,)).fetchone()
+    return result["row_count"] if result else None
+
+
 def get_latest_dataset_id() -> str | None:
     with get_connection() as conn:
         result = conn.execute(
@@ -123,6 +543,8 @@ def get_latest_dataset_id() -> str | None:
 
 def fetch_rows(dataset_id: str) -> list[dict]:
     with get_connection() as conn:
+        if _dataset_storage(conn, dataset_id) == STORAGE_COLUMNAR:
+            return _columnar_rows(dataset_id, None)
         result = conn.execute(
             """
             SELECT row_index, row_json, row_text
@@ -135,11 +557,429 @@ def fetch_rows(dataset_id: str) -> list[dict]:
     return [dict(row) for row in result]
 
 
-def _row_to_text(row: dict[str, str]) -> str:
+def fetch_dataset_text_bytes(dataset_id: str) -> int:
+    with get_connection() as conn:
+        if _dataset_storage(conn, dataset_id) == STORAGE_COLUMNAR:
+            return storage_bytes(columnar_root(), dataset_id) * COLUMNAR_EXPANSION_FACTOR
+        result = conn.execute(
+            """
+            SELECT COALESCE(SUM(LENGTH(row_json) + LENGTH(row_text)), 0) AS text_bytes
+            FROM records
+            WHERE dataset_id = ?
+            """,
+            (dataset_id,),
+        ).fetchone()
+    return result["text_bytes"]
+
+
+def fetch_rows_by_index(dataset_id: str, row_indexes: list[int]) -> list[dict]:
+    if not row_indexes:
+        return []
+    placeholders = ", ".join("?" for _ in row_indexes)
+    with get_connection() as conn:
+        if _dataset_storage(conn, dataset_id) == STORAGE_COLUMNAR:
+            return _columnar_rows(dataset_id, row_indexes)
+        result = conn.execute(
+            f"""
+            SELECT row_index, row_json, row_text
+            FROM records
+            WHERE dataset_id = ? AND row_index IN ({placeholders})
+            ORDER BY row_index ASC
+            """,
+            (dataset_id, *row_indexes),
+        ).fetchall()
+    return [dict(row) for row in result]
+
+
+def fetch_postings(dataset_id: str, terms: list[str]) -> dict[str, list[int]]:
+    unique_terms = sorted(set(terms))
+    if not unique_terms:
+        return {}
+    placeholders = ", ".join("?" for _ in unique_terms)
+    postings: dict[str, list[int]] = {}
+    with get_connection() as conn:
+        result = conn.execute(
+            f"""
+            SELECT term, row_indexes
+            FROM record_postings
+            WHERE dataset_id = ? AND term IN ({placeholders})
+            ORDER BY term ASC, block ASC
+            """,
+            (dataset_id, *unique_terms),
+        )
+        for row in result:
+            postings.setdefault(row["term"], []).extend(decode_postings(row["row_indexes"]))
+    return postings
+
+
+def fetch_known_terms(dataset_id: str, terms: list[str]) -> set[str]:
+    """Return the terms that occur in at least one row, without reading their postings."""
+    unique_terms = sorted(set(terms))
+    if not unique_terms:
+        return set()
+    placeholders = ", ".join("?" for _ in unique_terms)
+    with get_connection() as conn:
+        result = conn.execute(
+            f"""
+            SELECT DISTINCT term
+            FROM record_postings
+            WHERE dataset_id = ? AND term IN ({placeholders})
+            """,
+            (dataset_id, *unique_terms),
+        ).fetchall()
+    return {row["term"] for row in result}
+
+
+def fetch_field_postings(dataset_id: str, values: list[str]) -> dict[str, dict[str, list[int]]]:
+    """Return {normalized value: {column: row indexes}} for the values present in the dataset."""
+    unique_values = sorted(set(values))
+    if not unique_values:
+        return {}
+    placeholders = ", ".join("?" for _ in unique_values)
+    postings: dict[str, dict[str, list[int]]] = {}
+    with get_connection() as conn:
+        result = conn.execute(
+            f"""
+            SELECT value, column_name, row_indexes
+            FROM field_postings
+            WHERE dataset_id = ? AND value IN ({placeholders})
+            ORDER BY value ASC, column_name ASC, block ASC
+            """,
+            (dataset_id, *unique_values),
+        )
+        for row in result:
+            postings.setdefault(row["value"], {}).setdefault(row["column_name"], []).extend(
+                decode_postings(row["row_indexes"])
+            )
+    return postings
+
+
+def iter_row_texts(dataset_id: str, batch_size: int) -> Iterator[tuple[int, list[str]]]:
+    """Yield (start_index, row_texts) batches in row order.
+
+    Each batch is read on its own connection, so callers may write between
+    batches without a read transaction held open across the whole dataset.
+    """
+    if get_dataset_storage(dataset_id) == STORAGE_COLUMNAR:
+        for segment_start, rows in iter_segments(columnar_root(), dataset_id):
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset : offset + batch_size]
+                yield segment_start + offset, [row_to_text(row) for row in batch]
+        return
+    after = -1
+    while True:
+        with get_connection() as conn:
+            batch = conn.execute(
+                """
+                SELECT row_index, row_text
+                FROM records
+                WHERE dataset_id = ? AND row_index > ?
+                ORDER BY row_index ASC
+                LIMIT ?
+                """,
+                (dataset_id, after, batch_size),
+            ).fetchall()
+        if not batch:
+            return
+        after = batch[-1]["row_index"]
+        yield batch[0]["row_index"], [row["row_text"] for row in batch]
+
+
+def insert_embeddings(dataset_id: str, embeddings: list[tuple[int, bytes]]) -> None:
+    with get_connection() as conn:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO record_embeddings (dataset_id, row_index, embedding)
+            VALUES (?, ?, ?)
+            """,
+            [(dataset_id, row_index, blob) for row_index, blob in embeddings],
+        )
+
+
+def fetch_embeddings(dataset_id: str) -> list[tuple[int, bytes]]:
+    with get_connection() as conn:
+        result = conn.execute(
+            """
+            SELECT row_index, embedding
+            FROM record_embeddings
+            WHERE dataset_id = ?
+            ORDER BY row_index ASC
+            """,
+            (dataset_id,),
+        ).fetchall()
+    return [(row["row_index"], row["embedding"]) for row in result]
+
+
+def search_fts(
+    dataset_id: str, terms: list[str], limit: int, row_indexes: list[int] | None = None
+) -> list[dict]:
+    """BM25-ranked rows of one dataset matching any term; row_indexes, if given, restricts the candidates.
+
+    The dataset restriction is part of the MATCH, so FTS5 only ranks that
+    dataset's hits; the SQL equality guards against an id whose tokens also
+    occur, as a phrase, inside another dataset's id.
+    """
+    unique_terms = sorted(set(terms))
+    if not unique_terms:
+        return []
+    match = "dataset_id : {dataset} AND row_text : ({terms})".format(
+        dataset=_fts_quote(dataset_id),
+        terms=" OR ".join(_fts_quote(term) for term in unique_terms),
+    )
+    row_filter = ""
+    params: tuple = (match, dataset_id, limit)
+    if row_indexes is not None:
+        row_filter = "AND records.row_index IN (SELECT value FROM json_each(?))"
+        params = (match, dataset_id, json.dumps(row_indexes), limit)
+    with get_connection() as conn:
+        result = conn.execute(
+            f"""
+            SELECT records.row_index, records.row_json, records.row_text,
+                   bm25(records_fts, 1.0, 0.0) AS rank
+            FROM records_fts
+            JOIN records ON records.id = records_fts.rowid
+            WHERE records_fts MATCH ? AND records.dataset_id = ? {row_filter}
+            ORDER BY rank ASC, records.row_index ASC
+            LIMIT ?
+            """,
+            params,
+        ).fetchall()
+    return [dict(row) for row in result]
+
+
+def prepare_change_tracking(dataset_id: str, key_column: str | None = None) -> None:
+    """Index stored rows by key_column, and hash them, the first time they are needed.
+
+    Ingest writes row hashes as it goes, so only datasets stored before that
+    are hashed here. Appends look rows up through these tables, so after this
+    one-time pass their cost follows the size of the upload rather than of the
+    dataset.
+    Choosing a different key column re-indexes once; on duplicate keys the
+    first row wins.
+    """
+    with get_connection() as conn:
+        hashed = conn.execute(
+            "SELECT 1 FROM record_hashes WHERE dataset_id = ? LIMIT 1", (dataset_id,)
+        ).fetchone()
+        current_key = conn.execute(
+            "SELECT upsert_key FROM datasets WHERE id = ?", (dataset_id,)
+        ).fetchone()["upsert_key"]
+        index_keys = key_column is not None and key_column != current_key
+        if hashed and not index_keys:
+            return
+        if index_keys:
+            conn.execute("DELETE FROM record_keys WHERE dataset_id = ?", (dataset_id,))
+        total = 0
+        for start, rows in _iter_row_batches(dataset_id, PROFILE_BACKFILL_BATCH_SIZE):
+            if not hashed:
+                _insert_hashes(conn, dataset_id, rows, start)
+            if index_keys:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO record_keys (dataset_id, key_value, row_index) VALUES (?, ?, ?)",
+                    [
+                        (dataset_id, str(row[key_column]), start + offset)
+                        for offset, row in enumerate(rows)
+                        if key_column in row
+                    ],
+                )
+            total += len(rows)
+        if index_keys:
+            conn.execute("UPDATE datasets SET upsert_key = ? WHERE id = ?", (key_column, dataset_id))
+    logger.info(
+        "Prepared change tracking dataset_id=%s rows=%s hashed=%s key_column=%s",
+        dataset_id,
+        total,
+        not hashed,
+        key_column if index_keys else None,
+    )
+
+
+def fetch_known_hashes(dataset_id: str, hashes: list[bytes]) -> set[bytes]:
+    """Return which of these row hashes are already stored for the dataset."""
+    known: set[bytes] = set()
+    unique_hashes = list(set(hashes))
+    with get_connection() as conn:
+        for start in range(0, len(unique_hashes), ROW_LOOKUP_BATCH_SIZE):
+            batch = unique_hashes[start : start + ROW_LOOKUP_BATCH_SIZE]
+            placeholders = ", ".join("?" for _ in batch)
+            result = conn.execute(
+                f"SELECT row_hash FROM record_hashes WHERE dataset_id = ? AND row_hash IN ({placeholders})",
+                (dataset_id, *batch),
+            )
+            known.update(row["row_hash"] for row in result)
+    return known
+
+
+def fetch_keyed_rows(dataset_id: str, key_values: list[str]) -> dict[str, tuple[int, bytes]]:
+    """Map key values already in the dataset to (row_index, row_hash)."""
+    keyed: dict[str, tuple[int, bytes]] = {}
+    with get_connection() as conn:
+        for start in range(0, len(key_values), ROW_LOOKUP_BATCH_SIZE):
+            batch = key_values[start : start + ROW_LOOKUP_BATCH_SIZE]
+            placeholders = ", ".join("?" for _ in batch)
+            result = conn.execute(
+                f"""
+                SELECT record_keys.key_value, record_keys.row_index, record_hashes.row_hash
+                FROM record_keys
+                JOIN record_hashes
+                  ON record_hashes.dataset_id = record_keys.dataset_id
+                 AND record_hashes.row_index = record_keys.row_index
+                WHERE record_keys.dataset_id = ? AND record_keys.key_value IN ({placeholders})
+                """,
+                (dataset_id, *batch),
+            )
+            keyed.update((row["key_value"], (row["row_index"], row["row_hash"])) for row in result)
+    return keyed
+
+
+def apply_row_changes(
+    dataset_id: str,
+    inserts: list[tuple[dict[str, str], bytes]],
+    replacements: dict[int, tuple[dict[str, str], bytes]],
+) -> list[dict]:
+    """Append new rows and replace changed rows in place, patching the indexes they touch.
+
+    inserts and replacements carry (row, row_hash). Term and field postings
+    are edited block by block rather than rebuilt, and row_count grows by the
+    number of inserts. Inserted rows are merged into the stored column
+    profile; replacements drop it, because its sketches cannot subtract
+    replaced values, and the caller rebuilds it. Once a dataset has
+    an upsert key, every inserted row is indexed by it, whichever way it was
+    appended, so later upserts find it.
+    Returns the written rows in the fetch_rows shape.
+    """
+    old_rows = {
+        row["row_index"]: row
+        for start in range(0, len(replacements), ROW_LOOKUP_BATCH_SIZE)
+        for row in fetch_rows_by_index(dataset_id, list(replacements)[start : start + ROW_LOOKUP_BATCH_SIZE])
+    }
+    removed_terms: dict[tuple, set[int]] = {}
+    added_terms: dict[tuple, list[int]] = {}
+    removed_values: dict[tuple, set[int]] = {}
+    added_values: dict[tuple, list[int]] = {}
+    for row_index, (row, _) in sorted(replacements.items()):
+        old = old_rows[row_index]
+        old_terms, new_terms = set(tokenize(old["row_text"])), set(tokenize(row_to_text(row)))
+        for term in old_terms - new_terms:
+            removed_terms.setdefault((term,), set()).add(row_index)
+        for term in new_terms - old_terms:
+            added_terms.setdefault((term,), []).append(row_index)
+        old_values, new_values = _field_keys(json.loads(old["row_json"])), _field_keys(row)
+        for key in old_values - new_values:
+            removed_values.setdefault(key, set()).add(row_index)
+        for key in new_values - old_values:
+            added_values.setdefault(key, []).append(row_index)
+
+    with get_connection() as conn:
+        storage = _dataset_storage(conn, dataset_id)
+        dataset = conn.execute(
+            "SELECT row_count, upsert_key FROM datasets WHERE id = ?", (dataset_id,)
+        ).fetchone()
+        start_index, key_column = dataset["row_count"], dataset["upsert_key"]
+        new_rows = [row for row, _ in inserts]
+        if new_rows and storage == STORAGE_COLUMNAR:
+            write_segment(columnar_root(), dataset_id, new_rows, start_index)
+            _insert_postings(conn, dataset_id, [row_to_text(row) for row in new_rows], start_index)
+            _insert_field_postings(conn, dataset_id, new_rows, start_index)
+        elif new_rows:
+            _insert_rows(conn, dataset_id, new_rows, start_index)
+
+        if replacements and storage == STORAGE_COLUMNAR:
+            replace_rows(columnar_root(), dataset_id, {index: row for index, (row, _) in replacements.items()})
+        elif replacements:
+            _replace_rows(conn, dataset_id, {index: row for index, (row, _) in replacements.items()})
+        _patch_postings(conn, dataset_id, "record_postings", ("term",), removed_terms, added_terms)
+        _patch_postings(
+            conn, dataset_id, "field_postings", ("value", "column_name"), removed_values, added_values
+        )
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO record_hashes (dataset_id, row_index, row_hash) VALUES (?, ?, ?)",
+            [(dataset_id, start_index + offset, digest) for offset, (_, digest) in enumerate(inserts)]
+            + [(dataset_id, index, digest) for index, (_, digest) in replacements.items()],
+        )
+        if key_column is not None:
+            # First row per key wins, as in prepare_change_tracking.
+            conn.executemany(
+                "INSERT OR IGNORE INTO record_keys (dataset_id, key_value, row_index) VALUES (?, ?, ?)",
+                [
+                    (dataset_id, str(row[key_column]), start_index + offset)
+                    for offset, (row, _) in enumerate(inserts)
+                    if key_column in row
+                ],
+            )
+        conn.execute(
+            "UPDATE datasets SET row_count = row_count + ? WHERE id = ?", (len(new_rows), dataset_id)
+        )
+        if replacements:
+            conn.execute("DELETE FROM column_profiles WHERE dataset_id = ?", (dataset_id,))
+        elif new_rows:
+            _merge_column_profiles(conn, dataset_id, new_rows, start_index)
+    logger.info(
+        "Applied row changes dataset_id=%s inserted=%s replaced=%s", dataset_id, len(inserts), len(replacements)
+    )
+    written = [(start_index + offset, row) for offset, row in enumerate(new_rows)]
+    written.extend((index, row) for index, (row, _) in replacements.items())
+    return [
+        {"row_index": index, "row_json": json.dumps(row, ensure_ascii=True), "row_text": row_to_text(row)}
+        for index, row in written
+    ]
+
+
+def _iter_row_batches(dataset_id: str, batch_size: int) -> Iterator[tuple[int, list[dict[str, str]]]]:
+    if get_dataset_storage(dataset_id) == STORAGE_COLUMNAR:
+        for segment_start, rows in iter_segments(columnar_root(), dataset_id):
+            for offset in range(0, len(rows), batch_size):
+                yield segment_start + offset, rows[offset : offset + batch_size]
+        return
+    with get_connection() as conn:
+        cursor = conn.execute(
+            """
+            SELECT row_index, row_json
+            FROM records
+            WHERE dataset_id = ?
+            ORDER BY row_index ASC
+            """,
+            (dataset_id,),
+        )
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield batch[0]["row_index"], [json.loads(row["row_json"]) for row in batch]
+
+
+def _dataset_storage(conn: sqlite3.Connection, dataset_id: str) -> str:
+    result = conn.execute("SELECT storage FROM datasets WHERE id = ?", (dataset_id,)).fetchone()
+    return result["storage"] if result else STORAGE_ROWS
+
+
+def _columnar_rows(dataset_id: str, row_indexes: list[int] | None) -> list[dict]:
+    return [
+        {
+            "row_index": row_index,
+            "row_json": json.dumps(row, ensure_ascii=True),
+            "row_text": row_to_text(row),
+        }
+        for row_index, row in read_rows(columnar_root(), dataset_id, row_indexes)
+    ]
+
+
+def _fts_quote(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def row_to_text(row: dict[str, str]) -> str:
     parts = [f"{key}: {value}" for key, value in row.items()]
     return " | ".join(parts)
 
 
+def row_hash(row: dict[str, str]) -> bytes:
+    """Content hash of a row, independent of column order."""
+    payload = json.dumps(row, sort_keys=True, ensure_ascii=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+
 def _seed_default_dataset(conn: sqlite3.Connection) -> None:
     existing = conn.execute(
         "SELECT 1 FROM datasets WHERE id = ? LIMIT 1",
@@ -177,19 +1017,277 @@ def _seed_default_dataset(conn: sqlite3.Connection) -> None:
             DEFAULT_DATASET_CREATED_AT,
         ),
     )
+    _insert_rows(conn, DEFAULT_DATASET_ID, rows)
+    profiler = DatasetProfiler()
+    profiler.update(rows)
+    _insert_column_profiles(conn, DEFAULT_DATASET_ID, profiler)
+    logger.info("Seeded default dataset dataset_id=%s rows=%s", DEFAULT_DATASET_ID, len(rows))
+
+
+def _insert_rows(
+    conn: sqlite3.Connection,
+    dataset_id: str,
+    rows: list[dict[str, str]],
+    start_index: int = 0,
+) -> None:
+    texts = [row_to_text(row) for row in rows]
     conn.executemany(
         """
         INSERT INTO records (dataset_id, row_index, row_json, row_text)
         VALUES (?, ?, ?, ?)
         """,
+        [
+            (dataset_id, start_index + offset, json.dumps(row, ensure_ascii=True), text)
+            for offset, (row, text) in enumerate(zip(rows, texts))
+        ],
+    )
+    _insert_postings(conn, dataset_id, texts, start_index)
+    _insert_field_postings(conn, dataset_id, rows, start_index)
+    conn.execute(
+        """
+        INSERT INTO records_fts (rowid, row_text, dataset_id)
+        SELECT id, row_text, dataset_id
+        FROM records
+        WHERE dataset_id = ? AND row_index >= ? AND row_index < ?
+        """,
+        (dataset_id, start_index, start_index + len(rows)),
+    )
+
+
+def _insert_hashes(
+    conn: sqlite3.Connection, dataset_id: str, rows: list[dict[str, str]], start_index: int
+) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO record_hashes (dataset_id, row_index, row_hash) VALUES (?, ?, ?)",
+        [(dataset_id, start_index + offset, row_hash(row)) for offset, row in enumerate(rows)],
+    )
+
+
+def _replace_rows(conn: sqlite3.Connection, dataset_id: str, rows_by_index: dict[int, dict[str, str]]) -> None:
+    keys = [(dataset_id, row_index) for row_index in rows_by_index]
+    conn.executemany(
+        """
+        INSERT INTO records_fts (records_fts, rowid, row_text, dataset_id)
+        SELECT 'delete', id, row_text, dataset_id
+        FROM records
+        WHERE dataset_id = ? AND row_index = ?
+        """,
+        keys,
+    )
+    conn.executemany(
+        "UPDATE records SET row_json = ?, row_text = ? WHERE dataset_id = ? AND row_index = ?",
+        [
+            (json.dumps(row, ensure_ascii=True), row_to_text(row), dataset_id, row_index)
+            for row_index, row in rows_by_index.items()
+        ],
+    )
+    conn.executemany(
+        """
+        INSERT INTO records_fts (rowid, row_text, dataset_id)
+        SELECT id, row_text, dataset_id
+        FROM records
+        WHERE dataset_id = ? AND row_index = ?
+        """,
+        keys,
+    )
+
+
+def _patch_postings(
+    conn: sqlite3.Connection,
+    dataset_id: str,
+    table: str,
+    key_columns: tuple[str, ...],
+    removed: dict[tuple, set[int]],
+    added: dict[tuple, list[int]],
+) -> None:
+    """Edit stored posting blocks in place for a few changed rows.
+
+    A row index is added to the nearest block starting at or before it, or
+    starts a new block when there is none.
+    """
+    match = " AND ".join(f"{column} = ?" for column in key_columns)
+    columns = ", ".join(key_columns)
+    placeholders = ", ".join("?" for _ in key_columns)
+    for key in removed.keys() | added.keys():
+        blocks = {
+            row["block"]: decode_postings(row["row_indexes"])
+            for row in conn.execute(
+                f"SELECT block, row_indexes FROM {table} WHERE dataset_id = ? AND {match}",
+                (dataset_id, *key),
+            )
+        }
+        changed: set[int] = set()
+        dropped = removed.get(key, set())
+        for block, row_indexes in blocks.items():
+            if dropped.intersection(row_indexes):
+                blocks[block] = array(POSTING_TYPECODE, (index for index in row_indexes if index not in dropped))
+                changed.add(block)
+        starts = sorted(blocks)
+        for row_index in added.get(key, []):
+            position = bisect.bisect_right(starts, row_index) - 1
+            block = starts[position] if position >= 0 else row_index
+            if block not in blocks:
+                blocks[block] = array(POSTING_TYPECODE)
+                bisect.insort(starts, block)
+            bisect.insort(blocks[block], row_index)
+            changed.add(block)
+        for block in changed:
+            if blocks[block]:
+                conn.execute(
+                    f"""
+                    INSERT OR REPLACE INTO {table} (dataset_id, {columns}, block, row_indexes)
+                    VALUES (?, {placeholders}, ?, ?)
+                    """,
+                    (dataset_id, *key, block, encode_postings(blocks[block])),
+                )
+            else:
+                conn.execute(
+                    f"DELETE FROM {table} WHERE dataset_id = ? AND {match} AND block = ?",
+                    (dataset_id, *key, block),
+                )
+
+
+def _field_keys(row: dict[str, str]) -> set[tuple[str, str]]:
+    return {(value, column) for value, columns in build_field_postings([row]).items() for column in columns}
+
+
+def _insert_postings(
+    conn: sqlite3.Connection, dataset_id: str, texts: list[str], start_index: int
+) -> None:
+    postings = build_postings(texts, start_index)
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO record_postings (dataset_id, term, block, row_indexes)
+        VALUES (?, ?, ?, ?)
+        """,
+        [
+            (dataset_id, term, start_index, encode_postings(row_indexes))
+            for term, row_indexes in postings.items()
+        ],
+    )
+
+
+def _insert_field_postings(
+    conn: sqlite3.Connection, dataset_id: str, rows: list[dict[str, str]], start_index: int
+) -> None:
+    postings = build_field_postings(rows, start_index)
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO field_postings (dataset_id, value, column_name, block, row_indexes)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        [
+            (dataset_id, value, column, start_index, encode_postings(row_indexes))
+            for value, columns in postings.items()
+            for column, row_indexes in columns.items()
+        ],
+    )
+
+
+def _insert_column_profiles(
+    conn: sqlite3.Connection, dataset_id: str, profiler: DatasetProfiler
+) -> None:
+    conn.execute("DELETE FROM column_profiles WHERE dataset_id = ?", (dataset_id,))
+    conn.executemany(
+        """
+        INSERT INTO column_profiles (dataset_id, column_name, position, profile_json, state_json)
+        VALUES (?, ?, ?, ?, ?)
+        """,
         [
             (
-                DEFAULT_DATASET_ID,
-                idx,
-                json.dumps(row, ensure_ascii=True),
-                _row_to_text(row),
+                dataset_id,
+                profile["name"],
+                profile["position"],
+                json.dumps(profile, ensure_ascii=True),
+                json.dumps(state, ensure_ascii=True),
             )
-            for idx, row in enumerate(rows)
+            for profile, state in zip(profiler.finalize(), profiler.to_states())
         ],
     )
-    logger.info("Seeded default dataset dataset_id=%s rows=%s", DEFAULT_DATASET_ID, len(rows))
+
+
+def _merge_column_profiles(
+    conn: sqlite3.Connection, dataset_id: str, rows: list[dict[str, str]], start_index: int
+) -> None:
+    """Fold appended rows into the stored profile; drop it when there is no state to merge into."""
+    stored = conn.execute(
+        "SELECT state_json FROM column_profiles WHERE dataset_id = ? ORDER BY position ASC", (dataset_id,)
+    ).fetchall()
+    states = [json.loads(row["state_json"]) for row in stored if row["state_json"] is not None]
+    if not states or len(states) < len(stored) or states[0]["count"] != start_index:
+        conn.execute("DELETE FROM column_profiles WHERE dataset_id = ?", (dataset_id,))
+        return
+    profiler = DatasetProfiler.from_states(states)
+    appended = DatasetProfiler()
+    appended.update(rows)
+    profiler.merge(appended)
+    _insert_column_profiles(conn, dataset_id, profiler)
+
+
+def _backfill_postings(conn: sqlite3.Connection) -> None:
+    missing = conn.execute(
+        """
+        SELECT id FROM datasets
+        WHERE NOT EXISTS (
+            SELECT 1 FROM record_postings WHERE record_postings.dataset_id = datasets.id
+        )
+        """
+    ).fetchall()
+    for dataset in missing:
+        dataset_id = dataset["id"]
+        cursor = conn.execute(
+            """
+            SELECT row_index, row_text
+            FROM records
+            WHERE dataset_id = ?
+            ORDER BY row_index ASC
+            """,
+            (dataset_id,),
+        )
+        total = 0
+        while True:
+            batch = cursor.fetchmany(POSTINGS_BACKFILL_BATCH_SIZE)
+            if not batch:
+                break
+            _insert_postings(
+                conn, dataset_id, [row["row_text"] for row in batch], batch[0]["row_index"]
+            )
+            total += len(batch)
+        logger.info("Backfilled postings dataset_id=%s rows=%s", dataset_id, total)
+
+
+def _backfill_field_postings(conn: sqlite3.Connection) -> None:
+    missing = conn.execute(
+        """
+        SELECT id, storage FROM datasets
+        WHERE NOT EXISTS (
+            SELECT 1 FROM field_postings WHERE field_postings.dataset_id = datasets.id
+        )
+        """
+    ).fetchall()
+    for dataset in missing:
+        dataset_id = dataset["id"]
+        total = 0
+        if dataset["storage"] == STORAGE_COLUMNAR:
+            for segment_start, rows in iter_segments(columnar_root(), dataset_id):
+                _insert_field_postings(conn, dataset_id, rows, segment_start)
+                total += len(rows)
+        else:
+            cursor = conn.execute(
+                """
+                SELECT row_index, row_json
+                FROM records
+                WHERE dataset_id = ?
+                ORDER BY row_index ASC
+                """,
+                (dataset_id,),
+            )
+            while batch := cursor.fetchmany(POSTINGS_BACKFILL_BATCH_SIZE):
+                _insert_field_postings(
+                    conn,
+                    dataset_id,
+                    [json.loads(row["row_json"]) for row in batch],
+                    batch[0]["row_index"],
+                )
+                total += len(batch)
+        logger.info("Backfilled field postings dataset_id=%s rows=%s", dataset_id, total)
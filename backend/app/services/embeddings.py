@@ -0,0 +1,79 @@
+import zlib
+from typing import Iterable
+
+import numpy as np
+import requests
+
+from app.config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_DIM,
+    EMBEDDING_MODEL,
+    EMBEDDING_PROVIDER,
+    OLLAMA_BASE_URL,
+)
+from app.logging_config import get_logger
+from app.services.inverted_index import tokenize
+
+logger = get_logger(__name__)
+
+EMBEDDING_PROVIDERS = ("hashing", "ollama")
+NGRAM_SIZE = 3
+NGRAM_WEIGHT = 0.5
+
+
+def embed_texts(texts: list[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+    """Embed texts in batches and return an L2-normalised float32 matrix."""
+    if EMBEDDING_PROVIDER not in EMBEDDING_PROVIDERS:
+        raise ValueError(
+            f"Unknown embedding provider '{EMBEDDING_PROVIDER}'. "
+            f"Expected one of: {', '.join(EMBEDDING_PROVIDERS)}."
+        )
+    embed_batch = _hashing_embed if EMBEDDING_PROVIDER == "hashing" else _ollama_embed
+    batches = [
+        embed_batch(texts[start : start + batch_size])
+        for start in range(0, len(texts), batch_size)
+    ]
+    if not batches:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    return _normalize(np.vstack(batches))
+
+
+def _hashing_embed(texts: list[str]) -> np.ndarray:
+    """Deterministic hashed word + character n-gram vectors; needs no model server."""
+    vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for position, text in enumerate(texts):
+        for feature, weight in _features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vectors[position, digest % EMBEDDING_DIM] += sign * weight
+    return vectors
+
+
+def _features(text: str) -> Iterable[tuple[str, float]]:
+    for token in tokenize(text):
+        yield f"w:{token}", 1.0
+        padded = f" {token} "
+        for start in range(len(padded) - NGRAM_SIZE + 1):
+            yield f"g:{padded[start : start + NGRAM_SIZE]}", NGRAM_WEIGHT
+
+
+def _ollama_embed(texts: list[str]) -> np.ndarray:
+    response = requests.post(
+        f"{OLLAMA_BASE_URL}/api/embed",
+        json={"model": EMBEDDING_MODEL, "input": texts},
+        timeout=120,
+    )
+    if response.status_code >= 400:
+        raise RuntimeError(
+            f"Ollama embedding request failed ({response.status_code}) at {OLLAMA_BASE_URL} "
+            f"with model '{EMBEDDING_MODEL}': {response.text}"
+        )
+    embeddings = response.json().get("embeddings", [])
+    logger.info("Ollama embeddings received model=%s count=%s", EMBEDDING_MODEL, len(embeddings))
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
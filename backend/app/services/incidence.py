@@ -0,0 +1,133 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Mapping, Sequence
+
+import numpy as np
+
+# Below this ratio of matched postings to rows, scores are accumulated over the
+# matched rows only instead of a dense per-row score vector.
+DENSE_MATCH_RATIO = 0.05
+# Rough bytes per delta entry held in Python lists.
+DELTA_ENTRY_BYTES = 36
+# Once changes recorded since the build exceed this share of the CSR entries,
+# rebuilding is cheaper than filtering around them.
+DELTA_COMPACT_RATIO = 0.25
+DELTA_COMPACT_MIN = 4096
+
+
+@dataclass
+class TokenIncidence:
+    """Sparse token-incidence matrix in term-major CSR form (row ids per term, contiguous).
+
+    Scoring a question is the sparse product of the matrix with the question's
+    term-count vector: only the columns of question terms are touched.
+    Rows changed after the build are kept aside (apply_changes) instead of
+    rebuilding the arrays: their CSR entries are masked out and their current
+    terms live in small per-term delta lists.
+    """
+
+    vocabulary: dict[str, int]
+    indptr: np.ndarray
+    row_ids: np.ndarray
+    row_count: int
+    delta: dict[str, list[int]] = field(default_factory=dict)
+    stale_rows: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    delta_size: int = 0
+
+    @classmethod
+    def from_postings(cls, postings: Mapping[str, Sequence[int]]) -> "TokenIncidence":
+        vocabulary = {term: position for position, term in enumerate(postings)}
+        lengths = np.fromiter((len(rows) for rows in postings.values()), dtype=np.int64, count=len(postings))
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        row_ids = np.empty(int(indptr[-1]), dtype=np.int64)
+        for position, rows in enumerate(postings.values()):
+            row_ids[indptr[position] : indptr[position + 1]] = rows
+        row_count = int(row_ids.max()) + 1 if len(row_ids) else 0
+        return cls(vocabulary=vocabulary, indptr=indptr, row_ids=row_ids, row_count=row_count)
+
+    def __post_init__(self) -> None:
+        self._built_rows = self.row_count
+        self._stale: set[int] = set(self.stale_rows.tolist())
+
+    @property
+    def size_bytes(self) -> int:
+        arrays = self.indptr.nbytes + self.row_ids.nbytes + self.stale_rows.nbytes
+        return arrays + DELTA_ENTRY_BYTES * self.delta_size
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.delta_size + len(self._stale) > max(DELTA_COMPACT_MIN, DELTA_COMPACT_RATIO * len(self.row_ids))
+
+    def apply_changes(
+        self, previous_terms: Mapping[int, Iterable[str]], current_terms: Mapping[int, Iterable[str]]
+    ) -> None:
+        """Record changed rows without touching the CSR arrays.
+
+        previous_terms maps each replaced row to the terms it had; current_terms
+        maps each new or replaced row to the terms it has now. Cost follows the
+        number of changed rows, not the dataset.
+        """
+        stale = set(self._stale)
+        for row_index, terms in previous_terms.items():
+            if row_index < self._built_rows and row_index not in stale:
+                stale.add(row_index)
+                continue
+            for term in set(terms):
+                rows = self.delta.get(term)
+                if rows and row_index in rows:
+                    self.delta[term] = [row for row in rows if row != row_index]
+                    self.delta_size -= 1
+        if len(stale) != len(self._stale):
+            self.stale_rows = np.fromiter(sorted(stale), dtype=np.int64, count=len(stale))
+            self._stale = stale
+        for row_index, terms in current_terms.items():
+            for term in set(terms):
+                self.delta.setdefault(term, []).append(row_index)
+                self.delta_size += 1
+            self.row_count = max(self.row_count, row_index + 1)
+
+    def posting_count(self, terms: Iterable[str]) -> int:
+        """Number of (term, row) entries scoring these terms touches."""
+        return sum(len(self._term_rows(term)) for term in terms)
+
+    def _term_rows(self, term: str) -> np.ndarray:
+        column = self.vocabulary.get(term)
+        rows = self.row_ids[self.indptr[column] : self.indptr[column + 1]] if column is not None else self.row_ids[:0]
+        if len(self.stale_rows) and len(rows):
+            rows = rows[~np.isin(rows, self.stale_rows)]
+        extra = self.delta.get(term)
+        if extra:
+            rows = np.concatenate([rows, np.asarray(extra, dtype=np.int64)])
+        return rows
+
+    def score(self, token_counts: Counter, limit: int) -> list[tuple[int, int]]:
+        """Top `limit` (row_index, score) pairs, ordered by score desc then row_index asc.
+
+        Matches the postings scorer exactly, including tie order.
+        """
+        columns = [(self._term_rows(term), weight) for term, weight in token_counts.items()]
+        columns = [(rows, weight) for rows, weight in columns if len(rows)]
+        if not columns or limit <= 0:
+            return []
+        rows = np.concatenate([rows for rows, _ in columns])
+        weights = np.repeat(
+            np.array([weight for _, weight in columns], dtype=np.int64), [len(rows) for rows, _ in columns]
+        )
+
+        if len(rows) >= DENSE_MATCH_RATIO * self.row_count:
+            dense = np.bincount(rows, weights=weights, minlength=self.row_count).astype(np.int64)
+            candidates = np.flatnonzero(dense)
+            scores = dense[candidates]
+        else:
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights).astype(np.int64)
+
+        # One int64 key orders by score desc, then row_index asc.
+        keys = scores * self.row_count + (self.row_count - 1 - candidates)
+        if len(keys) > limit:
+            top = np.argpartition(-keys, limit - 1)[:limit]
+        else:
+            top = np.arange(len(keys))
+        top = top[np.argsort(-keys[top], kind="stable")]
+        return list(zip(candidates[top].tolist(), scores[top].tolist()))
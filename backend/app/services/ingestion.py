@@ -0,0 +1,242 @@
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from app.config import COLUMNAR_STORAGE, INGEST_CHUNK_SIZE, RETRIEVAL_ENGINE
+from app.logging_config import get_logger
+from app.services.answer_cache import answer_cache
+from app.services.db import (
+    STORAGE_COLUMNAR,
+    STORAGE_ROWS,
+    apply_row_changes,
+    delete_dataset,
+    fetch_keyed_rows,
+    fetch_known_hashes,
+    fetch_row_count,
+    insert_column_profiles,
+    insert_columnar_records,
+    insert_dataset,
+    insert_records,
+    prepare_change_tracking,
+    rebuild_column_profiles,
+    row_hash,
+    row_to_text,
+)
+from app.services.metrics import metrics, stage
+from app.services.parsing import iter_tabular_file
+from app.services.profiling import DatasetProfiler
+from app.services.query_planner import invalidate_dataset_frame
+from app.services.retrieval import VECTOR_ENGINES
+from app.services.row_cache import row_cache
+from app.services.vector_index import index_embeddings, invalidate_vector_index, reindex_embeddings
+
+logger = get_logger(__name__)
+
+_append_locks: dict[str, threading.Lock] = {}
+_append_locks_guard = threading.Lock()
+
+
+@dataclass
+class AppendResult:
+    file_type: str
+    rows_received: int
+    inserted: int
+    updated: int
+    row_count: int
+
+    @property
+    def unchanged(self) -> int:
+        return self.rows_received - self.inserted - self.updated
+
+
+def ingest_file(
+    dataset_id: str,
+    filename: str,
+    path: str | Path,
+    created_at: str,
+    on_progress: Callable[[int, int], None] | None = None,
+    tag: str | None = None,
+) -> tuple[str, int]:
+    """Parse a spooled upload chunk by chunk, inserting each chunk as its own batch.
+
+    The dataset row is written last, so a dataset only becomes visible once all
+    of its records and its column profile are stored. Partially ingested records
+    are removed on failure.
+    Returns (file_type, row_count); a row_count of 0 means nothing was stored.
+    on_progress, if given, is called with (rows_parsed, rows_inserted) per chunk.
+    """
+    file_type, chunks = iter_tabular_file(filename, path, INGEST_CHUNK_SIZE)
+    storage = STORAGE_COLUMNAR if COLUMNAR_STORAGE else STORAGE_ROWS
+    insert_chunk = insert_columnar_records if COLUMNAR_STORAGE else insert_records
+    profiler = DatasetProfiler()
+    row_count = 0
+    try:
+        for rows in _timed_chunks(chunks):
+            if on_progress:
+                on_progress(row_count + len(rows), row_count)
+            with stage("ingest_insert"):
+                insert_chunk(dataset_id=dataset_id, rows=rows, start_index=row_count)
+            if RETRIEVAL_ENGINE in VECTOR_ENGINES:
+                with stage("ingest_embed"):
+                    index_embeddings(dataset_id, [row_to_text(row) for row in rows], row_count)
+            with stage("ingest_profile"):
+                profiler.update(rows)
+            row_count += len(rows)
+            metrics.inc("ingest_rows_total", len(rows), file_type=file_type)
+            if on_progress:
+                on_progress(row_count, row_count)
+        metrics.inc("ingest_bytes_parsed_total", os.path.getsize(path), file_type=file_type)
+        if row_count:
+            insert_column_profiles(dataset_id, profiler)
+            insert_dataset(
+                dataset_id=dataset_id,
+                name=filename,
+                file_type=file_type,
+                row_count=row_count,
+                created_at=created_at,
+                storage=storage,
+                tag=tag,
+            )
+    except Exception:
+        logger.warning("Ingest failed; removing partial dataset dataset_id=%s", dataset_id)
+        delete_dataset(dataset_id)
+        invalidate_vector_index(dataset_id)
+        answer_cache.invalidate_dataset(dataset_id)
+        row_cache.invalidate(dataset_id)
+        invalidate_dataset_frame(dataset_id)
+        raise
+    logger.info(
+        "Ingested file=%s file_type=%s dataset_id=%s rows=%s", filename, file_type, dataset_id, row_count
+    )
+    return file_type, row_count
+
+
+def append_file(dataset_id: str, filename: str, path: str | Path, key: str | None = None) -> AppendResult:
+    """Add an upload's rows to an existing dataset without re-ingesting it.
+
+    Without a key, rows whose content hash is already stored (or repeated in
+    the upload) are skipped. With a key column, a row whose key is new is
+    appended, one whose key exists with different content replaces that row in
+    place, and an identical one is left alone; the last row per key in a chunk
+    wins. An upsert whose first chunk lacks the key column is rejected before
+    anything is written; a later chunk lacking it fails like a parse error.
+    Each chunk commits on its own and reaches the row cache, answer cache and
+    embeddings straight away, so a later parse failure keeps, and serves, the
+    chunks before it. Appends to one dataset run one at a time.
+    """
+    with _append_locks_guard:
+        lock = _append_locks.setdefault(dataset_id, threading.Lock())
+    with lock:
+        file_type, chunks = iter_tabular_file(filename, path, INGEST_CHUNK_SIZE)
+        rows_received = 0
+        inserted = 0
+        updated = 0
+        seen_hashes: set[bytes] = set()
+        for rows in _timed_chunks(chunks):
+            if not rows_received:
+                # Check the key before change tracking records it as the dataset's upsert key.
+                if key is not None:
+                    _require_key(rows, key)
+                prepare_change_tracking(dataset_id, key)
+            rows_received += len(rows)
+            with stage("append_diff"):
+                if key is None:
+                    inserts, replacements = _diff_by_hash(dataset_id, rows, seen_hashes)
+                else:
+                    inserts, replacements = _diff_by_key(dataset_id, rows, key)
+            if not inserts and not replacements:
+                continue
+            with stage("append_apply"):
+                changed_rows = apply_row_changes(dataset_id, inserts, replacements)
+            # The chunk is committed; publish it before parsing the next one can fail.
+            _publish_changes(dataset_id, changed_rows)
+            inserted += len(inserts)
+            updated += len(replacements)
+            metrics.inc("ingest_rows_total", len(inserts), file_type=file_type)
+        metrics.inc("ingest_bytes_parsed_total", os.path.getsize(path), file_type=file_type)
+        if updated:
+            # Replacements dropped the column profile; rebuild it here rather than in a later read.
+            with stage("append_profile"):
+                rebuild_column_profiles(dataset_id)
+        result = AppendResult(
+            file_type=file_type,
+            rows_received=rows_received,
+            inserted=inserted,
+            updated=updated,
+            row_count=fetch_row_count(dataset_id),
+        )
+        metrics.inc("append_rows_total", inserted, result="inserted")
+        metrics.inc("append_rows_total", updated, result="updated")
+        metrics.inc("append_rows_total", result.unchanged, result="unchanged")
+    logger.info(
+        "Appended file=%s dataset_id=%s key=%s received=%s inserted=%s updated=%s",
+        filename,
+        dataset_id,
+        key,
+        rows_received,
+        inserted,
+        updated,
+    )
+    return result
+
+
+def _require_key(rows: list[dict[str, str]], key: str) -> None:
+    if any(key not in row for row in rows):
+        raise ValueError(f"Key column '{key}' is missing from the uploaded rows.")
+
+
+def _publish_changes(dataset_id: str, changed_rows: list[dict]) -> None:
+    if RETRIEVAL_ENGINE in VECTOR_ENGINES:
+        with stage("ingest_embed"):
+            reindex_embeddings(dataset_id, {row["row_index"]: row["row_text"] for row in changed_rows})
+    row_cache.apply_changes(dataset_id, changed_rows)
+    invalidate_dataset_frame(dataset_id)
+    answer_cache.invalidate_dataset(dataset_id)
+
+
+def _diff_by_hash(
+    dataset_id: str, rows: list[dict[str, str]], seen_hashes: set[bytes]
+) -> tuple[list[tuple[dict[str, str], bytes]], dict]:
+    hashed = [(row, row_hash(row)) for row in rows]
+    known = fetch_known_hashes(dataset_id, [digest for _, digest in hashed])
+    inserts = []
+    for row, digest in hashed:
+        if digest in known or digest in seen_hashes:
+            continue
+        seen_hashes.add(digest)
+        inserts.append((row, digest))
+    return inserts, {}
+
+
+def _diff_by_key(
+    dataset_id: str, rows: list[dict[str, str]], key: str
+) -> tuple[list[tuple[dict[str, str], bytes]], dict[int, tuple[dict[str, str], bytes]]]:
+    _require_key(rows, key)
+    latest: dict[str, dict[str, str]] = {}
+    for row in rows:
+        latest[str(row[key])] = row
+    existing = fetch_keyed_rows(dataset_id, list(latest))
+    inserts = []
+    replacements = {}
+    for key_value, row in latest.items():
+        digest = row_hash(row)
+        if key_value not in existing:
+            inserts.append((row, digest))
+            continue
+        row_index, stored_digest = existing[key_value]
+        if digest != stored_digest:
+            replacements[row_index] = (row, digest)
+    return inserts, replacements
+
+
+def _timed_chunks(chunks: Iterable[list[dict[str, str]]]) -> Iterator[list[dict[str, str]]]:
+    """Yield parsed chunks, timing the parse of each one as its own stage."""
+    iterator = iter(chunks)
+    while True:
+        with stage("ingest_parse"):
+            rows = next(iterator, None)
+        if rows is None:
+            return
+        yield rows
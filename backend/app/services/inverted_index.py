@@ -0,0 +1,60 @@
+import re
+from array import array
+from collections import defaultdict
+from typing import Iterable
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+MIN_TOKEN_LENGTH = 2
+POSTING_TYPECODE = "I"
+# Longer values are free text rather than something a question filters on.
+MAX_FIELD_VALUE_TOKENS = 4
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) >= MIN_TOKEN_LENGTH
+    ]
+
+
+def build_postings(texts: Iterable[str], start_index: int = 0) -> dict[str, array]:
+    """Map each term to the ascending row indexes whose text contains it."""
+    postings: dict[str, array] = defaultdict(lambda: array(POSTING_TYPECODE))
+    for offset, text in enumerate(texts):
+        row_index = start_index + offset
+        for term in set(tokenize(text)):
+            postings[term].append(row_index)
+    return dict(postings)
+
+
+def normalize_value(value: str) -> str:
+    return " ".join(TOKEN_PATTERN.findall(value.lower()))
+
+
+def build_field_postings(
+    rows: Iterable[dict[str, str]], start_index: int = 0
+) -> dict[str, dict[str, array]]:
+    """Map each normalized short field value to {column: ascending row indexes}."""
+    postings: dict[str, dict[str, array]] = defaultdict(dict)
+    for offset, row in enumerate(rows):
+        row_index = start_index + offset
+        for column, value in row.items():
+            normalized = normalize_value(str(value))
+            if not normalized or normalized.count(" ") >= MAX_FIELD_VALUE_TOKENS:
+                continue
+            columns = postings[normalized]
+            if column not in columns:
+                columns[column] = array(POSTING_TYPECODE)
+            columns[column].append(row_index)
+    return dict(postings)
+
+
+def encode_postings(row_indexes: array) -> bytes:
+    return row_indexes.tobytes()
+
+
+def decode_postings(blob: bytes) -> array:
+    row_indexes = array(POSTING_TYPECODE)
+    row_indexes.frombytes(blob)
+    return row_indexes
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from app.config import INGEST_WORKERS
+from app.logging_config import get_logger
+from app.services.ingestion import ingest_file
+from app.services.parsing import estimate_row_count
+
+logger = get_logger(__name__)
+
+MAX_RETAINED_JOBS = 200
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest-job")
+_jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+@dataclass
+class IngestJob:
+    job_id: str
+    dataset_id: str
+    filename: str
+    created_at: str
+    tag: str | None = None
+    status: str = "queued"
+    rows_parsed: int = 0
+    rows_inserted: int = 0
+    rows_estimated: int | None = None
+    file_type: str | None = None
+    error: str | None = None
+    started_at: float | None = None
+    finished_at: float | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def start(self, rows_estimated: int | None) -> None:
+        with self._lock:
+            self.status = "running"
+            self.rows_estimated = rows_estimated
+            self.started_at = time.perf_counter()
+
+    def record_progress(self, rows_parsed: int, rows_inserted: int) -> None:
+        with self._lock:
+            self.rows_parsed = rows_parsed
+            self.rows_inserted = rows_inserted
+
+    def finish(self, file_type: str, row_count: int) -> None:
+        with self._lock:
+            self.file_type = file_type
+            if row_count:
+                self.status = "completed"
+            else:
+                self.status = "failed"
+                self.error = "No records found in uploaded file."
+            self.finished_at = time.perf_counter()
+
+    def fail(self, error: str) -> None:
+        with self._lock:
+            self.status = "failed"
+            self.error = error
+            self.finished_at = time.perf_counter()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            elapsed = None
+            if self.started_at is not None:
+                elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+            if self.finished_at is not None:
+                progress = 1.0
+            elif self.rows_estimated:
+                # The estimate can overshoot or undershoot; hold short of done until the job says so.
+                progress = min(self.rows_inserted / self.rows_estimated, 0.99)
+            else:
+                progress = 0.0
+            return {
+                "job_id": self.job_id,
+                "dataset_id": self.dataset_id,
+                "filename": self.filename,
+                "created_at": self.created_at,
+                "tag": self.tag,
+                "status": self.status,
+                "file_type": self.file_type,
+                "rows_parsed": self.rows_parsed,
+                "rows_inserted": self.rows_inserted,
+                "rows_estimated": self.rows_estimated,
+                "progress": round(progress, 3),
+                "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+                "rows_per_second": round(self.rows_inserted / elapsed, 1) if elapsed else None,
+                "error": self.error,
+            }
+
+
+def submit_ingest_job(filename: str, spool_path: str, tag: str | None = None) -> IngestJob:
+    """Queue a spooled upload for ingestion; the worker owns and removes spool_path."""
+    job = IngestJob(
+        job_id=str(uuid4()),
+        dataset_id=str(uuid4()),
+        filename=filename,
+        created_at=datetime.now(timezone.utc).isoformat(),
+        tag=tag,
+    )
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+        while len(_jobs) > MAX_RETAINED_JOBS:
+            _jobs.popitem(last=False)
+    _executor.submit(_run_job, job, spool_path)
+    logger.info("Queued ingest job job_id=%s dataset_id=%s file=%s", job.job_id, job.dataset_id, filename)
+    return job
+
+
+def get_job(job_id: str) -> IngestJob | None:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def _run_job(job: IngestJob, spool_path: str) -> None:
+    try:
+        try:
+            rows_estimated = estimate_row_count(job.filename, spool_path)
+        except (OSError, ValueError):
+            rows_estimated = None
+        job.start(rows_estimated)
+        file_type, row_count = ingest_file(
+            job.dataset_id, job.filename, spool_path, job.created_at, on_progress=job.record_progress, tag=job.tag
+        )
+        job.finish(file_type, row_count)
+    except Exception as exc:
+        logger.exception("Ingest job failed job_id=%s file=%s", job.job_id, job.filename)
+        job.fail(str(exc))
+    finally:
+        os.remove(spool_path)
+    logger.info("Ingest job finished job_id=%s status=%s", job.job_id, job.status)
@@ -1,10 +1,158 @@
+import asyncio
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 
-from app.config import OLLAMA_BASE_URL, OLLAMA_MODEL
+from app.config import (
+    LLM_MAX_IN_FLIGHT,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    OLLAMA_BASE_URL,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MODEL,
+    OLLAMA_TIMEOUT_SECONDS,
+)
 from app.logging_config import get_logger
+from app.services.metrics import record_stage
 
 logger = get_logger(__name__)
 
+SYSTEM_PROMPT = (
+    "You are a dataset QA assistant.\n"
+    "Answer only from the provided CONTEXT.\n"
+    "If the answer is not in context, reply exactly: "
+    "'I don't know based on the uploaded dataset.'"
+)
+
+_session: requests.Session | None = None
+_async_client: httpx.AsyncClient | None = None
+
+
+class LLMBusyError(RuntimeError):
+    """Raised instead of queueing when the model cannot take the call soon enough."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    """Caps concurrent model calls and the number of callers waiting for a slot.
+
+    Ollama serialises generation, so extra concurrency only piles up threads and
+    timeouts. Callers beyond max_in_flight wait in a bounded queue; when the
+    queue is full they are rejected at once (429), and a caller that waits longer
+    than queue_timeout gives up (503). Both carry a Retry-After estimate.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float) -> None:
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._avg_call_seconds = 5.0
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    def acquire(self) -> float:
+        """Block until a slot is free; return the time the call started."""
+        requested = time.perf_counter()
+        with self._condition:
+            if self._in_flight >= self.max_in_flight:
+                if self._queued >= self.max_queue:
+                    self._stats["rejected"] += 1
+                    raise LLMBusyError("Model queue is full.", 429, self._retry_after())
+                self._queued += 1
+                try:
+                    ready = self._condition.wait_for(
+                        lambda: self._in_flight < self.max_in_flight, timeout=self.queue_timeout
+                    )
+                finally:
+                    self._queued -= 1
+                if not ready:
+                    self._stats["timed_out"] += 1
+                    raise LLMBusyError("Timed out waiting for the model.", 503, self._retry_after())
+            self._in_flight += 1
+            started = time.perf_counter()
+            wait_ms = (started - requested) * 1000
+            self._stats["total_wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        record_stage("llm_queue", started - requested)
+        return started
+
+    async def acquire_async(self) -> float:
+        """acquire() from async code; a caller cancelled while queued does not leak a slot.
+
+        The worker thread cannot be interrupted, so on cancellation the slot it
+        eventually obtains is handed straight back.
+        """
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.acquire))
+        try:
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            waiter.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, waiter: "asyncio.Future[float]") -> None:
+        # exception() also marks a busy rejection as retrieved.
+        if not waiter.cancelled() and waiter.exception() is None:
+            self.release(waiter.result())
+
+    def release(self, started: float) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._stats["completed"] += 1
+            self._avg_call_seconds = 0.8 * self._avg_call_seconds + 0.2 * (time.perf_counter() - started)
+            self._condition.notify()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        started = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def stats(self) -> dict:
+        with self._condition:
+            admitted = self._stats["completed"] + self._in_flight
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "completed": self._stats["completed"],
+                "rejected": self._stats["rejected"],
+                "timed_out": self._stats["timed_out"],
+                "avg_wait_ms": round(self._stats["total_wait_ms"] / admitted, 2) if admitted else 0.0,
+                "max_wait_ms": round(self._stats["max_wait_ms"], 2),
+                "avg_call_seconds": round(self._avg_call_seconds, 3),
+            }
+
+    def _retry_after(self) -> int:
+        # Time for the calls ahead of a newcomer to drain through the available slots.
+        ahead = self._in_flight + self._queued + 1
+        return max(1, math.ceil(self._avg_call_seconds * ahead / self.max_in_flight))
+
+
+llm_scheduler = LLMScheduler(LLM_MAX_IN_FLIGHT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_SECONDS)
+
 
 def answer_from_context(question: str, context: str) -> str:
     logger.info(
@@ -13,30 +161,147 @@ def answer_from_context(question: str, context: str) -> str:
         OLLAMA_BASE_URL,
         len(context),
     )
-    prompt = (
-        "You are a dataset QA assistant.\n"
-        "Answer only from the provided CONTEXT.\n"
-        "If the answer is not in context, reply exactly: "
-        "'I don't know based on the uploaded dataset.'\n\n"
-        f"QUESTION:\n{question}\n\n"
-        f"CONTEXT:\n{context}\n"
+    payload = _generate_payload(question, context, stream=False)
+    with llm_scheduler.slot():
+        response = _get_session().post(
+            f"{OLLAMA_BASE_URL}/api/generate",
+            json=payload,
+            timeout=OLLAMA_TIMEOUT_SECONDS,
+        )
+    if response.status_code >= 400:
+        raise _ollama_error(response.status_code, response.text)
+    data = response.json()
+    _log_completion("Ollama response received", data)
+    return data.get("response", "").strip()
+
+
+async def stream_answer_from_context(question: str, context: str) -> AsyncIterator[str]:
+    """Yield response tokens as Ollama generates them.
+
+    The caller holds an llm_scheduler slot for the whole stream, so it can turn a
+    busy scheduler into an HTTP error before the response starts.
+    """
+    logger.info(
+        "Streaming from Ollama model=%s base_url=%s context_chars=%s",
+        OLLAMA_MODEL,
+        OLLAMA_BASE_URL,
+        len(context),
     )
-    response = requests.post(
+    client = _get_async_client()
+    payload = _generate_payload(question, context, stream=True)
+    async with client.stream(
+        "POST",
         f"{OLLAMA_BASE_URL}/api/generate",
-        json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False},
-        timeout=120,
+        json=payload,
+    ) as response:
+        if response.status_code >= 400:
+            raise _ollama_error(response.status_code, (await response.aread()).decode("utf-8", "replace"))
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(f"Ollama stream failed with model '{OLLAMA_MODEL}': {chunk['error']}")
+            if chunk.get("response"):
+                yield chunk["response"]
+            if chunk.get("done"):
+                _log_completion("Ollama stream finished", chunk)
+                break
+
+
+def prewarm_model() -> bool:
+    """Load the model and keep it resident for OLLAMA_KEEP_ALIVE.
+
+    An empty prompt is Ollama's load-only request. Every chat sends the same
+    system prompt first, so Ollama's prompt cache reuses its evaluation from
+    one chat to the next.
+    """
+    try:
+        response = _get_session().post(
+            f"{OLLAMA_BASE_URL}/api/generate",
+            json={
+                "model": OLLAMA_MODEL,
+                "prompt": "",
+                "stream": False,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+            },
+            timeout=OLLAMA_TIMEOUT_SECONDS,
+        )
+        if response.status_code >= 400:
+            raise _ollama_error(response.status_code, response.text)
+        data = response.json()
+    except Exception as exc:
+        logger.warning("Ollama prewarm failed model=%s: %s", OLLAMA_MODEL, exc)
+        return False
+    logger.info("Ollama model prewarmed model=%s done_reason=%s", OLLAMA_MODEL, data.get("done_reason"))
+    return True
+
+
+async def close_llm_clients() -> None:
+    global _async_client, _session
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def _build_prompt(question: str, context: str) -> str:
+    return f"QUESTION:\n{question}\n\nCONTEXT:\n{context}\n"
+
+
+def _generate_payload(question: str, context: str, stream: bool) -> dict:
+    return {
+        "model": OLLAMA_MODEL,
+        "system": SYSTEM_PROMPT,
+        "prompt": _build_prompt(question, context),
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+    }
+
+
+def _log_completion(message: str, data: dict) -> None:
+    logger.info(
+        "%s model=%s prompt_eval_count=%s prompt_eval_ms=%.1f",
+        message,
+        OLLAMA_MODEL,
+        data.get("prompt_eval_count"),
+        data.get("prompt_eval_duration", 0) / 1e6,
     )
-    if response.status_code >= 400:
-        detail = response.text
-        try:
-            payload = response.json()
-            detail = payload.get("error", detail)
-        except Exception:
-            pass
-        raise RuntimeError(
-            f"Ollama request failed ({response.status_code}) at {OLLAMA_BASE_URL} "
-            f"with model '{OLLAMA_MODEL}': {detail}"
+
+
+def _ollama_error(status_code: int, text: str) -> RuntimeError:
+    detail = text
+    try:
+        detail = json.loads(text).get("error", detail)
+    except Exception:
+        pass
+    return RuntimeError(
+        f"Ollama request failed ({status_code}) at {OLLAMA_BASE_URL} "
+        f"with model '{OLLAMA_MODEL}': {detail}"
+    )
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_MAX_CONNECTIONS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=OLLAMA_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+            ),
         )
-    data = response.json()
-    logger.info("Ollama response received model=%s", OLLAMA_MODEL)
-    return data.get("response", "").strip()
+    return _async_client
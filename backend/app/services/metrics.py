@@ -0,0 +1,181 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+# Upper bounds in seconds; a final +Inf bucket is implied.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = "lda_"
+
+Labels = tuple[tuple[str, str], ...]
+
+_timings: ContextVar[dict[str, float] | None] = ContextVar("stage_timings", default=None)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, bucket_count: int) -> None:
+        self.counts = [0] * (bucket_count + 1)
+        self.total = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """In-process counters and histograms, rendered in the Prometheus text format.
+
+    Updates take one short lock and a bisect, so they are cheap enough for
+    per-request and per-chunk use; nothing is sampled or aggregated in the background.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._histograms: dict[str, dict[Labels, _Histogram]] = {}
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(len(self.buckets))
+            histogram.counts[bucket] += 1
+            histogram.total += value
+            histogram.count += 1
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def histogram_count(self, name: str, **labels: str) -> int:
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(tuple(sorted(labels.items())))
+            return histogram.count if histogram else 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(
+        self,
+        counters: dict[str, dict[Labels, float]] | None = None,
+        gauges: dict[str, dict[Labels, float]] | None = None,
+    ) -> str:
+        """Prometheus text exposition.
+
+        counters and gauges are point-in-time values kept elsewhere (e.g. cache
+        statistics), merged in at scrape time.
+        """
+        lines: list[str] = []
+        with self._lock:
+            own_counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: (list(h.counts), h.total, h.count) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+
+        for kind, families in (("counter", {**own_counters, **(counters or {})}), ("gauge", gauges or {})):
+            for name, series in sorted(families.items()):
+                self._header(lines, name, kind)
+                for key, value in sorted(series.items()):
+                    lines.append(f"{METRIC_PREFIX}{name}{_labels(key)} {_number(value)}")
+        for name, series in sorted(histograms.items()):
+            self._header(lines, name, "histogram")
+            for key, (counts, total, count) in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{METRIC_PREFIX}{name}_sum{_labels(key)} {_number(total)}")
+                lines.append(f"{METRIC_PREFIX}{name}_count{_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: list[str], name: str, kind: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {self._help[name]}")
+        lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into the stage_duration_seconds histogram and the current timing breakdown."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Record a stage duration measured elsewhere."""
+    metrics.observe("stage_duration_seconds", seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def collect_timings() -> Iterator[dict[str, float]]:
+    """Collect stage durations (seconds) recorded in this context, e.g. for one chat request.
+
+    Stages run on other threads (batch workers, the hybrid pool) still reach the
+    histograms but not this breakdown.
+    """
+    timings: dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def _labels(key: Labels) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+metrics = Metrics()
+metrics.describe("stage_duration_seconds", "Time spent in each chat/upload stage.")
+metrics.describe("http_request_duration_seconds", "HTTP request latency by route template.")
+metrics.describe("http_requests_total", "HTTP requests by route template and status code.")
+metrics.describe("retrieval_rows_scanned_total", "Posting entries visited by lexical and field-filter scoring.")
+metrics.describe("retrieval_rows_returned_total", "Rows returned by retrieval, by engine.")
+metrics.describe("ingest_bytes_parsed_total", "Bytes of uploaded files parsed by ingestion.")
+metrics.describe("ingest_rows_total", "Rows inserted by ingestion.")
+metrics.describe("append_rows_total", "Appended rows by whether they were inserted, updated or unchanged.")
+metrics.describe("chat_answers_total", "Chat answers by how they were produced.")
+metrics.describe("answer_cache_lookups_total", "Answer cache lookups by result.")
+metrics.describe("row_cache_lookups_total", "Row cache lookups by result.")
+metrics.describe("llm_calls_total", "Model calls by outcome at the scheduler.")
+metrics.describe("chat_coalesced_total", "Chat requests that shared an identical in-flight request.")
+metrics.describe("answer_cache_entries", "Answers currently cached in memory.")
+metrics.describe("row_cache_datasets", "Datasets currently held by the row cache.")
+metrics.describe("row_cache_used_bytes", "Estimated bytes held by the row cache.")
+metrics.describe("llm_in_flight", "Model calls currently running.")
+metrics.describe("llm_queued", "Model calls waiting for a slot.")
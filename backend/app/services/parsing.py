@@ -1,6 +1,7 @@
 import io
 import json
-from typing import Any
+from pathlib import Path
+from typing import Any, Iterator, TextIO
 
 import pandas as pd
 
@@ -8,16 +9,174 @@ from app.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+ESTIMATE_READ_SIZE = 1 << 20
 
-def parse_tabular_file(filename: str, content: bytes) -> tuple[str, list[dict[str, str]]]:
+
+def detect_file_type(filename: str) -> str:
     lower_name = filename.lower()
     if lower_name.endswith(".csv"):
-        return "csv", _parse_csv(content)
+        return "csv"
     if lower_name.endswith(".json"):
-        return "json", _parse_json(content)
+        return "json"
     raise ValueError("Unsupported file type. Please upload a .csv or .json file.")
 
 
+def parse_tabular_file(filename: str, content: bytes) -> tuple[str, list[dict[str, str]]]:
+    file_type = detect_file_type(filename)
+    if file_type == "csv":
+        return file_type, _parse_csv(content)
+    return file_type, _parse_json(content)
+
+
+def iter_tabular_file(
+    filename: str, path: str | Path, chunk_size: int
+) -> tuple[str, Iterator[list[dict[str, str]]]]:
+    """Like parse_tabular_file, but streams rows from disk in chunks of at most chunk_size."""
+    file_type = detect_file_type(filename)
+    if file_type == "csv":
+        return file_type, _iter_csv(path, chunk_size)
+    return file_type, _chunked(_iter_json(path), chunk_size)
+
+
+def estimate_row_count(filename: str, path: str | Path) -> int:
+    """Rough row count for progress reporting, from one byte scan of the file.
+
+    CSV counts lines after the header; JSON counts opening braces, less a
+    wrapping object. Quoted newlines and nested objects make it overshoot.
+    """
+    file_type = detect_file_type(filename)
+    marker = b"\n" if file_type == "csv" else b"{"
+    count = 0
+    first = last = b""
+    with open(path, "rb") as stream:
+        while block := stream.read(ESTIMATE_READ_SIZE):
+            first = first or block.lstrip()[:1]
+            count += block.count(marker)
+            last = block[-1:]
+    if file_type == "csv":
+        return max(count - 1 + (last not in (b"", b"\n")), 0)
+    return max(count - (first == b"{"), 0)
+
+
+def _iter_csv(path: str | Path, chunk_size: int) -> Iterator[list[dict[str, str]]]:
+    for frame in pd.read_csv(path, dtype=str, chunksize=chunk_size):
+        rows = frame.fillna("").to_dict(orient="records")
+        logger.info("CSV chunk parsed rows=%s columns=%s", len(rows), len(frame.columns))
+        yield [_normalize_row(row) for row in rows]
+
+
+def _iter_json(path: str | Path) -> Iterator[dict[str, str]]:
+    with open(path, "r", encoding="utf-8") as stream:
+        reader = _JsonStreamReader(stream)
+        first = reader.peek()
+        if first == "[":
+            yield from (_normalize_row(item) for item in reader.iter_array() if isinstance(item, dict))
+        elif first == "{":
+            yield from reader.iter_object_records()
+        else:
+            raise ValueError("JSON must be an object, list of objects, or {\"records\": [...]} format.")
+
+
+def _chunked(rows: Iterator[dict[str, str]], chunk_size: int) -> Iterator[list[dict[str, str]]]:
+    chunk: list[dict[str, str]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _JsonStreamReader:
+    """Incremental reader for a top-level JSON array or object; holds one value at a time."""
+
+    READ_SIZE = 1 << 20
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input.")
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Invalid JSON: expected '{char}'.")
+        self._pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A value ending exactly at the buffer edge may be a truncated number.
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_array(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == "]":
+                self._pos += 1
+                return
+            self.expect(",")
+
+    def iter_object_records(self) -> Iterator[dict[str, str]]:
+        """Stream {"records": [...]} items; any other object is returned as a single row."""
+        self.expect("{")
+        fields: dict[str, Any] = {}
+        streamed_records = False
+        if self.peek() != "}":
+            while True:
+                key = self.value()
+                self.expect(":")
+                if key == "records" and self.peek() == "[":
+                    streamed_records = True
+                    for item in self.iter_array():
+                        if isinstance(item, dict):
+                            yield _normalize_row(item)
+                else:
+                    fields[key] = self.value()
+                if self.peek() == "}":
+                    break
+                self.expect(",")
+        self._pos += 1
+        if not streamed_records:
+            logger.info("JSON parsed single object.")
+            yield _normalize_row(fields)
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._stream.read(self.READ_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+
 def _parse_csv(content: bytes) -> list[dict[str, str]]:
     frame = pd.read_csv(io.BytesIO(content), dtype=str).fillna("")
     rows = frame.to_dict(orient="records")
@@ -0,0 +1,234 @@
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+DISTINCT_SKETCH_SIZE = 1024
+TRACKED_VALUES = 1000
+TOP_VALUES = 10
+SAMPLE_SIZE = 2048
+HISTOGRAM_BINS = 10
+HASH_SPACE = float(2**64)
+
+
+@dataclass
+class ColumnStats:
+    """Mergeable per-column statistics, so chunked ingest can combine partial profiles.
+
+    Distinct counts use a k-minimum-values sketch (exact below DISTINCT_SKETCH_SIZE),
+    top values keep the TRACKED_VALUES most frequent values seen so far, and the
+    histogram is computed from a count-weighted sample of numeric values.
+    """
+
+    name: str
+    position: int
+    count: int = 0
+    null_count: int = 0
+    numeric_count: int = 0
+    integral: bool = True
+    minimum: float | None = None
+    maximum: float | None = None
+    value_counts: Counter = field(default_factory=Counter)
+    sketch: list[int] = field(default_factory=list)
+    sample: list[float] = field(default_factory=list)
+
+    def update(self, values: pd.Series) -> None:
+        """Fold one chunk of raw string values (NaN for a missing key) into the stats."""
+        present = values.notna() & (values.astype(str) != "")
+        self.count += len(values)
+        self.null_count += int((~present).sum())
+        kept = values[present].astype(str)
+        if kept.empty:
+            return
+
+        counts = kept.value_counts()
+        self.value_counts.update(counts.to_dict())
+        self._trim_values()
+        self._merge_sketch([_hash64(value) for value in counts.index])
+
+        numeric = pd.to_numeric(kept, errors="coerce").dropna().to_numpy(dtype=np.float64)
+        numeric = numeric[np.isfinite(numeric)]
+        if len(numeric):
+            self._merge_numeric(
+                count=len(numeric),
+                integral=bool(np.all(np.mod(numeric, 1) == 0)),
+                minimum=float(numeric.min()),
+                maximum=float(numeric.max()),
+                sample=_sample(numeric, SAMPLE_SIZE).tolist(),
+            )
+
+    def merge(self, other: "ColumnStats") -> None:
+        self.count += other.count
+        self.null_count += other.null_count
+        self.value_counts.update(other.value_counts)
+        self._trim_values()
+        self._merge_sketch(other.sketch)
+        if other.numeric_count:
+            self._merge_numeric(
+                other.numeric_count, other.integral, other.minimum, other.maximum, other.sample
+            )
+
+    def to_state(self) -> dict:
+        """JSON-safe internal state, so a stored profile can keep absorbing appended rows."""
+        return {
+            "name": self.name,
+            "position": self.position,
+            "count": self.count,
+            "null_count": self.null_count,
+            "numeric_count": self.numeric_count,
+            "integral": self.integral,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "value_counts": [[value, count] for value, count in self.value_counts.items()],
+            "sketch": self.sketch,
+            "sample": self.sample,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "ColumnStats":
+        return cls(**{**state, "value_counts": Counter(dict(state["value_counts"]))})
+
+    def to_dict(self) -> dict:
+        non_null = self.count - self.null_count
+        if non_null == 0:
+            column_type = "empty"
+        elif self.numeric_count == non_null:
+            column_type = "integer" if self.integral else "float"
+        else:
+            column_type = "string"
+        is_numeric = column_type in ("integer", "float")
+        return {
+            "name": self.name,
+            "position": self.position,
+            "type": column_type,
+            "count": self.count,
+            "null_count": self.null_count,
+            "null_rate": round(self.null_count / self.count, 4) if self.count else 0.0,
+            "distinct_count": self.distinct_count(),
+            "distinct_is_estimate": len(self.sketch) >= DISTINCT_SKETCH_SIZE,
+            "min": _plain_number(self.minimum) if is_numeric else None,
+            "max": _plain_number(self.maximum) if is_numeric else None,
+            "top_values": [
+                {"value": value, "count": count}
+                for value, count in self.value_counts.most_common(TOP_VALUES)
+            ],
+            "histogram": self._histogram() if is_numeric else None,
+        }
+
+    def distinct_count(self) -> int:
+        if len(self.sketch) < DISTINCT_SKETCH_SIZE:
+            return len(self.sketch)
+        return int((DISTINCT_SKETCH_SIZE - 1) / (self.sketch[-1] / HASH_SPACE))
+
+    def _merge_sketch(self, hashes: list[int]) -> None:
+        self.sketch = sorted(set(self.sketch).union(hashes))[:DISTINCT_SKETCH_SIZE]
+
+    def _merge_numeric(
+        self, count: int, integral: bool, minimum: float, maximum: float, sample: list[float]
+    ) -> None:
+        total = self.numeric_count + count
+        keep_own = round(SAMPLE_SIZE * self.numeric_count / total)
+        rng = np.random.default_rng(total)
+        self.sample = (
+            _sample(np.asarray(self.sample), keep_own, rng).tolist()
+            + _sample(np.asarray(sample), SAMPLE_SIZE - keep_own, rng).tolist()
+        )
+        self.numeric_count = total
+        self.integral = self.integral and integral
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def _trim_values(self) -> None:
+        if len(self.value_counts) > TRACKED_VALUES:
+            self.value_counts = Counter(dict(self.value_counts.most_common(TRACKED_VALUES)))
+
+    def _histogram(self) -> dict:
+        sample = np.asarray(self.sample)
+        if not len(sample):
+            return {"edges": [], "counts": []}
+        counts, edges = np.histogram(sample, bins=HISTOGRAM_BINS, range=(self.minimum, self.maximum))
+        scale = self.numeric_count / len(sample)
+        return {
+            "edges": [_plain_number(edge) for edge in edges.tolist()],
+            "counts": [int(round(count * scale)) for count in counts.tolist()],
+        }
+
+
+class DatasetProfiler:
+    """Accumulates column statistics across ingest chunks."""
+
+    def __init__(self) -> None:
+        self.columns: dict[str, ColumnStats] = {}
+        self.row_count = 0
+
+    def update(self, rows: list[dict[str, str]]) -> None:
+        frame = pd.DataFrame.from_records(rows)
+        for name in frame.columns:
+            key = str(name)
+            if key not in self.columns:
+                stats = ColumnStats(name=key, position=len(self.columns))
+                # Rows before this chunk did not have the column.
+                stats.count = stats.null_count = self.row_count
+                self.columns[key] = stats
+        for key, stats in self.columns.items():
+            if key in frame.columns:
+                stats.update(frame[key])
+            else:
+                stats.count += len(frame)
+                stats.null_count += len(frame)
+        self.row_count += len(frame)
+
+    def merge(self, other: "DatasetProfiler") -> None:
+        for key, stats in other.columns.items():
+            if key in self.columns:
+                self.columns[key].merge(stats)
+            else:
+                merged = ColumnStats(name=key, position=len(self.columns))
+                merged.count = merged.null_count = self.row_count
+                merged.merge(stats)
+                self.columns[key] = merged
+        for key, stats in self.columns.items():
+            if key not in other.columns:
+                stats.count += other.row_count
+                stats.null_count += other.row_count
+        self.row_count += other.row_count
+
+    def finalize(self) -> list[dict]:
+        return [stats.to_dict() for stats in self.columns.values()]
+
+    def to_states(self) -> list[dict]:
+        return [stats.to_state() for stats in self.columns.values()]
+
+    @classmethod
+    def from_states(cls, states: list[dict]) -> "DatasetProfiler":
+        """Rebuild a profiler from to_states() output, columns in position order."""
+        profiler = cls()
+        for state in sorted(states, key=lambda state: state["position"]):
+            profiler.columns[state["name"]] = ColumnStats.from_state(state)
+        profiler.row_count = states[0]["count"] if states else 0
+        return profiler
+
+
+def profile_rows(rows: list[dict[str, str]]) -> list[dict]:
+    profiler = DatasetProfiler()
+    profiler.update(rows)
+    return profiler.finalize()
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _sample(values: np.ndarray, size: int, rng: np.random.Generator | None = None) -> np.ndarray:
+    if len(values) <= size:
+        return values
+    rng = rng or np.random.default_rng(len(values))
+    return rng.choice(values, size=size, replace=False)
+
+
+def _plain_number(value: float | None) -> int | float | None:
+    if value is None:
+        return None
+    return int(value) if float(value).is_integer() else value
@@ -0,0 +1,395 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from app.config import FRAME_CACHE_MAX_DATASETS
+from app.logging_config import get_logger
+from app.services.columnar import load_frame
+from app.services.db import (
+    STORAGE_COLUMNAR,
+    columnar_root,
+    fetch_column_profiles,
+    fetch_known_terms,
+    fetch_rows,
+    get_dataset_storage,
+)
+from app.services.inverted_index import tokenize
+from app.services.retrieval import FIELD_FILTER_STOPWORDS
+from app.services.row_cache import row_cache
+
+logger = get_logger(__name__)
+
+OPERATION_PATTERNS = [
+    ("count", re.compile(r"\b(how many|count|number of [a-z]+s)\b")),
+    ("mean", re.compile(r"\b(average|avg|mean)\b")),
+    ("sum", re.compile(r"\b(total|sum)\b")),
+    ("min", re.compile(r"\b(minimum|min|lowest|smallest)\b")),
+    ("max", re.compile(r"\b(maximum|max|highest|largest)\b")),
+]
+GROUP_BY_PATTERN = re.compile(r"\b(?:by|per|for each|each)\s+([a-z0-9 _]+)")
+# "Who has the highest salary?" asks for the row holding the extreme, not the value.
+ROW_REQUEST_PATTERN = re.compile(r"\b(who|whom|whose|which|name|names)\b")
+NUMERIC_PROFILE_TYPES = ("integer", "float")
+COUNTED_NOUN_PATTERN = re.compile(r"\b(?:how many|number of|count(?: of)?)\s+([a-z0-9]+)")
+# Nouns that count rows themselves rather than a column or a value.
+ROW_NOUNS = {"row", "rows", "record", "records", "entry", "entries", "people", "person", "persons", "employees"}
+# Every other question term must name a column or match a stored value, or the
+# question is not one the planner understands ("in Marketing" with no
+# Marketing rows must not become a count over the whole dataset).
+AGGREGATE_FILLER_WORDS = FIELD_FILTER_STOPWORDS | ROW_NOUNS | {
+    "many",
+    "count",
+    "number",
+    "average",
+    "avg",
+    "mean",
+    "total",
+    "sum",
+    "minimum",
+    "min",
+    "lowest",
+    "smallest",
+    "maximum",
+    "max",
+    "highest",
+    "largest",
+    "per",
+    "each",
+    "has",
+    "have",
+    "there",
+    "all",
+    "whom",
+    "whose",
+    "name",
+    "names",
+}
+OPERATION_LABELS = {
+    "count": "Count",
+    "count_distinct": "Distinct count",
+    "mean": "Average",
+    "sum": "Total",
+    "min": "Minimum",
+    "max": "Maximum",
+}
+MAX_FILTER_DISTINCT_VALUES = 10_000
+MAX_RESULT_GROUPS = 50
+MAX_SELECTED_ROWS = 20
+
+# Typed frames of recently aggregated datasets, most recently used last. The
+# generation counter lets a build that raced an invalidation skip storing.
+_frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+_frames_lock = threading.Lock()
+_frames_generation = 0
+
+
+@dataclass
+class AggregatePlan:
+    operation: str
+    column: str | None = None
+    group_by: str | None = None
+    filters: dict[str, list[str]] = field(default_factory=dict)
+    # min/max only: return the rows holding the extreme value instead of the value alone.
+    select_rows: bool = False
+
+
+@dataclass
+class AggregateAnswer:
+    answer: str
+    plan: AggregatePlan
+    rows: list[dict]
+    matched_rows: int
+    # Frame positions (row indexes for one dataset) of the rows a select_rows plan picked;
+    # the caller answers from these rows with the model.
+    row_positions: list[int] = field(default_factory=list)
+
+
+def answer_aggregate(
+    dataset_id: str, question: str, frame: pd.DataFrame | None = None
+) -> AggregateAnswer | None:
+    """Answer count/sum/avg/min/max questions over the full dataset, or None if not aggregate.
+
+    Callers answering several questions can pass the already loaded dataset frame.
+    """
+    operation = detect_operation(question)
+    if operation is None:
+        return None
+    if frame is None:
+        if not may_plan_aggregate([dataset_id], question):
+            logger.info("Aggregate intent without resolvable columns dataset_id=%s", dataset_id)
+            return None
+        frame = load_dataset_frame(dataset_id)
+    plan = plan_aggregate(question, frame, operation)
+    if plan is None:
+        logger.info("Aggregate intent without resolvable columns dataset_id=%s", dataset_id)
+        return None
+    result = execute_plan(plan, frame)
+    logger.info(
+        "Aggregate answered dataset_id=%s operation=%s column=%s group_by=%s filters=%s",
+        dataset_id,
+        plan.operation,
+        plan.column,
+        plan.group_by,
+        plan.filters,
+    )
+    return result
+
+
+def detect_operation(question: str) -> str | None:
+    lowered = question.lower()
+    for operation, pattern in OPERATION_PATTERNS:
+        if pattern.search(lowered):
+            return operation
+    return None
+
+
+def may_plan_aggregate(dataset_ids: list[str], question: str) -> bool:
+    """Cheap pre-check, from column profiles and stored terms, that planning could succeed.
+
+    Runs before any frame is loaded. Every question term outside the column
+    names must occur in some row, counts must count rows, a column or a value,
+    and other operations need a numeric column the question names.
+    """
+    operation = detect_operation(question)
+    if operation is None:
+        return False
+    question_text = _phrase(question)
+    mentioned = [
+        profile
+        for dataset_id in dataset_ids
+        for profile in fetch_column_profiles(dataset_id)
+        if _mentions_column(question_text, profile["name"])
+    ]
+    if operation != "count" and not any(profile["type"] in NUMERIC_PROFILE_TYPES for profile in mentioned):
+        return False
+    column_phrases = [variant for profile in mentioned for variant in _column_variants(profile["name"])]
+    remaining = _unexplained_terms(question_text, column_phrases)
+    known: set[str] = set()
+    for dataset_id in dataset_ids:
+        known |= fetch_known_terms(dataset_id, remaining)
+    if any(term not in known for term in remaining):
+        return False
+    return operation != "count" or _counts_known_noun(question_text, column_phrases, known)
+
+
+def load_dataset_frame(dataset_id: str) -> pd.DataFrame:
+    """Return the dataset as a typed DataFrame, cached until the dataset changes.
+
+    Callers must not modify the returned frame.
+    """
+    with _frames_lock:
+        frame = _frames.get(dataset_id)
+        if frame is not None:
+            _frames.move_to_end(dataset_id)
+            return frame
+        generation = _frames_generation
+    frame = _build_frame(dataset_id)
+    with _frames_lock:
+        if generation == _frames_generation and FRAME_CACHE_MAX_DATASETS > 0:
+            _frames[dataset_id] = frame
+            while len(_frames) > FRAME_CACHE_MAX_DATASETS:
+                _frames.popitem(last=False)
+    return frame
+
+
+def invalidate_dataset_frame(dataset_id: str) -> None:
+    global _frames_generation
+    with _frames_lock:
+        _frames.pop(dataset_id, None)
+        _frames_generation += 1
+
+
+def clear_dataset_frames() -> None:
+    global _frames_generation
+    with _frames_lock:
+        _frames.clear()
+        _frames_generation += 1
+
+
+def _build_frame(dataset_id: str) -> pd.DataFrame:
+    if get_dataset_storage(dataset_id) == STORAGE_COLUMNAR:
+        return load_frame(columnar_root(), dataset_id)
+    prepared = row_cache.get(dataset_id)
+    if prepared is not None:
+        records = [prepared.rows_by_index[index]["record"] for index in sorted(prepared.rows_by_index)]
+    else:
+        records = [json.loads(row["row_json"]) for row in fetch_rows(dataset_id)]
+    frame = pd.DataFrame.from_records(records)
+    for name in frame.columns:
+        values = frame[name]
+        present = values.notna() & (values != "")
+        numeric = pd.to_numeric(values.where(present), errors="coerce")
+        if present.any() and numeric[present].notna().all():
+            frame[name] = numeric
+    return frame
+
+
+def plan_aggregate(question: str, frame: pd.DataFrame, operation: str) -> AggregatePlan | None:
+    question_text = _phrase(question)
+    numeric_columns = [name for name in frame.columns if pd.api.types.is_numeric_dtype(frame[name])]
+    mentioned = [name for name in frame.columns if _mentions_column(question_text, name)]
+
+    group_by = None
+    group_match = GROUP_BY_PATTERN.search(question_text)
+    if group_match:
+        group_by = next(
+            (name for name in frame.columns if _mentions_column(group_match.group(1), name)), None
+        )
+
+    filters: dict[str, list[str]] = {}
+    for name in frame.columns:
+        if name == group_by or name in numeric_columns:
+            continue
+        distinct = frame[name].dropna().unique()
+        if len(distinct) > MAX_FILTER_DISTINCT_VALUES:
+            continue
+        matched = [
+            str(value)
+            for value in distinct
+            if (value_text := _phrase(str(value))) and f" {value_text} " in f" {question_text} "
+        ]
+        if matched:
+            filters[str(name)] = matched
+
+    column_phrases = [variant for name in mentioned for variant in _column_variants(name)]
+    value_phrases = [_phrase(value) for values in filters.values() for value in values]
+    unexplained = _unexplained_terms(question_text, column_phrases + value_phrases)
+    if unexplained:
+        logger.info("Aggregate question has unmatched terms=%s", unexplained)
+        return None
+    value_terms = {term for phrase in value_phrases for term in phrase.split()}
+    if operation == "count" and not _counts_known_noun(question_text, column_phrases, value_terms):
+        return None
+
+    column = None
+    if operation == "count":
+        distinct_targets = [
+            name for name in mentioned if name != group_by and name not in filters and name not in numeric_columns
+        ]
+        if distinct_targets and group_by is None and not filters:
+            return AggregatePlan(operation="count_distinct", column=str(distinct_targets[0]))
+    else:
+        column = next((name for name in mentioned if name in numeric_columns and name != group_by), None)
+        if column is None:
+            return None
+    select_rows = operation in ("min", "max") and group_by is None and bool(ROW_REQUEST_PATTERN.search(question_text))
+    return AggregatePlan(
+        operation=operation,
+        column=str(column) if column is not None else None,
+        group_by=str(group_by) if group_by is not None else None,
+        filters=filters,
+        select_rows=select_rows,
+    )
+
+
+def execute_plan(plan: AggregatePlan, frame: pd.DataFrame) -> AggregateAnswer:
+    mask = np.ones(len(frame), dtype=bool)
+    for name, values in plan.filters.items():
+        mask &= frame[name].astype(str).isin(values).to_numpy()
+    selected = frame[mask]
+
+    row_positions: list[int] = []
+    if plan.select_rows:
+        value = selected[plan.column].agg(plan.operation)
+        rows = [{_result_name(plan): _plain(value)}]
+        holders = selected.index[(selected[plan.column] == value).to_numpy()]
+        row_positions = [int(position) for position in holders[:MAX_SELECTED_ROWS]]
+    elif plan.operation == "count_distinct":
+        value = int(selected[plan.column].nunique())
+        rows = [{plan.column: value}]
+    elif plan.group_by:
+        grouped = selected.groupby(selected[plan.group_by].astype(str), sort=True, observed=True)
+        series = grouped.size() if plan.operation == "count" else grouped[plan.column].agg(plan.operation)
+        rows = [
+            {plan.group_by: key, _result_name(plan): _plain(value)}
+            for key, value in series.head(MAX_RESULT_GROUPS).items()
+        ]
+    else:
+        value = len(selected) if plan.operation == "count" else selected[plan.column].agg(plan.operation)
+        rows = [{_result_name(plan): _plain(value)}]
+
+    return AggregateAnswer(
+        answer=_describe(plan, rows),
+        plan=plan,
+        rows=rows,
+        matched_rows=int(mask.sum()),
+        row_positions=row_positions,
+    )
+
+
+def _describe(plan: AggregatePlan, rows: list[dict]) -> str:
+    subject = OPERATION_LABELS[plan.operation]
+    if plan.column and plan.operation != "count":
+        subject += f" of {plan.column}"
+    elif plan.operation == "count":
+        subject += " of rows"
+    if plan.filters:
+        conditions = " and ".join(
+            f"{name} = {' or '.join(values)}" for name, values in plan.filters.items()
+        )
+        subject += f" where {conditions}"
+    if plan.group_by:
+        parts = "; ".join(f"{row[plan.group_by]}: {_format(row[_result_name(plan)])}" for row in rows)
+        return f"{subject} by {plan.group_by}: {parts}."
+    value = next(iter(rows[0].values()))
+    return f"{subject}: {_format(value)}."
+
+
+def _result_name(plan: AggregatePlan) -> str:
+    if plan.operation == "count":
+        return "count"
+    return f"{plan.operation}_{plan.column}"
+
+
+def _mentions_column(question_text: str, name: str) -> bool:
+    padded = f" {question_text} "
+    return any(f" {variant} " in padded for variant in _column_variants(name))
+
+
+def _column_variants(name: str) -> list[str]:
+    column_text = _phrase(str(name))
+    if not column_text:
+        return []
+    return [variant for variant in {column_text, f"{column_text}s", column_text.rstrip("s")} if variant]
+
+
+def _unexplained_terms(question_text: str, phrases: list[str]) -> list[str]:
+    """Question terms left once the given phrases and filler words are removed."""
+    padded = f" {question_text} "
+    for phrase in sorted(set(phrases), key=len, reverse=True):
+        while f" {phrase} " in padded:
+            padded = padded.replace(f" {phrase} ", " ")
+    return [term for term in padded.split() if term not in AGGREGATE_FILLER_WORDS]
+
+
+def _counts_known_noun(question_text: str, column_phrases: list[str], value_terms: set[str]) -> bool:
+    """Whether "how many X" counts rows, a column or a value, not something the data lacks."""
+    match = COUNTED_NOUN_PATTERN.search(question_text)
+    if match is None:
+        return bool(column_phrases or value_terms)
+    noun = match.group(1)
+    column_terms = {term for phrase in column_phrases for term in phrase.split()}
+    return noun in ROW_NOUNS or noun in column_terms or noun in value_terms
+
+
+def _phrase(text: str) -> str:
+    return " ".join(tokenize(text.replace("_", " ")))
+
+
+def _plain(value):
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else round(float(value), 4)
+    return value
+
+
+def _format(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
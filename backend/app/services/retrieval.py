@@ -1,20 +1,69 @@
-import json
-import re
-from dataclasses import dataclass
+import heapq
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
-from app.config import RETRIEVAL_MIN_SCORE
+from app.config import (
+    FEDERATED_RETRIEVAL_WORKERS,
+    HYBRID_CANDIDATES,
+    HYBRID_RRF_K,
+    RETRIEVAL_ENGINE,
+    RETRIEVAL_MIN_SCORE,
+    VECTOR_MIN_SIMILARITY,
+)
 from app.logging_config import get_logger
-from app.services.db import fetch_rows
+from app.services.db import (
+    STORAGE_COLUMNAR,
+    fetch_field_postings,
+    fetch_postings,
+    fetch_rows_by_index,
+    get_dataset_storage,
+    search_fts,
+)
+from app.services.inverted_index import (
+    MAX_FIELD_VALUE_TOKENS,
+    TOKEN_PATTERN,
+    normalize_value,
+    tokenize,
+)
+from app.services.metrics import metrics, stage
+from app.services.row_cache import row_cache
+from app.services.vector_index import search_vectors
 
 logger = get_logger(__name__)
 
+_hybrid_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-retrieval")
+_federated_executor = ThreadPoolExecutor(
+    max_workers=FEDERATED_RETRIEVAL_WORKERS, thread_name_prefix="federated-retrieval"
+)
+
 
 @dataclass
 class RetrievalResult:
     rows: list[dict]
     question_tokens: list[str]
-    best_score: int
+    best_score: float
     used_fallback: bool
+    filters: dict[str, list[str]] = field(default_factory=dict)
+    # Per-row scores aligned with rows, on the scale of best_score for the engine used.
+    scores: list[float] = field(default_factory=list)
+
+
+@dataclass
+class FederatedRetrieval:
+    # (dataset_id, row) pairs in global rank order.
+    hits: list[tuple[str, dict]]
+    results: dict[str, RetrievalResult]
+
+    @property
+    def filters(self) -> dict[str, list[str]]:
+        merged: dict[str, list[str]] = {}
+        for result in self.results.values():
+            for column, values in result.filters.items():
+                for value in values:
+                    if value not in merged.setdefault(column, []):
+                        merged[column].append(value)
+        return merged
 
 
 STOPWORDS = {
@@ -49,27 +98,106 @@ STOPWORDS = {
 }
 
 
-def retrieve_relevant_rows(dataset_id: str, question: str, limit: int = 6) -> RetrievalResult:
-    rows = fetch_rows(dataset_id)
-    tokens = _question_tokens(question)
-    scored: list[tuple[int, dict]] = []
+# Words that never form a field filter on their own: a value such as "yes" or
+# "none" would otherwise turn into a hard AND filter.
+FIELD_FILTER_STOPWORDS = STOPWORDS | {
+    "a",
+    "an",
+    "and",
+    "or",
+    "of",
+    "to",
+    "at",
+    "on",
+    "for",
+    "by",
+    "me",
+    "my",
+    "yes",
+    "no",
+    "true",
+    "false",
+    "none",
+    "null",
+}
+FIELD_FILTER_MIN_CHARS = 2
+
+RETRIEVAL_ENGINES = ("lexical", "fts", "vector", "hybrid")
+VECTOR_ENGINES = ("vector", "hybrid")
+
 
-    for row in rows:
-        content = row["row_text"].lower()
-        score = sum(1 for token in tokens if token in content)
-        if score > 0:
-            scored.append((score, row))
-
-    scored.sort(key=lambda item: item[0], reverse=True)
-    top_rows = [row for _, row in scored[:limit]]
-    best_score = scored[0][0] if scored else 0
+def retrieve_relevant_rows(
+    dataset_id: str, question: str, limit: int = 6, engine: str | None = None
+) -> RetrievalResult:
+    engine = engine or RETRIEVAL_ENGINE
+    with stage("retrieval"):
+        result = _retrieve(dataset_id, question, limit, engine)
+    metrics.inc("retrieval_rows_returned_total", len(result.rows), engine="filters" if result.filters else engine)
+    return result
+
+
+def retrieve_across_datasets(
+    dataset_ids: list[str], question: str, limit: int = 6, engine: str | None = None
+) -> FederatedRetrieval:
+    """Retrieve from each dataset in parallel and merge their top rows into one global top `limit`.
+
+    Rows are ordered by score, then by dataset order, then by rank within the
+    dataset, so latency follows the slowest dataset rather than the sum. Each
+    dataset applies its own relevance threshold; an exact field-filter match
+    in one dataset outranks plain token matches in another.
+    """
+    with stage("federated_retrieval"):
+        futures = [
+            _federated_executor.submit(retrieve_relevant_rows, dataset_id, question, limit, engine)
+            for dataset_id in dataset_ids
+        ]
+        results = {dataset_id: future.result() for dataset_id, future in zip(dataset_ids, futures)}
+    candidates = (
+        (-score, position, rank, dataset_id, row)
+        for position, (dataset_id, result) in enumerate(results.items())
+        for rank, (row, score) in enumerate(zip(result.rows, result.scores))
+    )
+    top = heapq.nsmallest(limit, candidates, key=lambda candidate: candidate[:3])
+    logger.info(
+        "Retrieved rows across datasets datasets=%s matched_datasets=%s rows=%s",
+        len(dataset_ids),
+        sum(1 for result in results.values() if result.rows),
+        len(top),
+    )
+    return FederatedRetrieval(hits=[(dataset_id, row) for _, _, _, dataset_id, row in top], results=results)
+
+
+def _retrieve(dataset_id: str, question: str, limit: int, engine: str) -> RetrievalResult:
+    tokens = question_terms(question)
+    if engine == "fts" and get_dataset_storage(dataset_id) == STORAGE_COLUMNAR:
+        # Columnar datasets keep no row_text in SQLite, so they have no FTS entries.
+        engine = "lexical"
+    field_filter = _resolve_field_filters(dataset_id, question)
+    allowed = field_filter.rows if field_filter is not None else None
+    filters = field_filter.filters if field_filter is not None else {}
+    min_score: float = RETRIEVAL_MIN_SCORE
+    if engine == "lexical":
+        top_rows, scores = _retrieve_lexical(dataset_id, tokens, limit, field_filter)
+    elif engine == "fts":
+        top_rows, scores = _retrieve_fts(dataset_id, tokens, limit, allowed)
+    elif engine == "vector":
+        top_rows, scores = _retrieve_vector(dataset_id, question, limit, allowed)
+        min_score = VECTOR_MIN_SIMILARITY
+    elif engine == "hybrid":
+        top_rows, scores = _retrieve_hybrid(dataset_id, question, tokens, limit, field_filter)
+        min_score = 0.0
+    else:
+        raise ValueError(
+            f"Unknown retrieval engine '{engine}'. Expected one of: {', '.join(RETRIEVAL_ENGINES)}."
+        )
     if top_rows:
-        if best_score < RETRIEVAL_MIN_SCORE:
+        best_score = max(scores)
+        if best_score < min_score:
             logger.info(
                 "Retrieved rows below threshold dataset_id=%s best_score=%s threshold=%s",
                 dataset_id,
                 best_score,
-                RETRIEVAL_MIN_SCORE,
+                min_score,
             )
             return RetrievalResult(
                 rows=[],
@@ -78,17 +206,22 @@ def retrieve_relevant_rows(dataset_id: str, question: str, limit: int = 6) -> Re
                 used_fallback=False,
             )
         logger.info(
-            "Retrieved rows by token match dataset_id=%s requested_limit=%s matched=%s best_score=%s",
+            "Retrieved rows by token match engine=%s dataset_id=%s requested_limit=%s matched=%s "
+            "best_score=%s filters=%s",
+            engine,
             dataset_id,
             limit,
             len(top_rows),
             best_score,
+            filters,
         )
         return RetrievalResult(
             rows=top_rows,
             question_tokens=tokens,
             best_score=best_score,
             used_fallback=False,
+            filters=filters,
+            scores=scores,
         )
     logger.info(
         "No token match found dataset_id=%s tokens=%s",
@@ -98,17 +231,206 @@ def retrieve_relevant_rows(dataset_id: str, question: str, limit: int = 6) -> Re
     return RetrievalResult(rows=[], question_tokens=tokens, best_score=0, used_fallback=False)
 
 
-def build_context(rows: list[dict]) -> str:
-    lines: list[str] = []
+@dataclass
+class _FieldFilter:
+    rows: set[int]
+    filters: dict[str, list[str]]
+    # Question words consumed by the matched values, and how many positions they cover.
+    words: set[str]
+    covered: int
+
+
+def _resolve_field_filters(dataset_id: str, question: str) -> _FieldFilter | None:
+    """Resolve exact column values named in the question through the field-value index.
+
+    Values in the same column are OR-ed, different columns are AND-ed, and a
+    value found in several columns matches any of them unless the question
+    names one. Phrases made only of stopwords or filler ("yes", "none"), or
+    shorter than FIELD_FILTER_MIN_CHARS, never become filters. Returns None
+    when nothing resolves or the filters match no row together; the engines
+    then score the whole dataset.
+    """
+    words = TOKEN_PATTERN.findall(question.lower())
+    spans: dict[str, list[tuple[int, int]]] = {}
+    for size in range(MAX_FIELD_VALUE_TOKENS, 0, -1):
+        for start in range(len(words) - size + 1):
+            phrase_words = words[start : start + size]
+            if all(word in FIELD_FILTER_STOPWORDS for word in phrase_words):
+                continue
+            phrase = " ".join(phrase_words)
+            if len(phrase) >= FIELD_FILTER_MIN_CHARS:
+                spans.setdefault(phrase, []).append((start, start + size))
+    if not spans:
+        return None
+
+    prepared = row_cache.get(dataset_id)
+    if prepared is not None:
+        postings = {value: prepared.field_postings[value] for value in spans if value in prepared.field_postings}
+    else:
+        postings = fetch_field_postings(dataset_id, list(spans))
+    if not postings:
+        return None
+
+    # Prefer the longest match: "new york" wins over "york" when both are values.
+    covered: set[int] = set()
+    matched: list[str] = []
+    for value in sorted(postings, key=lambda value: (-value.count(" "), value)):
+        for start, end in spans[value]:
+            if covered.isdisjoint(range(start, end)):
+                covered.update(range(start, end))
+                matched.append(value)
+                break
+    mentioned_columns = {
+        column
+        for columns in postings.values()
+        for column in columns
+        if normalize_value(column.replace("_", " ")) in spans
+    }
+
+    row_sets: dict[tuple[str, ...], set[int]] = {}
+    filters: dict[str, list[str]] = {}
+    for value in matched:
+        columns = postings[value]
+        eligible = tuple(sorted(column for column in columns if column in mentioned_columns)) or tuple(
+            sorted(columns)
+        )
+        rows = row_sets.setdefault(eligible, set())
+        for column in eligible:
+            rows.update(columns[column])
+            filters.setdefault(column, []).append(value)
+    metrics.inc("retrieval_rows_scanned_total", sum(len(rows) for rows in row_sets.values()))
+    selected = set.intersection(*row_sets.values())
+    if not selected:
+        logger.info("Field filters matched no rows together dataset_id=%s filters=%s", dataset_id, filters)
+        return None
+    return _FieldFilter(
+        rows=selected, filters=filters, words={words[position] for position in covered}, covered=len(covered)
+    )
+
+
+def _score_filtered(
+    dataset_id: str, tokens: list[str], field_filter: _FieldFilter, limit: int
+) -> list[tuple[int, int]]:
+    """Rank filtered rows by the remaining question tokens; score is filter words covered plus tokens matched."""
+    remaining = [token for token in tokens if token not in field_filter.words]
+    prepared = row_cache.get(dataset_id)
+    if prepared is not None:
+        remaining_postings = {
+            token: prepared.postings[token] for token in set(remaining) if token in prepared.postings
+        }
+    else:
+        remaining_postings = fetch_postings(dataset_id, remaining)
+    metrics.inc("retrieval_rows_scanned_total", sum(len(rows) for rows in remaining_postings.values()))
+    token_counts = Counter(remaining)
+    scores = dict.fromkeys(field_filter.rows, field_filter.covered)
+    for term, row_indexes in remaining_postings.items():
+        for row_index in row_indexes:
+            if row_index in scores:
+                scores[row_index] += token_counts[term]
+    return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _retrieve_lexical(
+    dataset_id: str, tokens: list[str], limit: int, field_filter: _FieldFilter | None = None
+) -> tuple[list[dict], list[float]]:
+    if field_filter is not None:
+        return _load_scored(dataset_id, _score_filtered(dataset_id, tokens, field_filter, limit))
+    return _load_scored(dataset_id, _score_lexical(dataset_id, tokens, limit))
+
+
+def _retrieve_fts(
+    dataset_id: str, tokens: list[str], limit: int, allowed: set[int] | None = None
+) -> tuple[list[dict], list[float]]:
+    """Rank with SQLite BM25; the per-row (and guardrail) score stays the matched-token count."""
+    rows = search_fts(dataset_id, tokens, limit, sorted(allowed) if allowed is not None else None)
+    token_counts = Counter(tokens)
+    scores = []
     for row in rows:
-        record = json.loads(row["row_json"])
-        lines.append(f"Row {row['row_index']}: {record}")
-    return "\n".join(lines)
+        terms = set(tokenize(row["row_text"]))
+        scores.append(sum(count for token, count in token_counts.items() if token in terms))
+    return rows, scores
+
+
+def _retrieve_vector(
+    dataset_id: str, question: str, limit: int, allowed: set[int] | None = None
+) -> tuple[list[dict], list[float]]:
+    return _load_scored(dataset_id, search_vectors(dataset_id, question, limit, allowed))
+
+
+def _retrieve_hybrid(
+    dataset_id: str, question: str, tokens: list[str], limit: int, field_filter: _FieldFilter | None = None
+) -> tuple[list[dict], list[float]]:
+    """Run lexical and vector scoring concurrently and fuse them with reciprocal-rank fusion.
+
+    Field filters narrow the lexical ranking only, so rows holding the named
+    values are boosted while the vector side can still surface close matches.
+    """
+    depth = max(limit, HYBRID_CANDIDATES)
+    if field_filter is not None:
+        lexical_future = _hybrid_executor.submit(_score_filtered, dataset_id, tokens, field_filter, depth)
+    else:
+        lexical_future = _hybrid_executor.submit(_score_lexical, dataset_id, tokens, depth)
+    vector_future = _hybrid_executor.submit(search_vectors, dataset_id, question, depth)
+    return _load_scored(dataset_id, _fuse_rankings(lexical_future.result(), vector_future.result(), limit))
+
+
+def _fuse_rankings(
+    lexical: list[tuple[int, int]], vector: list[tuple[int, float]], limit: int
+) -> list[tuple[int, float]]:
+    # Only rows that clear their own scorer's threshold are eligible, so the
+    # "I don't know" guardrail behaves as it does for the single engines.
+    eligible = {row_index for row_index, score in lexical if score >= RETRIEVAL_MIN_SCORE}
+    eligible.update(row_index for row_index, score in vector if score >= VECTOR_MIN_SIMILARITY)
+    fused: dict[int, float] = {}
+    for ranking in (lexical, vector):
+        for rank, (row_index, _) in enumerate(ranking):
+            if row_index in eligible:
+                fused[row_index] = fused.get(row_index, 0.0) + 1.0 / (HYBRID_RRF_K + rank + 1)
+    return heapq.nsmallest(limit, fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _score_lexical(dataset_id: str, tokens: list[str], limit: int) -> list[tuple[int, int]]:
+    prepared = row_cache.get(dataset_id)
+    with stage("retrieval_score"):
+        if prepared is not None and prepared.incidence is not None:
+            token_counts = Counter(tokens)
+            metrics.inc("retrieval_rows_scanned_total", prepared.incidence.posting_count(token_counts))
+            return prepared.incidence.score(token_counts, limit)
+        if prepared is not None:
+            postings = {token: prepared.postings[token] for token in set(tokens) if token in prepared.postings}
+        else:
+            postings = fetch_postings(dataset_id, tokens)
+        metrics.inc("retrieval_rows_scanned_total", sum(len(rows) for rows in postings.values()))
+        return _score_postings(postings, Counter(tokens), limit)
+
+
+def _score_postings(
+    postings: dict[str, list[int]], token_counts: Counter, limit: int
+) -> list[tuple[int, int]]:
+    scores: dict[int, int] = {}
+    for term, row_indexes in postings.items():
+        weight = token_counts[term]
+        for row_index in row_indexes:
+            scores[row_index] = scores.get(row_index, 0) + weight
+    return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _load_scored(dataset_id: str, scored: list[tuple[int, float]]) -> tuple[list[dict], list[float]]:
+    rows = _load_rows(dataset_id, [row_index for row_index, _ in scored])
+    score_by_index = dict(scored)
+    return rows, [score_by_index[row["row_index"]] for row in rows]
+
+
+def _load_rows(dataset_id: str, row_indexes: list[int]) -> list[dict]:
+    prepared = row_cache.peek(dataset_id, count=False)
+    if prepared is not None:
+        by_index = prepared.rows_by_index
+    else:
+        with stage("retrieval_load_rows"):
+            by_index = {row["row_index"]: row for row in fetch_rows_by_index(dataset_id, row_indexes)}
+    return [by_index[row_index] for row_index in row_indexes if row_index in by_index]
 
 
-def _question_tokens(question: str) -> list[str]:
-    return [
-        token
-        for token in re.findall(r"[a-zA-Z0-9]+", question.lower())
-        if len(token) >= 2 and token not in STOPWORDS
-    ]
+def question_terms(question: str) -> list[str]:
+    """The question's tokens without stopwords; answer cache keys use the same terms."""
+    return [token for token in tokenize(question) if token not in STOPWORDS]
@@ -0,0 +1,242 @@
+import bisect
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from app.config import LEXICAL_SCORER, ROW_CACHE_BUDGET_MB
+from app.logging_config import get_logger
+from app.services.db import dataset_exists, fetch_dataset_text_bytes, fetch_rows
+from app.services.incidence import TokenIncidence
+from app.services.inverted_index import build_field_postings, build_postings
+from app.services.metrics import stage
+
+logger = get_logger(__name__)
+
+# Rough Python object overhead per row and per byte of stored text, used to
+# decide whether a dataset fits the budget before loading it.
+ROW_OVERHEAD_BYTES = 600
+TEXT_OVERHEAD_FACTOR = 3
+
+
+@dataclass
+class PreparedDataset:
+    """Retrieval-ready view of one dataset: rows with parsed records plus term and field postings."""
+
+    rows_by_index: dict[int, dict]
+    postings: dict[str, list[int]]
+    size_bytes: int
+    field_postings: dict[str, dict[str, list[int]]] = field(default_factory=dict)
+    incidence: TokenIncidence | None = None
+
+
+class RowCache:
+    """Datasets prepared for retrieval, LRU-evicted to stay within a memory budget."""
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes = budget_bytes
+        self._datasets: "OrderedDict[str, PreparedDataset]" = OrderedDict()
+        self._oversized: set[str] = set()
+        self._used_bytes = 0
+        self._lock = threading.Lock()
+        self._build_locks: dict[str, threading.Lock] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "skipped_oversized": 0}
+
+    def get(self, dataset_id: str) -> PreparedDataset | None:
+        """Return the prepared dataset, building it on first use if it fits the budget."""
+        prepared = self.peek(dataset_id)
+        if prepared is not None:
+            return prepared
+        with self._lock:
+            if dataset_id in self._oversized:
+                return None
+            build_lock = self._build_locks.setdefault(dataset_id, threading.Lock())
+        with build_lock:
+            prepared = self.peek(dataset_id, count=False)
+            if prepared is None:
+                with stage("row_cache_build"):
+                    prepared = self._build(dataset_id)
+        return prepared
+
+    def peek(self, dataset_id: str, count: bool = True) -> PreparedDataset | None:
+        with self._lock:
+            prepared = self._datasets.get(dataset_id)
+            if prepared is not None:
+                self._datasets.move_to_end(dataset_id)
+            if count:
+                self._stats["hits" if prepared is not None else "misses"] += 1
+            return prepared
+
+    def invalidate(self, dataset_id: str) -> None:
+        with self._lock:
+            prepared = self._datasets.pop(dataset_id, None)
+            if prepared is not None:
+                self._used_bytes -= prepared.size_bytes
+            self._oversized.discard(dataset_id)
+            self._build_locks.pop(dataset_id, None)
+
+    def apply_changes(self, dataset_id: str, changed_rows: list[dict]) -> None:
+        """Patch a cached dataset in place with appended or replaced rows.
+
+        Work follows the changed rows, not the dataset: appended rows extend
+        postings lists in place (their indexes sort last), a replaced row's
+        changed terms get edited copies of their lists, so a scorer iterating
+        one never sees it shift, and the incidence matrix records the change
+        as a delta until rebuilding is the cheaper option.
+        """
+        with self._lock:
+            self._oversized.discard(dataset_id)
+            build_lock = self._build_locks.setdefault(dataset_id, threading.Lock())
+        with build_lock:
+            prepared = self.peek(dataset_id, count=False)
+            if prepared is None or not changed_rows:
+                return
+            previous_terms: dict[int, set[str]] = {}
+            current_terms: dict[int, set[str]] = {}
+            size_change = 0
+            for row in changed_rows:
+                row = {**row, "record": json.loads(row["row_json"])}
+                row_index = row["row_index"]
+                old = prepared.rows_by_index.get(row_index)
+                new_terms = current_terms[row_index] = set(build_postings([row["row_text"]]))
+                new_fields = _field_keys(row["record"])
+                if old is None:
+                    for term in new_terms:
+                        _add(prepared.postings, term, row_index)
+                    for value, column in new_fields:
+                        _add(prepared.field_postings.setdefault(value, {}), column, row_index)
+                    size_change += ROW_OVERHEAD_BYTES
+                else:
+                    old_terms = previous_terms[row_index] = set(build_postings([old["row_text"]]))
+                    for term in old_terms ^ new_terms:
+                        _toggle(prepared.postings, term, row_index, term in new_terms)
+                    for value, column in _field_keys(old["record"]) ^ new_fields:
+                        columns = prepared.field_postings.setdefault(value, {})
+                        _toggle(columns, column, row_index, (value, column) in new_fields)
+                        if not columns:
+                            del prepared.field_postings[value]
+                    size_change -= len(old["row_text"]) * TEXT_OVERHEAD_FACTOR
+                size_change += len(row["row_text"]) * TEXT_OVERHEAD_FACTOR
+                prepared.rows_by_index[row_index] = row
+
+            incidence = prepared.incidence
+            if incidence is not None:
+                incidence_bytes = incidence.size_bytes
+                incidence.apply_changes(previous_terms, current_terms)
+                if incidence.needs_compaction:
+                    prepared.incidence = TokenIncidence.from_postings(prepared.postings)
+                size_change += prepared.incidence.size_bytes - incidence_bytes
+            with self._lock:
+                prepared.size_bytes += size_change
+                if self._datasets.get(dataset_id) is prepared:
+                    self._used_bytes += size_change
+                    self._evict_over_budget()
+        logger.info("Patched cached dataset dataset_id=%s rows=%s", dataset_id, len(changed_rows))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._datasets.clear()
+            self._oversized.clear()
+            self._build_locks.clear()
+            self._used_bytes = 0
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "datasets": len(self._datasets),
+                "used_bytes": self._used_bytes,
+                "budget_bytes": self.budget_bytes,
+            }
+
+    def _build(self, dataset_id: str) -> PreparedDataset | None:
+        rows = None
+        text_bytes = fetch_dataset_text_bytes(dataset_id)
+        if text_bytes * TEXT_OVERHEAD_FACTOR <= self.budget_bytes:
+            rows = fetch_rows(dataset_id)
+        if rows == [] and not dataset_exists(dataset_id):
+            # Unknown (or just deleted) dataset: keep nothing under its id.
+            with self._lock:
+                self._build_locks.pop(dataset_id, None)
+            return None
+        size_bytes = len(rows) * ROW_OVERHEAD_BYTES + text_bytes * TEXT_OVERHEAD_FACTOR if rows else 0
+        if rows is None or size_bytes > self.budget_bytes:
+            with self._lock:
+                self._oversized.add(dataset_id)
+                self._stats["skipped_oversized"] += 1
+            logger.info("Dataset exceeds row cache budget dataset_id=%s text_bytes=%s", dataset_id, text_bytes)
+            return None
+
+        for row in rows:
+            row["record"] = json.loads(row["row_json"])
+        postings: dict[str, list[int]] = {}
+        field_postings: dict[str, dict[str, list[int]]] = {}
+        for start in range(0, len(rows), 50_000):
+            batch = rows[start : start + 50_000]
+            for term, row_indexes in build_postings([row["row_text"] for row in batch]).items():
+                postings.setdefault(term, []).extend(batch[position]["row_index"] for position in row_indexes)
+            for value, columns in build_field_postings([row["record"] for row in batch]).items():
+                for column, row_indexes in columns.items():
+                    field_postings.setdefault(value, {}).setdefault(column, []).extend(
+                        batch[position]["row_index"] for position in row_indexes
+                    )
+        incidence = None
+        if LEXICAL_SCORER == "matrix":
+            incidence = TokenIncidence.from_postings(postings)
+            size_bytes += incidence.size_bytes
+        prepared = PreparedDataset(
+            rows_by_index={row["row_index"]: row for row in rows},
+            postings=postings,
+            size_bytes=size_bytes,
+            field_postings=field_postings,
+            incidence=incidence,
+        )
+        with self._lock:
+            self._store(dataset_id, prepared)
+        logger.info("Cached dataset rows dataset_id=%s rows=%s bytes=%s", dataset_id, len(rows), size_bytes)
+        return prepared
+
+    def _store(self, dataset_id: str, prepared: PreparedDataset) -> None:
+        """Insert as most recently used and evict from the cold end; caller holds _lock."""
+        self._datasets[dataset_id] = prepared
+        self._used_bytes += prepared.size_bytes
+        self._evict_over_budget()
+
+    def _evict_over_budget(self) -> None:
+        while self._used_bytes > self.budget_bytes and len(self._datasets) > 1:
+            _, evicted = self._datasets.popitem(last=False)
+            self._used_bytes -= evicted.size_bytes
+            self._stats["evictions"] += 1
+
+
+def _field_keys(record: dict) -> set[tuple[str, str]]:
+    return {(value, column) for value, columns in build_field_postings([record]).items() for column in columns}
+
+
+def _add(postings: dict[str, list[int]], key: str, row_index: int) -> None:
+    """Append a new row's index; in place when it sorts last, as appended rows do."""
+    row_indexes = postings.get(key)
+    if row_indexes and row_indexes[-1] >= row_index:
+        _toggle(postings, key, row_index, True)
+    else:
+        postings.setdefault(key, []).append(row_index)
+
+
+def _toggle(postings: dict[str, list[int]], key: str, row_index: int, present: bool) -> None:
+    """Add or remove row_index in an edited copy of a sorted postings list."""
+    row_indexes = list(postings.get(key, ()))
+    position = bisect.bisect_left(row_indexes, row_index)
+    found = position < len(row_indexes) and row_indexes[position] == row_index
+    if present and not found:
+        row_indexes.insert(position, row_index)
+    elif not present and found:
+        del row_indexes[position]
+    if row_indexes:
+        postings[key] = row_indexes
+    else:
+        postings.pop(key, None)
+
+
+row_cache = RowCache(ROW_CACHE_BUDGET_MB * 1024 * 1024)
@@ -0,0 +1,192 @@
+import copy
+import threading
+
+import numpy as np
+
+from app.config import EMBEDDING_BATCH_SIZE, VECTOR_IVF_MIN_ROWS, VECTOR_IVF_PROBES
+from app.logging_config import get_logger
+from app.services.db import fetch_embeddings, insert_embeddings, iter_row_texts
+from app.services.embeddings import embed_texts
+
+logger = get_logger(__name__)
+
+IVF_TRAINING_SAMPLE = 50_000
+IVF_ITERATIONS = 5
+ASSIGN_BATCH_SIZE = 65_536
+# Rows re-embedded since the last load are searched exhaustively beside the
+# index; past this share of the index a reload from stored vectors is cheaper.
+OVERLAY_RELOAD_RATIO = 0.25
+OVERLAY_RELOAD_MIN = 4096
+
+_indexes: dict[str, "VectorIndex"] = {}
+_indexes_lock = threading.Lock()
+
+
+class VectorIndex:
+    """Cosine top-k over unit vectors; inverted-file (IVF) partitions for large datasets."""
+
+    def __init__(self, row_indexes: np.ndarray, vectors: np.ndarray) -> None:
+        self.row_indexes = row_indexes
+        self.vectors = vectors
+        self.centroids: np.ndarray | None = None
+        self.lists: list[np.ndarray] = []
+        self.overlay_indexes = np.empty(0, dtype=np.int64)
+        self.overlay_vectors = np.empty((0, vectors.shape[1] if vectors.ndim == 2 else 0), dtype=np.float32)
+        if len(vectors) >= VECTOR_IVF_MIN_ROWS:
+            self._train_ivf()
+
+    @property
+    def needs_reload(self) -> bool:
+        return len(self.overlay_indexes) > max(OVERLAY_RELOAD_MIN, OVERLAY_RELOAD_RATIO * len(self.vectors))
+
+    def with_rows(self, row_indexes: np.ndarray, vectors: np.ndarray) -> "VectorIndex":
+        """Copy that serves these rows' new vectors, sharing the trained index instead of rebuilding it."""
+        patched = copy.copy(self)
+        keep = ~np.isin(self.overlay_indexes, row_indexes)
+        patched.overlay_indexes = np.concatenate([self.overlay_indexes[keep], row_indexes])
+        patched.overlay_vectors = np.concatenate([self.overlay_vectors[keep], vectors])
+        return patched
+
+    def search(self, query: np.ndarray, limit: int, allowed: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """Top `limit` (row_index, similarity); with `allowed` (sorted row indexes) an exact search over those rows."""
+        if limit <= 0:
+            return []
+        if len(self.vectors):
+            if allowed is None:
+                candidates = self._candidates(query)
+            else:
+                positions = np.searchsorted(self.row_indexes, allowed)
+                found = positions < len(self.row_indexes)
+                found[found] = self.row_indexes[positions[found]] == allowed[found]
+                candidates = positions[found]
+            row_ids = self.row_indexes[candidates]
+            similarities = self.vectors[candidates] @ query
+        else:
+            row_ids = np.empty(0, dtype=np.int64)
+            similarities = np.empty(0, dtype=np.float32)
+        if len(self.overlay_indexes):
+            keep = ~np.isin(row_ids, self.overlay_indexes)
+            overlay = np.isin(self.overlay_indexes, allowed) if allowed is not None else slice(None)
+            row_ids = np.concatenate([row_ids[keep], self.overlay_indexes[overlay]])
+            similarities = np.concatenate([similarities[keep], self.overlay_vectors[overlay] @ query])
+        if not len(row_ids):
+            return []
+        if len(row_ids) > limit:
+            top = np.argpartition(-similarities, limit - 1)[:limit]
+        else:
+            top = np.arange(len(row_ids))
+        top = top[np.lexsort((row_ids[top], -similarities[top]))]
+        return [(int(row_ids[position]), float(similarities[position])) for position in top]
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.arange(len(self.vectors))
+        probes = min(VECTOR_IVF_PROBES, len(self.centroids))
+        nearest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        return np.sort(np.concatenate([self.lists[cluster] for cluster in nearest]))
+
+    def _train_ivf(self) -> None:
+        rng = np.random.default_rng(0)
+        cluster_count = max(1, int(np.sqrt(len(self.vectors))))
+        sample_size = min(len(self.vectors), IVF_TRAINING_SAMPLE)
+        sample = self.vectors[rng.choice(len(self.vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, cluster_count, replace=False)]
+        for _ in range(IVF_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(cluster_count):
+                members = sample[assignments == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1.0)
+        assignments = np.concatenate(
+            [
+                np.argmax(self.vectors[start : start + ASSIGN_BATCH_SIZE] @ centroids.T, axis=1)
+                for start in range(0, len(self.vectors), ASSIGN_BATCH_SIZE)
+            ]
+        )
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignments == cluster) for cluster in range(cluster_count)]
+        logger.info("Trained IVF index rows=%s clusters=%s", len(self.vectors), cluster_count)
+
+
+def index_embeddings(dataset_id: str, texts: list[str], start_index: int = 0) -> None:
+    """Embed row texts in batches and persist one vector per row."""
+    vectors = embed_texts(texts, batch_size=EMBEDDING_BATCH_SIZE)
+    insert_embeddings(
+        dataset_id,
+        [(start_index + offset, vector.tobytes()) for offset, vector in enumerate(vectors)],
+    )
+    invalidate_vector_index(dataset_id)
+    logger.info("Stored embeddings dataset_id=%s count=%s", dataset_id, len(vectors))
+
+
+def reindex_embeddings(dataset_id: str, texts_by_index: dict[int, str]) -> None:
+    """Embed appended or replaced rows and patch the loaded index with them."""
+    row_indexes = list(texts_by_index)
+    vectors = embed_texts([texts_by_index[row_index] for row_index in row_indexes], batch_size=EMBEDDING_BATCH_SIZE)
+    insert_embeddings(
+        dataset_id, [(row_index, vector.tobytes()) for row_index, vector in zip(row_indexes, vectors)]
+    )
+    with _indexes_lock:
+        index = _indexes.get(dataset_id)
+        if index is not None and index.overlay_vectors.shape[1:] == vectors.shape[1:]:
+            index = index.with_rows(np.asarray(row_indexes, dtype=np.int64), vectors)
+            if index.needs_reload:
+                _indexes.pop(dataset_id)
+            else:
+                _indexes[dataset_id] = index
+        else:
+            _indexes.pop(dataset_id, None)
+    logger.info("Stored embeddings dataset_id=%s count=%s", dataset_id, len(vectors))
+
+
+def search_vectors(
+    dataset_id: str, question: str, limit: int, allowed: set[int] | None = None
+) -> list[tuple[int, float]]:
+    """Nearest rows to the question; `allowed` restricts the search to those row indexes."""
+    index = get_vector_index(dataset_id)
+    query = embed_texts([question])[0]
+    # An empty index has no dimension to compare; only stored vectors of another size need re-embedding.
+    if len(index.vectors) and index.vectors.shape[1:] != query.shape:
+        logger.info("Embedding dimension changed; re-indexing dataset_id=%s", dataset_id)
+        invalidate_vector_index(dataset_id)
+        _embed_stored_rows(dataset_id)
+        index = get_vector_index(dataset_id)
+    if allowed is not None:
+        return index.search(query, limit, np.fromiter(sorted(allowed), dtype=np.int64, count=len(allowed)))
+    return index.search(query, limit)
+
+
+def get_vector_index(dataset_id: str) -> VectorIndex:
+    with _indexes_lock:
+        index = _indexes.get(dataset_id)
+    if index is not None:
+        return index
+
+    stored = fetch_embeddings(dataset_id)
+    if not stored:
+        _embed_stored_rows(dataset_id)
+        stored = fetch_embeddings(dataset_id)
+    row_indexes = np.fromiter((row_index for row_index, _ in stored), dtype=np.int64, count=len(stored))
+    vectors = np.frombuffer(b"".join(blob for _, blob in stored), dtype=np.float32)
+    vectors = vectors.reshape(len(stored), -1) if stored else vectors.reshape(0, 0)
+    index = VectorIndex(row_indexes, vectors)
+    with _indexes_lock:
+        _indexes[dataset_id] = index
+    return index
+
+
+def invalidate_vector_index(dataset_id: str) -> None:
+    with _indexes_lock:
+        _indexes.pop(dataset_id, None)
+
+
+def clear_vector_indexes() -> None:
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def _embed_stored_rows(dataset_id: str) -> None:
+    """Embed a dataset that was ingested before vectors were enabled."""
+    for start_index, texts in iter_row_texts(dataset_id, EMBEDDING_BATCH_SIZE):
+        index_embeddings(dataset_id, texts, start_index)
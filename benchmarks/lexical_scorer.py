@@ -0,0 +1,89 @@
+"""Compare the postings and incidence-matrix lexical scorers on synthetic datasets.
+
+Rows are shaped like default_employees.csv (name, department, location, salary).
+Both scorers get the same postings; results are checked for equality and the
+throughput is reported as dataset rows scored per second.
+
+    python benchmarks/lexical_scorer.py --sizes 100000,1000000,5000000
+"""
+
+import argparse
+import json
+import sys
+import time
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from app.services.incidence import TokenIncidence  # noqa: E402
+from app.services.retrieval import _score_postings  # noqa: E402
+
+FIELDS = {"name": 5000, "department": 8, "location": 40, "salary": 2000}
+
+
+def synthetic_postings(row_count: int, seed: int = 0) -> dict[str, array]:
+    rng = np.random.default_rng(seed)
+    postings: dict[str, array] = {}
+    for field, cardinality in FIELDS.items():
+        values = rng.zipf(1.3, size=row_count) % cardinality
+        order = np.argsort(values, kind="stable")
+        boundaries = np.flatnonzero(np.diff(values[order])) + 1
+        for group in np.split(order, boundaries):
+            postings[f"{field}{values[group[0]]}"] = array("I", np.sort(group).astype(np.uint32).tobytes())
+    return postings
+
+
+def synthetic_questions(count: int, seed: int = 1) -> list[Counter]:
+    rng = np.random.default_rng(seed)
+    questions = []
+    for _ in range(count):
+        fields = rng.choice(list(FIELDS), size=rng.integers(1, 3), replace=False)
+        questions.append(Counter(f"{field}{rng.integers(0, min(FIELDS[field], 20))}" for field in fields))
+    return questions
+
+
+def run(row_count: int, queries: int, limit: int) -> dict:
+    postings = synthetic_postings(row_count)
+    build_started = time.perf_counter()
+    incidence = TokenIncidence.from_postings(postings)
+    build_seconds = time.perf_counter() - build_started
+    questions = synthetic_questions(queries)
+
+    timings = {}
+    results = {}
+    for name, score in (
+        ("postings", lambda tokens: _score_postings({t: postings[t] for t in tokens if t in postings}, tokens, limit)),
+        ("matrix", lambda tokens: incidence.score(tokens, limit)),
+    ):
+        started = time.perf_counter()
+        results[name] = [score(tokens) for tokens in questions]
+        timings[name] = time.perf_counter() - started
+    assert results["postings"] == results["matrix"], "scorers disagree"
+
+    return {
+        "rows": row_count,
+        "queries": queries,
+        "matrix_build_seconds": round(build_seconds, 3),
+        "matrix_bytes": incidence.size_bytes,
+        **{f"{name}_ms_per_query": round(seconds / queries * 1000, 3) for name, seconds in timings.items()},
+        **{f"{name}_rows_per_second": int(row_count * queries / seconds) for name, seconds in timings.items()},
+        "speedup": round(timings["postings"] / timings["matrix"], 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100000,1000000,5000000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    for size in (int(value) for value in args.sizes.split(",")):
+        print(json.dumps(run(size, args.queries, args.limit)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
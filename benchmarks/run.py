@@ -0,0 +1,222 @@
+"""End-to-end benchmark: ingest, retrieval, context packing and /api/chat against a stub Ollama.
+
+Writes a flat JSON result file and, given --baseline, compares it against a
+saved run; exits non-zero when a metric regresses by more than --tolerance.
+
+    python benchmarks/run.py --rows 100000 --output benchmarks/results/latest.json
+    python benchmarks/run.py --rows 100000 --baseline benchmarks/results/baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR.parent / "backend"))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+# Point the app at a throwaway database before its config module is imported.
+WORK_DIR = Path(tempfile.mkdtemp(prefix="dataset-bench-"))
+os.environ["SQLITE_PATH"] = str(WORK_DIR / "bench.db")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from synthetic import DEPARTMENTS, LOCATIONS, write_dataset  # noqa: E402
+
+from app.services import llm as llm_service  # noqa: E402
+from app.services.answer_cache import answer_cache  # noqa: E402
+from app.services.context_packer import pack_context  # noqa: E402
+from app.services.db import close_connections, fetch_rows, init_db  # noqa: E402
+from app.services.ingestion import ingest_file  # noqa: E402
+from app.services.parsing import iter_tabular_file  # noqa: E402
+from app.services.retrieval import retrieve_relevant_rows  # noqa: E402
+from app.services.row_cache import row_cache  # noqa: E402
+
+# Metrics where a larger value is better; everything else (latency, memory) is lower-is-better.
+HIGHER_IS_BETTER_SUFFIXES = ("_per_second",)
+RUN_SETTINGS = {"rows", "extra_columns", "format", "file_mb"}
+
+
+class StubOllama:
+    """Answers every generate call with a fixed reply after an optional delay."""
+
+    def __init__(self, delay_seconds: float) -> None:
+        delay = delay_seconds
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                return
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(delay)
+                payload = json.dumps({"response": "stub answer", "done": True}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def questions(row_count: int, count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    templates = [
+        lambda: f"Who is in {rng.choice(DEPARTMENTS)} in {rng.choice(LOCATIONS)}?",
+        lambda: f"What is the salary of employee {rng.randrange(row_count)}?",
+        lambda: f"Which {rng.choice(DEPARTMENTS)} people earn {rng.randrange(40_000, 250_000, 500)}?",
+        lambda: f"Tell me about staff based in {rng.choice(LOCATIONS)}",
+    ]
+    return [rng.choice(templates)() for _ in range(count)]
+
+
+def percentiles(samples: list[float], prefix: str) -> dict:
+    ordered = sorted(samples)
+    p99_index = min(len(ordered) - 1, int(round(0.99 * (len(ordered) - 1))))
+    return {
+        f"{prefix}_p50_ms": round(statistics.median(ordered) * 1000, 3),
+        f"{prefix}_p99_ms": round(ordered[p99_index] * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def run(args: argparse.Namespace) -> dict:
+    init_db()
+    path = write_dataset(WORK_DIR / f"employees.{args.format}", args.rows, args.extra_columns)
+    size_mb = path.stat().st_size / (1024 * 1024)
+    results: dict = {
+        "rows": args.rows,
+        "extra_columns": args.extra_columns,
+        "format": args.format,
+        "file_mb": round(size_mb, 2),
+    }
+
+    def parse_all() -> None:
+        _, chunks = iter_tabular_file(path.name, path, 50_000)
+        for _ in chunks:
+            pass
+
+    parse_seconds = timed(parse_all)
+    results["parse_rows_per_second"] = int(args.rows / parse_seconds)
+    ingest_seconds = timed(ingest_file, "bench", path.name, path, datetime.now(timezone.utc).isoformat())
+    results["ingest_rows_per_second"] = int(args.rows / ingest_seconds)
+    results["ingest_mb_per_second"] = round(size_mb / ingest_seconds, 2)
+    results["peak_rss_after_ingest_mb"] = peak_rss_mb()
+
+    results["fetch_rows_ms"] = round(timed(fetch_rows, "bench") * 1000, 3)
+    batch = questions(args.rows, args.queries)
+    for engine in args.engines.split(","):
+        row_cache.clear()
+        cold = [timed(retrieve_relevant_rows, "bench", question, 20, engine) for question in batch]
+        warm = [timed(retrieve_relevant_rows, "bench", question, 20, engine) for question in batch]
+        results.update(percentiles(cold, f"retrieve_{engine}_cold"))
+        results.update(percentiles(warm, f"retrieve_{engine}_warm"))
+    retrieved = [retrieve_relevant_rows("bench", question, 20) for question in batch]
+    packing = [timed(pack_context, result.rows, question) for result, question in zip(retrieved, batch)]
+    results.update(percentiles(packing, "pack_context"))
+    results["peak_rss_after_retrieval_mb"] = peak_rss_mb()
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    stub = StubOllama(args.ollama_delay_ms / 1000)
+    llm_service.OLLAMA_BASE_URL = stub.base_url
+    try:
+        answer_cache.clear()
+        latencies = []
+        with TestClient(app) as client:
+            for question in batch:
+                started = time.perf_counter()
+                response = client.post("/api/chat", json={"question": question, "dataset_id": "bench"})
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+        results.update(percentiles(latencies, "chat"))
+    finally:
+        stub.stop()
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, value in results.items():
+        if name in RUN_SETTINGS:
+            continue
+        previous = baseline.get(name)
+        if not isinstance(value, (int, float)) or not isinstance(previous, (int, float)) or not previous:
+            continue
+        change = (value - previous) / previous
+        worse = -change if name.endswith(HIGHER_IS_BETTER_SUFFIXES) else change
+        marker = "REGRESSION" if worse > tolerance else ""
+        print(f"{name:40s} {previous:>14} -> {value:>14} ({change:+.1%}) {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--engines", default="lexical,fts")
+    parser.add_argument("--ollama-delay-ms", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, default=BENCHMARK_DIR / "results" / "latest.json")
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the generated file and database")
+    args = parser.parse_args()
+
+    try:
+        results = run(args)
+    finally:
+        close_connections()
+        if args.keep_workdir:
+            print(f"Work directory kept at {WORK_DIR}")
+        else:
+            shutil.rmtree(WORK_DIR, ignore_errors=True)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(json.dumps(results, indent=2))
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Synthetic datasets shaped like default_employees.csv, at configurable sizes and widths.
+
+    python benchmarks/synthetic.py --rows 100000 --extra-columns 6 --format csv --output /tmp/employees.csv
+"""
+
+import argparse
+import csv
+import json
+import random
+from pathlib import Path
+from typing import Iterator
+
+FIRST_NAMES = [
+    "Alice", "Bob", "Carol", "David", "Asha", "Chris", "Ravi", "Mira", "Omar", "Lee",
+    "Ana", "Marcus", "Priya", "Kenji", "Sofia", "Liam", "Noah", "Emma", "Yuki", "Zara",
+]
+LAST_NAMES = ["Smith", "Patel", "Garcia", "Kim", "Chen", "Okafor", "Silva", "Novak", "Haddad", "Ito"]
+DEPARTMENTS = ["Engineering", "Sales", "HR", "Finance", "Marketing", "Support", "Legal", "Operations"]
+LOCATIONS = [
+    "New York", "Chicago", "San Francisco", "Austin", "Seattle", "Boston", "Denver", "Atlanta",
+    "Pune", "Delhi", "Tokyo", "Berlin", "London", "Toronto", "Sydney", "Dublin",
+]
+BASE_COLUMNS = ["name", "department", "location", "salary"]
+
+
+def columns(extra_columns: int) -> list[str]:
+    return BASE_COLUMNS + [f"attribute_{index}" for index in range(extra_columns)]
+
+
+def generate_rows(row_count: int, extra_columns: int = 0, seed: int = 0) -> Iterator[dict[str, str]]:
+    rng = random.Random(seed)
+    for index in range(row_count):
+        row = {
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {index}",
+            "department": rng.choice(DEPARTMENTS),
+            "location": rng.choice(LOCATIONS),
+            "salary": str(rng.randrange(40_000, 250_000, 500)),
+        }
+        for column in range(extra_columns):
+            row[f"attribute_{column}"] = f"value{rng.randrange(1000)}"
+        yield row
+
+
+def write_dataset(path: Path, row_count: int, extra_columns: int = 0, seed: int = 0) -> Path:
+    """Write a .csv or .json (records array) file, chosen by the path suffix."""
+    rows = generate_rows(row_count, extra_columns, seed)
+    if path.suffix == ".json":
+        with path.open("w", encoding="utf-8") as stream:
+            stream.write("[")
+            for position, row in enumerate(rows):
+                stream.write(("," if position else "") + json.dumps(row))
+            stream.write("]")
+    else:
+        with path.open("w", encoding="utf-8", newline="") as stream:
+            writer = csv.DictWriter(stream, fieldnames=columns(extra_columns))
+            writer.writeheader()
+            writer.writerows(rows)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, required=True)
+    args = parser.parse_args()
+    path = args.output.with_suffix(f".{args.format}")
+    write_dataset(path, args.rows, args.extra_columns, args.seed)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
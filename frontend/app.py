@@ -1,10 +1,12 @@
 import os
+import time
 
 import requests
 import streamlit as st
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000")
 REQUEST_TIMEOUT = 30
+JOB_POLL_INTERVAL = 1.0
 
 st.set_page_config(page_title="Local Dataset AI Assistant", page_icon=":books:")
 st.title("Local Dataset AI Assistant")
@@ -41,6 +43,25 @@ def _safe_post(path: str, json: dict | None = None, files: dict | None = None, t
     return True, response.json()
 
 
+def _wait_for_job(job_id: str) -> dict:
+    progress = st.progress(0.0, text="Indexing dataset...")
+    while True:
+        ok, job = _safe_get(f"/api/jobs/{job_id}")
+        if not ok:
+            return {"status": "failed", "error": job["error"]}
+        if job["status"] in ("completed", "failed"):
+            progress.progress(1.0, text=f"Indexing {job['status']}.")
+            return job
+        rate = job.get("rows_per_second") or 0
+        estimated = job.get("rows_estimated")
+        of_total = f" of ~{estimated}" if estimated else ""
+        progress.progress(
+            job.get("progress") or 0.0,
+            text=f"Indexed {job['rows_inserted']}{of_total} rows ({rate:.0f} rows/s)...",
+        )
+        time.sleep(JOB_POLL_INTERVAL)
+
+
 backend_ok, health_payload = _safe_get("/health")
 if backend_ok:
     st.success("Backend connected.")
@@ -53,8 +74,13 @@ uploaded_file = st.file_uploader("Choose CSV or JSON", type=["csv", "json"])
 if uploaded_file is not None:
     files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
     if st.button("Upload"):
-        with st.spinner("Uploading and indexing dataset..."):
-            ok, payload = _safe_post("/api/upload", files=files, timeout=60)
+        with st.spinner("Uploading dataset..."):
+            ok, payload = _safe_post("/api/upload?background=true", files=files, timeout=60)
+        if ok:
+            payload = _wait_for_job(payload["job_id"])
+            ok = payload.get("status") == "completed"
+            if not ok:
+                payload = {"error": payload.get("error") or "Ingestion failed."}
         if ok:
             st.success("Uploaded successfully")
             st.session_state["dataset_id"] = payload.get("dataset_id")
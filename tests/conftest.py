@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import llm as llm_service
+from app.services import vector_index
+from app.services.answer_cache import answer_cache
+from app.services.metrics import metrics
+from app.services.query_planner import clear_dataset_frames
+from app.services.row_cache import row_cache
+
+
+class FakeOllama:
+    """Minimal local stand-in for the Ollama HTTP API that records what it receives."""
+
+    def __init__(self) -> None:
+        self.requests: list[dict] = []
+        self.tokens = ["Alice ", "works ", "in ", "HR."]
+        self.context = [101, 102, 103]
+        self.delay_seconds = 0.0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> "FakeOllama":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _final(self, body: dict) -> dict:
+        if not body.get("prompt"):
+            # Like Ollama, an empty prompt only loads the model: nothing is evaluated, no context returned.
+            return {"done": True, "done_reason": "load"}
+        evaluated = f"{body.get('system', '')} {body['prompt']}"
+        return {"done": True, "context": self.context, "prompt_eval_count": len(evaluated.split())}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                return
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.requests.append({"path": self.path, "body": body})
+                time.sleep(fake.delay_seconds)
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for token in fake.tokens:
+                        self._write_chunk(json.dumps({"response": token, "done": False}) + "\n")
+                    self._write_chunk(json.dumps({"response": "", **fake._final(body)}) + "\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                payload = json.dumps({"response": "".join(fake.tokens), **fake._final(body)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _write_chunk(self, text: str) -> None:
+                data = text.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+@pytest.fixture()
+def fake_ollama(monkeypatch):
+    fake = FakeOllama().start()
+    monkeypatch.setattr(llm_service, "OLLAMA_BASE_URL", fake.base_url)
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    # Tests reuse dataset ids across per-test databases, so process-wide caches must not leak.
+    answer_cache.clear()
+    row_cache.clear()
+    clear_dataset_frames()
+    vector_index.clear_vector_indexes()
+    metrics.reset()
+    yield
@@ -1,3 +1,6 @@
+import json
+import time
+from collections import Counter
 from pathlib import Path
 
 import pytest
@@ -5,6 +8,7 @@ from fastapi.testclient import TestClient
 
 from app.main import app
 from app.services import db as db_service
+from app.services import ingestion
 
 
 @pytest.fixture()
@@ -48,3 +52,185 @@ def test_chat_without_dataset(client: TestClient):
     assert response.status_code == 200
     payload = response.json()
     assert payload["dataset_id"] == db_service.DEFAULT_DATASET_ID
+
+
+def test_upload_json_is_ingested_in_chunks(client: TestClient, monkeypatch):
+    monkeypatch.setattr(ingestion, "INGEST_CHUNK_SIZE", 2)
+    records = [{"name": f"emp{i}", "department": "Finance"} for i in range(5)]
+    response = client.post(
+        "/api/upload",
+        files={"file": ("people.json", json.dumps({"records": records}), "application/json")},
+    )
+
+    assert response.status_code == 200
+    dataset_id = response.json()["dataset_id"]
+    assert response.json()["row_count"] == 5
+    rows = db_service.fetch_rows(dataset_id)
+    assert [row["row_index"] for row in rows] == [0, 1, 2, 3, 4]
+    with db_service.get_connection() as conn:
+        blocks = conn.execute(
+            "SELECT DISTINCT block FROM record_postings WHERE dataset_id = ? ORDER BY block",
+            (dataset_id,),
+        ).fetchall()
+    assert [row["block"] for row in blocks] == [0, 2, 4]
+
+
+def test_background_upload_reports_job_progress(client: TestClient):
+    sample_path = Path("data/sample/employees.csv")
+    with sample_path.open("rb") as stream:
+        response = client.post(
+            "/api/upload?background=true",
+            files={"file": ("employees.csv", stream, "text/csv")},
+        )
+
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(100):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.05)
+
+    assert job["status"] == "completed"
+    assert job["rows_inserted"] == job["rows_parsed"] == job["rows_estimated"] > 0
+    assert job["progress"] == 1.0
+    datasets = client.get("/api/datasets").json()["datasets"]
+    assert job["dataset_id"] in {item["id"] for item in datasets}
+
+
+def test_unknown_job_returns_404(client: TestClient):
+    assert client.get("/api/jobs/missing").status_code == 404
+
+
+def _append(client: TestClient, dataset_id: str, records: list[dict], key: str | None = None):
+    return client.post(
+        f"/api/datasets/{dataset_id}/append",
+        params={"key": key} if key else {},
+        files={"file": ("more.json", json.dumps({"records": records}), "application/json")},
+    )
+
+
+def test_append_skips_rows_already_stored(client: TestClient, monkeypatch):
+    monkeypatch.setattr(ingestion, "INGEST_CHUNK_SIZE", 2)
+    records = [{"name": f"emp{i}", "department": "Finance"} for i in range(3)]
+    dataset_id = client.post(
+        "/api/upload", files={"file": ("people.json", json.dumps({"records": records}), "application/json")}
+    ).json()["dataset_id"]
+    with db_service.get_connection() as conn:
+        hashes = conn.execute("SELECT row_hash FROM record_hashes WHERE dataset_id = ?", (dataset_id,)).fetchall()
+    assert len({row["row_hash"] for row in hashes}) == 3
+
+    response = _append(client, dataset_id, records[1:] + [{"name": "emp9", "department": "Legal"}] * 2)
+
+    assert response.status_code == 200
+    payload = response.json()
+    assert (payload["inserted"], payload["updated"], payload["unchanged"]) == (1, 0, 3)
+    assert payload["row_count"] == 4
+    assert db_service.fetch_rows(dataset_id)[-1]["row_index"] == 3
+    assert _append(client, "missing", records).status_code == 404
+
+
+def test_append_merges_new_rows_into_the_stored_profile(client: TestClient, monkeypatch):
+    from app.services.profiling import profile_rows
+
+    records = [{"name": "Asha", "salary": "10"}, {"name": "Ravi", "salary": "20"}]
+    dataset_id = client.post(
+        "/api/upload", files={"file": ("people.json", json.dumps({"records": records}), "application/json")}
+    ).json()["dataset_id"]
+    appended = [{"name": "Mira", "salary": "35.5", "city": "Pune"}]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("an insert-only append must not re-profile the dataset")
+
+    monkeypatch.setattr(db_service, "_iter_row_batches", fail)
+    assert _append(client, dataset_id, appended).status_code == 200
+    profile = client.get(f"/api/datasets/{dataset_id}/profile").json()["columns"]
+
+    assert profile == profile_rows(records + appended)
+    assert next(column for column in profile if column["name"] == "salary")["type"] == "float"
+
+
+def test_upsert_replaces_rows_in_place_and_patches_indexes(client: TestClient):
+    from app.services.retrieval import retrieve_relevant_rows
+    from app.services.row_cache import row_cache
+
+    records = [{"id": str(i), "name": f"emp{i}", "city": "Pune"} for i in range(4)]
+    dataset_id = client.post(
+        "/api/upload", files={"file": ("people.json", json.dumps({"records": records}), "application/json")}
+    ).json()["dataset_id"]
+    cached = row_cache.get(dataset_id)
+
+    response = _append(
+        client,
+        dataset_id,
+        [
+            {"id": "1", "name": "emp1", "city": "Tokyo"},
+            {"id": "2", "name": "emp2", "city": "Pune"},
+            {"id": "7", "name": "emp7", "city": "Tokyo"},
+        ],
+        key="id",
+    )
+
+    payload = response.json()
+    assert (payload["inserted"], payload["updated"], payload["unchanged"], payload["row_count"]) == (1, 1, 1, 5)
+    patched = row_cache.get(dataset_id)
+    assert patched is cached
+    assert patched.incidence.stale_rows.tolist() == [1]
+    assert patched.incidence.score(Counter(["tokyo"]), 5) == [(1, 1), (4, 1)]
+    assert patched.postings["tokyo"] == [1, 4]
+    assert patched.field_postings["tokyo"] == {"city": [1, 4]}
+    assert sorted(db_service.fetch_postings(dataset_id, ["tokyo", "pune"]).items()) == [
+        ("pune", [0, 2, 3]),
+        ("tokyo", [1, 4]),
+    ]
+    row_cache.clear()
+    rebuilt = row_cache.get(dataset_id)
+    assert rebuilt.postings == patched.postings
+    assert rebuilt.field_postings == patched.field_postings
+    for engine in ("lexical", "fts"):
+        result = retrieve_relevant_rows(dataset_id, "who is in tokyo", 10, engine)
+        assert sorted(row["row_index"] for row in result.rows) == [1, 4]
+    profile = client.get(f"/api/datasets/{dataset_id}/profile").json()["columns"]
+    assert next(column for column in profile if column["name"] == "city")["distinct_count"] == 2
+
+    assert _append(client, dataset_id, [{"name": "nokey"}], key="id").status_code == 400
+
+
+def test_append_failure_keeps_committed_chunks_visible(client: TestClient, monkeypatch):
+    from app.services.retrieval import retrieve_relevant_rows
+    from app.services.row_cache import row_cache
+
+    monkeypatch.setattr(ingestion, "INGEST_CHUNK_SIZE", 1)
+    dataset_id = client.post(
+        "/api/upload", files={"file": ("people.csv", b"id,name,city\n0,Asha,Pune\n", "text/csv")}
+    ).json()["dataset_id"]
+    assert row_cache.get(dataset_id) is not None
+
+    truncated = '[{"id": "1", "name": "Ravi", "city": "Kochi"}, {"id": "2", "name": "Mira", "city": "Goa"},'
+    response = client.post(
+        f"/api/datasets/{dataset_id}/append", files={"file": ("more.json", truncated, "application/json")}
+    )
+
+    assert response.status_code == 400
+    assert db_service.fetch_row_count(dataset_id) == 3
+    result = retrieve_relevant_rows(dataset_id, "who lives in kochi", 5)
+    assert [row["row_index"] for row in result.rows] == [1]
+    assert _append(client, dataset_id, [{"city": "Agra"}, {"id": "3", "city": "Agra"}], key="id").status_code == 400
+    assert db_service.fetch_row_count(dataset_id) == 3
+    # A later chunk without the key fails like a parse error: the chunks before it stay.
+    assert _append(client, dataset_id, [{"id": "3", "city": "Agra"}, {"city": "Agra"}], key="id").status_code == 400
+    assert db_service.fetch_row_count(dataset_id) == 4
+
+
+def test_rows_appended_without_key_are_found_by_later_upserts(client: TestClient):
+    dataset_id = client.post(
+        "/api/upload", files={"file": ("people.csv", b"id,name,city\n1,Asha,Pune\n2,Ravi,Delhi\n", "text/csv")}
+    ).json()["dataset_id"]
+    assert _append(client, dataset_id, [{"id": "2", "name": "Ravi", "city": "Agra"}], key="id").json()["updated"] == 1
+
+    assert _append(client, dataset_id, [{"id": "3", "name": "Cy", "city": "Goa"}]).json()["inserted"] == 1
+    payload = _append(client, dataset_id, [{"id": "3", "name": "Cy", "city": "Agra"}], key="id").json()
+
+    assert (payload["inserted"], payload["updated"], payload["row_count"]) == (0, 1, 3)
+    cities = [json.loads(row["row_json"])["city"] for row in db_service.fetch_rows(dataset_id)]
+    assert cities == ["Pune", "Agra", "Agra"]
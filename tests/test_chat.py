@@ -0,0 +1,472 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import app
+from app.services import db as db_service
+from app.services import llm as llm_service
+from app.services import query_planner, retrieval
+from app.routes import chat as chat_routes
+from app.services.answer_cache import AnswerCache, answer_cache
+from app.services.llm import LLMBusyError, LLMScheduler, llm_scheduler
+from app.services.single_flight import SingleFlight
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch, fake_ollama):
+    monkeypatch.setattr(db_service, "SQLITE_PATH", str(tmp_path / "test.db"), raising=False)
+    db_service.init_db()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_uses_fake_ollama(client: TestClient, fake_ollama):
+    response = client.post("/api/chat", json={"question": "Who is in HR?"})
+
+    assert response.status_code == 200
+    assert response.json()["answer"] == "Alice works in HR."
+    assert response.json()["context"]["packed_rows"] == len(response.json()["sources"])
+    assert fake_ollama.requests[0]["body"]["stream"] is False
+    assert "row,name,department,location,salary" in fake_ollama.requests[0]["body"]["prompt"]
+
+
+def test_generate_sends_static_system_prompt_and_keep_alive(client: TestClient, fake_ollama):
+    client.post("/api/chat", json={"question": "Who is in HR?"})
+
+    body = fake_ollama.requests[0]["body"]
+    assert body["system"] == llm_service.SYSTEM_PROMPT
+    assert body["keep_alive"] == llm_service.OLLAMA_KEEP_ALIVE
+    assert body["prompt"].startswith("QUESTION:\nWho is in HR?")
+    assert "context" not in body
+
+
+def test_prewarm_only_loads_the_model_and_chats_keep_the_system_prompt(client: TestClient, fake_ollama):
+    assert llm_service.prewarm_model() is True
+    client.post("/api/chat", json={"question": "Who is in HR?"})
+    client.post("/api/chat", json={"question": "Who is in Sales?"})
+
+    prewarm, *chats = [request["body"] for request in fake_ollama.requests]
+    assert prewarm == {
+        "model": llm_service.OLLAMA_MODEL,
+        "prompt": "",
+        "stream": False,
+        "keep_alive": llm_service.OLLAMA_KEEP_ALIVE,
+    }
+    assert [body["system"] for body in chats] == [llm_service.SYSTEM_PROMPT] * 2
+    assert all("context" not in body for body in chats)
+
+
+def test_startup_prewarms_when_enabled(tmp_path, monkeypatch, fake_ollama):
+    monkeypatch.setattr(db_service, "SQLITE_PATH", str(tmp_path / "test.db"), raising=False)
+    monkeypatch.setattr(main, "OLLAMA_PREWARM", True)
+    with TestClient(app):
+        deadline = time.monotonic() + 5
+        while not fake_ollama.requests and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert fake_ollama.requests[0]["body"]["prompt"] == ""
+
+
+def test_batch_answers_each_question_with_bounded_parallel_model_calls(client: TestClient, fake_ollama):
+    fake_ollama.delay_seconds = 0.3
+    questions = [
+        "Who is in HR?",
+        "Who is in Sales?",
+        "Who works in Austin?",
+        "Who is in Chicago?",
+        "who is in hr",
+        "How many employees are in Engineering?",
+        "quarterly revenue forecast",
+    ]
+
+    started = time.perf_counter()
+    response = client.post("/api/chat/batch", json={"questions": questions})
+    elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    payload = response.json()
+    results = payload["results"]
+    assert [result["question"] for result in results] == questions
+    assert results[0]["answer"] == "Alice works in HR." and results[0]["sources"] == [2]
+    assert results[4]["sources"] == results[0]["sources"]
+    assert results[5]["aggregate"]["rows"] == [{"count": 2}]
+    assert results[6]["reason"] == "no_relevant_context"
+    assert payload["model_calls"] == len(fake_ollama.requests) == 4
+    assert elapsed < 4 * fake_ollama.delay_seconds
+
+
+def test_batch_rejects_empty_question_list(client: TestClient):
+    assert client.post("/api/chat/batch", json={"questions": []}).status_code == 422
+
+
+def test_chat_stream_forwards_tokens(client: TestClient, fake_ollama):
+    response = client.post("/api/chat/stream", json={"question": "Who is in HR?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert events[0][0] == "meta"
+    assert events[0][1]["dataset_id"] == db_service.DEFAULT_DATASET_ID
+    assert [data["token"] for name, data in events if name == "token"] == fake_ollama.tokens
+    assert events[-1] == ("done", {})
+    assert fake_ollama.requests[-1]["body"]["stream"] is True
+
+
+def test_chat_stream_releases_model_slot_when_client_leaves(client: TestClient, fake_ollama):
+    async def leave(after_meta: bool) -> int:
+        response = await chat_routes.chat_stream(chat_routes.ChatRequest(question="Who is in HR?"))
+        assert llm_scheduler.stats()["in_flight"] == 1
+        if after_meta:
+            assert (await response.body_iterator.__anext__()).startswith("event: meta")
+            await response.body_iterator.aclose()
+        else:
+            await response.background()
+        return llm_scheduler.stats()["in_flight"]
+
+    assert asyncio.run(leave(after_meta=True)) == 0
+    assert asyncio.run(leave(after_meta=False)) == 0
+
+
+def test_chat_stream_without_context_skips_model(client: TestClient, fake_ollama):
+    response = client.post("/api/chat/stream", json={"question": "quarterly revenue forecast"})
+
+    events = _events(response.text)
+    assert [data["token"] for name, data in events if name == "token"] == [
+        "I don't know based on the uploaded dataset."
+    ]
+    assert events[-1] == ("done", {"reason": "no_relevant_context"})
+    assert fake_ollama.requests == []
+
+
+def test_repeated_question_is_served_from_answer_cache(client: TestClient, fake_ollama):
+    first = client.post("/api/chat", json={"question": "Who is in HR?"}).json()
+    second = client.post("/api/chat", json={"question": "who is in hr"}).json()
+
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["answer"] == first["answer"]
+    assert len(fake_ollama.requests) == 1
+    stats = client.get("/api/cache/stats").json()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+    answer_cache.invalidate_dataset(db_service.DEFAULT_DATASET_ID)
+    assert client.post("/api/chat", json={"question": "Who is in HR?"}).json()["cached"] is False
+
+
+def test_answer_cache_disk_tier_and_ttl(client: TestClient):
+    disk_cache = AnswerCache(max_entries=1, ttl_seconds=60, persist=True)
+    disk_cache.put("a", "ds", "answer a")
+    disk_cache.put("b", "ds", "answer b")
+
+    assert disk_cache.stats()["evictions"] == 1
+    assert AnswerCache(max_entries=1, ttl_seconds=60, persist=True).get("a") == "answer a"
+    assert AnswerCache(max_entries=1, ttl_seconds=0, persist=True).get("b") is None
+
+
+def test_aggregate_question_is_answered_without_model(client: TestClient, fake_ollama):
+    response = client.post("/api/chat", json={"question": "What is the total salary by department?"})
+
+    payload = response.json()
+    assert payload["aggregate"]["operation"] == "sum"
+    assert payload["aggregate"]["group_by"] == "department"
+    assert payload["answer"].startswith("Total of salary by department:")
+    assert fake_ollama.requests == []
+
+
+def test_who_has_extreme_question_answers_from_the_matching_row(client: TestClient, fake_ollama):
+    payload = client.post("/api/chat", json={"question": "Who has the highest salary?"}).json()
+
+    assert payload["sources"] == [0]
+    assert "aggregate" not in payload
+    assert "0,Alice,120000" in fake_ollama.requests[0]["body"]["prompt"]
+
+
+def test_row_selecting_aggregate_keys_cache_with_retrieval_terms(client: TestClient, monkeypatch):
+    keys = []
+    make_key = chat_routes.make_cache_key
+
+    def recording_key(dataset_id, question_tokens, source_rows, model):
+        keys.append(question_tokens)
+        return make_key(dataset_id, question_tokens, source_rows, model)
+
+    monkeypatch.setattr(chat_routes, "make_cache_key", recording_key)
+    client.post("/api/chat", json={"question": "Who has the highest salary?"})
+
+    assert keys == [retrieval.question_terms("Who has the highest salary?")] == [["has", "highest", "salary"]]
+
+
+@pytest.mark.parametrize("question", ["How many employees are in Marketing?", "How many years has Alice worked here?"])
+def test_aggregate_over_unknown_values_falls_back_to_retrieval(client: TestClient, question):
+    payload = client.post("/api/chat", json={"question": question}).json()
+
+    assert "aggregate" not in payload
+
+
+def test_aggregate_frame_is_cached_until_the_dataset_changes(client: TestClient, monkeypatch):
+    builds = []
+    build_frame = query_planner._build_frame
+
+    def counting_build(dataset_id):
+        builds.append(dataset_id)
+        return build_frame(dataset_id)
+
+    monkeypatch.setattr(query_planner, "_build_frame", counting_build)
+    first = client.post("/api/chat", json={"question": "What is the total salary?"}).json()
+    client.post("/api/chat", json={"question": "How many employees are in HR?"})
+    dataset_id = first["dataset_id"]
+    assert builds == [dataset_id]
+
+    client.post(
+        f"/api/datasets/{dataset_id}/append",
+        files={"file": ("more.csv", b"name,department,location,salary\nErin,HR,Boston,80000\n", "text/csv")},
+    )
+    second = client.post("/api/chat", json={"question": "What is the total salary?"}).json()
+
+    assert builds == [dataset_id, dataset_id]
+    assert first["answer"] == "Total of salary: 420000." and second["answer"] == "Total of salary: 500000."
+
+
+def test_aggregate_intent_without_known_column_skips_frame_load(client: TestClient, monkeypatch):
+    def fail(dataset_id):
+        raise AssertionError("no frame should be loaded")
+
+    monkeypatch.setattr(query_planner, "load_dataset_frame", fail)
+    monkeypatch.setattr(chat_routes, "load_dataset_frame", fail)
+    response = client.post("/api/chat", json={"question": "What is the highest rating?"})
+
+    assert response.status_code == 200
+    assert "aggregate" not in response.json()
+
+
+def test_scheduler_queues_then_rejects_with_retry_after():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=1, queue_timeout=0.2)
+    started = scheduler.acquire()
+    errors: list[LLMBusyError] = []
+
+    def wait_for_slot() -> None:
+        try:
+            scheduler.acquire()
+        except LLMBusyError as exc:
+            errors.append(exc)
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    time.sleep(0.05)
+    assert scheduler.stats()["queued"] == 1
+    with pytest.raises(LLMBusyError) as rejected:
+        scheduler.acquire()
+    waiter.join()
+    scheduler.release(started)
+
+    assert rejected.value.status_code == 429 and rejected.value.retry_after >= 1
+    assert [exc.status_code for exc in errors] == [503]
+    stats = scheduler.stats()
+    assert (stats["in_flight"], stats["queued"], stats["rejected"], stats["timed_out"]) == (0, 0, 1, 1)
+
+
+def test_cancelled_async_waiter_hands_its_slot_back():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=2, queue_timeout=5)
+
+    async def cancel_while_queued() -> dict:
+        started = scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.acquire_async())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release(started)
+        for _ in range(200):
+            if scheduler.stats()["completed"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        return scheduler.stats()
+
+    stats = asyncio.run(cancel_while_queued())
+
+    assert (stats["in_flight"], stats["queued"], stats["completed"]) == (0, 0, 2)
+
+
+def test_chat_returns_429_when_model_queue_is_full(client: TestClient, fake_ollama, monkeypatch):
+    saturated = LLMScheduler(max_in_flight=1, max_queue=0, queue_timeout=1)
+    saturated.acquire()
+    monkeypatch.setattr(llm_service, "llm_scheduler", saturated)
+    monkeypatch.setattr(chat_routes, "llm_scheduler", saturated)
+
+    response = client.post("/api/chat", json={"question": "Who is in HR?"})
+    stream = client.post("/api/chat/stream", json={"question": "Who is in HR?"})
+
+    assert response.status_code == stream.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert fake_ollama.requests == []
+    assert client.get("/api/llm/stats").json()["max_in_flight"] >= 1
+
+
+def test_identical_concurrent_questions_share_one_generation(client: TestClient, fake_ollama):
+    fake_ollama.delay_seconds = 0.3
+    questions = ["Who is in HR?", "who is in HR", "Who is in HR?!", "Who is in HR?"]
+
+    with ThreadPoolExecutor(max_workers=len(questions)) as executor:
+        responses = list(
+            executor.map(lambda question: client.post("/api/chat", json={"question": question}), questions)
+        )
+
+    assert [response.status_code for response in responses] == [200] * len(questions)
+    assert {response.json()["answer"] for response in responses} == {"Alice works in HR."}
+    assert len(fake_ollama.requests) == 1
+    assert chat_routes.chat_flights.stats()["shared"] >= 1
+
+
+def test_single_flight_shares_errors_with_waiters():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        release.wait(1)
+        raise RuntimeError("boom")
+
+    def follower():
+        time.sleep(0.05)
+        try:
+            flights.do("key", fail)
+        except RuntimeError as exc:
+            return str(exc)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(follower)
+        threading.Timer(0.2, release.set).start()
+        with pytest.raises(RuntimeError):
+            flights.do("key", fail)
+        assert future.result() == "boom"
+    assert len(calls) == 1
+    assert flights.stats() == {"calls": 1, "shared": 1, "in_flight": 0}
+
+
+def _upload(client: TestClient, name: str, text: str, tag: str | None = None) -> str:
+    params = {"tag": tag} if tag else {}
+    response = client.post("/api/upload", params=params, files={"file": (name, text.encode(), "text/csv")})
+    assert response.status_code == 200
+    return response.json()["dataset_id"]
+
+
+def test_answer_cache_key_follows_source_row_content(client: TestClient, fake_ollama, monkeypatch):
+    dataset_id = _upload(client, "people.csv", "id,name,department\n1,Alice,HR\n2,Bob,Sales\n")
+    client.post("/api/chat", json={"question": "Who is in HR?", "dataset_id": dataset_id})
+    # As if the answer above were stored only after the upsert had invalidated the cache.
+    monkeypatch.setattr(answer_cache, "invalidate_dataset", lambda dataset_id: None)
+    client.post(
+        f"/api/datasets/{dataset_id}/append",
+        params={"key": "id"},
+        files={"file": ("fix.csv", b"id,name,department\n1,Alicia,HR\n", "text/csv")},
+    )
+
+    payload = client.post("/api/chat", json={"question": "Who is in HR?", "dataset_id": dataset_id}).json()
+
+    assert len(fake_ollama.requests) == 2
+    assert "Alicia" in fake_ollama.requests[1]["body"]["prompt"]
+    assert payload["sources"] == [0]
+
+
+def test_federated_chat_by_tag_merges_rows_from_each_dataset(client: TestClient, fake_ollama):
+    january = _upload(client, "jan.csv", "name,region,amount\nAna,North,10\nBo,South,20\n", tag="monthly")
+    february = _upload(client, "feb.csv", "name,region,amount\nCy,North,30\nDee,East,40\n", tag="monthly")
+    _upload(client, "other.csv", "name,region,amount\nEd,North,50\n")
+
+    payload = client.post("/api/chat", json={"question": "Who sold in North?", "tag": "monthly"}).json()
+
+    assert payload["dataset_ids"] == [january, february]
+    assert payload["sources"] == [
+        {"dataset_id": january, "row_index": 0},
+        {"dataset_id": february, "row_index": 0},
+    ]
+    prompt = fake_ollama.requests[0]["body"]["prompt"]
+    assert "dataset,row,name,region,amount" in prompt
+    assert f"jan.csv#{january[:8]},0,Ana,North,10" in prompt
+    assert f"feb.csv#{february[:8]},0,Cy,North,30" in prompt
+
+
+def test_federated_rows_from_same_named_uploads_stay_distinguishable(client: TestClient, fake_ollama):
+    first = _upload(client, "sales.csv", "name,region\nAna,North\n")
+    second = _upload(client, "sales.csv", "name,region\nCy,North\n")
+
+    client.post("/api/chat", json={"question": "Who sold in North?", "dataset_ids": [first, second]})
+
+    prompt = fake_ollama.requests[0]["body"]["prompt"]
+    assert f"sales.csv#{first[:8]},0,Ana" in prompt and f"sales.csv#{second[:8]},0,Cy" in prompt
+
+
+def test_federated_aggregate_runs_over_the_union(client: TestClient, fake_ollama):
+    january = _upload(client, "jan.csv", "name,region,amount\nAna,North,10\nBo,South,20\n")
+    february = _upload(client, "feb.csv", "name,region,amount\nCy,North,30\n")
+
+    payload = client.post(
+        "/api/chat", json={"question": "What is the total amount?", "dataset_ids": [january, february]}
+    ).json()
+
+    assert payload["aggregate"]["operation"] == "sum"
+    assert "60" in payload["answer"]
+    assert fake_ollama.requests == []
+
+
+def test_federated_who_question_maps_the_extreme_back_to_its_dataset(client: TestClient, fake_ollama):
+    january = _upload(client, "jan.csv", "name,region,amount\nAna,North,10\nBo,South,20\n")
+    february = _upload(client, "feb.csv", "name,region,amount\nCy,North,30\nDee,East,40\n")
+
+    payload = client.post(
+        "/api/chat", json={"question": "Who has the largest amount?", "dataset_ids": [january, february]}
+    ).json()
+
+    assert payload["sources"] == [{"dataset_id": february, "row_index": 1}]
+    assert f"feb.csv#{february[:8]},1,Dee,40" in fake_ollama.requests[0]["body"]["prompt"]
+
+
+def test_federated_aggregate_without_known_column_skips_frame_loads(client: TestClient, fake_ollama, monkeypatch):
+    january = _upload(client, "jan.csv", "name,region,amount\nAna,North,10\n")
+    february = _upload(client, "feb.csv", "name,region,amount\nCy,North,30\n")
+
+    def fail(dataset_id):
+        raise AssertionError("no frame should be loaded")
+
+    monkeypatch.setattr(chat_routes, "load_dataset_frame", fail)
+    payload = client.post(
+        "/api/chat", json={"question": "What is the total in North?", "dataset_ids": [january, february]}
+    ).json()
+
+    assert "aggregate" not in payload
+    assert len(payload["sources"]) == 2
+
+
+def test_federated_chat_validates_dataset_selection(client: TestClient):
+    missing = client.post("/api/chat", json={"question": "Who is in HR?", "dataset_ids": ["nope"]})
+    unknown_tag = client.post("/api/chat", json={"question": "Who is in HR?", "tag": "none"})
+    both = client.post(
+        "/api/chat",
+        json={"question": "Who is in HR?", "dataset_id": db_service.DEFAULT_DATASET_ID, "tag": "x"},
+    )
+
+    assert missing.status_code == 404
+    assert unknown_tag.status_code == 404
+    assert both.status_code == 400
+
+
+def test_dataset_tag_can_be_set_after_upload(client: TestClient):
+    response = client.put(f"/api/datasets/{db_service.DEFAULT_DATASET_ID}/tag", json={"tag": "staff"})
+
+    assert response.status_code == 200
+    assert db_service.list_dataset_ids_by_tag("staff") == [db_service.DEFAULT_DATASET_ID]
+    assert client.put("/api/datasets/missing/tag", json={"tag": "staff"}).status_code == 404
@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import columnar
+from app.services import db as db_service
+from app.services import ingestion
+from app.services.retrieval import retrieve_relevant_rows
+
+ROWS = [
+    {"name": "Asha", "salary": "95000", "rating": "4.5", "note": ""},
+    {"name": "Chris", "salary": "120000", "rating": "", "note": "remote"},
+    {"name": "Ravi", "salary": "88000", "rating": "3.75"},
+]
+
+
+def test_segments_infer_types_and_round_trip(tmp_path):
+    columnar.write_segment(tmp_path, "people", ROWS[:2], 0)
+    columnar.write_segment(tmp_path, "people", ROWS[2:], 2)
+
+    segment = columnar.read_manifest(tmp_path, "people")["segments"][0]
+    assert {column["name"]: column["kind"] for column in segment["columns"]} == {
+        "name": "str",
+        "salary": "int",
+        "rating": "float",
+        "note": "str",
+    }
+    assert [row for _, row in columnar.read_rows(tmp_path, "people")] == ROWS
+    assert columnar.read_rows(tmp_path, "people", [2, 0]) == [(0, ROWS[0]), (2, ROWS[2])]
+
+    frame = columnar.load_frame(tmp_path, "people")
+    assert frame["salary"].dtype == np.int64
+    assert frame["salary"].sum() == 303000
+
+
+def test_non_canonical_numbers_stay_strings(tmp_path):
+    columnar.write_segment(tmp_path, "codes", [{"zip": "00501"}, {"zip": "10001"}, {"zip": "1e3"}], 0)
+
+    assert [row["zip"] for _, row in columnar.read_rows(tmp_path, "codes")] == ["00501", "10001", "1e3"]
+
+
+def test_negative_zero_is_not_stored_as_an_integer(tmp_path):
+    columnar.write_segment(tmp_path, "deltas", [{"delta": "-0"}, {"delta": "0"}, {"delta": "-5"}], 0)
+
+    assert [row["delta"] for _, row in columnar.read_rows(tmp_path, "deltas")] == ["-0", "0", "-5"]
+    assert columnar.read_manifest(tmp_path, "deltas")["segments"][0]["columns"][0]["kind"] == "str"
+
+
+@pytest.fixture()
+def columnar_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_service, "SQLITE_PATH", str(tmp_path / "test.db"), raising=False)
+    monkeypatch.setattr(ingestion, "COLUMNAR_STORAGE", True)
+    db_service.init_db()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_columnar_upload_skips_row_blobs(columnar_client: TestClient):
+    content = "name,department,salary\nAsha,HR,95000\nChris,Engineering,120000\n"
+    response = columnar_client.post(
+        "/api/upload", files={"file": ("people.csv", content, "text/csv")}
+    )
+    dataset_id = response.json()["dataset_id"]
+
+    with db_service.get_connection() as conn:
+        stored = conn.execute(
+            "SELECT COUNT(*) AS count FROM records WHERE dataset_id = ?", (dataset_id,)
+        ).fetchone()
+    assert stored["count"] == 0
+    assert db_service.get_dataset_storage(dataset_id) == "columnar"
+
+    result = retrieve_relevant_rows(dataset_id, "Who is in Engineering?", engine="fts")
+    assert [row["row_index"] for row in result.rows] == [1]
+    assert result.rows[0]["row_text"] == "name: Chris | department: Engineering | salary: 120000"
+
+    db_service.delete_dataset(dataset_id)
+    assert not (db_service.columnar_root() / dataset_id).exists()
+
+
+def test_columnar_upsert_rewrites_segment(columnar_client: TestClient):
+    records = [{"id": str(i), "salary": str(1000 * i)} for i in range(3)]
+    dataset_id = columnar_client.post(
+        "/api/upload", files={"file": ("pay.json", json.dumps({"records": records}), "application/json")}
+    ).json()["dataset_id"]
+
+    response = columnar_client.post(
+        f"/api/datasets/{dataset_id}/append",
+        params={"key": "id"},
+        files={
+            "file": (
+                "pay.json",
+                json.dumps({"records": [{"id": "1", "salary": "5000"}, {"id": "3", "salary": "7000"}]}),
+                "application/json",
+            )
+        },
+    )
+
+    assert response.json()["row_count"] == 4
+    root = db_service.columnar_root()
+    assert [row["salary"] for _, row in columnar.read_rows(root, dataset_id)] == ["0", "5000", "2000", "7000"]
+    assert len(columnar.read_manifest(root, dataset_id)["segments"]) == 2
+    assert columnar.load_frame(root, dataset_id)["salary"].sum() == 14000
+
+
+def test_rewritten_segments_stay_readable_until_the_next_rewrite(tmp_path):
+    columnar.write_segment(tmp_path, "people", ROWS, 0)
+    first = columnar.read_manifest(tmp_path, "people")["segments"][0]
+
+    columnar.replace_rows(tmp_path, "people", {1: {"name": "Chris", "salary": "1"}})
+    assert (tmp_path / "people" / first["dir"]).is_dir()
+    second = columnar.read_manifest(tmp_path, "people")["segments"][0]
+    columnar.replace_rows(tmp_path, "people", {1: {"name": "Chris", "salary": "2"}})
+
+    assert not (tmp_path / "people" / first["dir"]).exists()
+    assert (tmp_path / "people" / second["dir"]).is_dir()
+    # A reader still holding the first manifest falls back to the current segment.
+    assert columnar._decode_current(tmp_path, "people", first, [1]) == [{"name": "Chris", "salary": "2"}]
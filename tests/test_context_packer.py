@@ -0,0 +1,45 @@
+from app.services.context_packer import estimate_tokens, pack_context
+
+
+def _rows(records: list[dict]) -> list[dict]:
+    return [{"row_index": index, "record": record} for index, record in enumerate(records)]
+
+
+ROWS = _rows(
+    [
+        {"name": "Asha", "department": "HR", "city": "Pune", "salary": "95000", "notes": "x" * 40},
+        {"name": "Chris", "department": "Engineering", "city": "Three Rivers", "salary": "120000"},
+        {"name": "Ravi", "department": "HR", "city": "Delhi", "salary": "88000", "notes": "y" * 40},
+    ]
+)
+
+
+def test_rows_render_as_csv_under_a_shared_header():
+    packed = pack_context(ROWS, "Tell me about Chris")
+
+    assert packed.columns == ["name", "department", "city", "salary", "notes"]
+    assert packed.text.splitlines()[:3] == [
+        "row,name,department,city,salary,notes",
+        f"0,Asha,HR,Pune,95000,{'x' * 40}",
+        "1,Chris,Engineering,Three Rivers,120000,",
+    ]
+    assert packed.estimated_tokens == sum(estimate_tokens(line) for line in packed.text.splitlines())
+
+
+def test_named_columns_prune_the_rest():
+    packed = pack_context(ROWS, "What is the salary of people in Pune?", {"department": ["hr"]})
+
+    assert packed.columns == ["name", "department", "city", "salary"]
+    assert packed.text.splitlines()[1] == "0,Asha,HR,Pune,95000"
+
+
+def test_rows_are_packed_until_the_budget_is_spent():
+    header_and_first = estimate_tokens("row,name,department,city,salary,notes") + estimate_tokens(
+        f"0,Asha,HR,Pune,95000,{'x' * 40}"
+    )
+
+    packed = pack_context(ROWS, "anyone", budget_tokens=header_and_first)
+
+    assert [row["row_index"] for row in packed.rows] == [0]
+    assert len(pack_context(ROWS, "anyone", budget_tokens=1).rows) == 1
+    assert len(pack_context(ROWS, "anyone").rows) == 3
@@ -0,0 +1,43 @@
+import pytest
+
+from app.services import db as db_service
+
+
+@pytest.fixture()
+def isolated_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_service, "SQLITE_PATH", str(tmp_path / "test.db"), raising=False)
+    db_service.init_db()
+    yield
+    db_service.close_connections()
+
+
+def test_connections_are_reused_with_tuned_pragmas(isolated_db):
+    with db_service.get_connection() as conn:
+        first = conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA mmap_size").fetchone()[0] > 0
+
+    with db_service.get_connection() as conn:
+        assert conn is first
+
+
+def test_failed_block_is_rolled_back(isolated_db):
+    with pytest.raises(RuntimeError):
+        with db_service.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO datasets (id, name, file_type, row_count, created_at) "
+                "VALUES ('tmp', 'tmp.csv', 'csv', 0, 'now')"
+            )
+            raise RuntimeError("boom")
+
+    assert not db_service.dataset_exists("tmp")
+
+
+def test_init_db_records_schema_version_and_is_idempotent(isolated_db):
+    db_service.init_db()
+
+    with db_service.get_connection() as conn:
+        versions = conn.execute("SELECT version FROM schema_version").fetchall()
+    assert [row["version"] for row in versions] == [len(db_service.SCHEMA_MIGRATIONS)]
+    assert db_service.dataset_exists(db_service.DEFAULT_DATASET_ID)
@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import db as db_service
+from app.services.metrics import Metrics, collect_timings, metrics, stage
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch, fake_ollama):
+    monkeypatch.setattr(db_service, "SQLITE_PATH", str(tmp_path / "test.db"), raising=False)
+    db_service.init_db()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_render_emits_cumulative_histogram_buckets_and_escaped_labels():
+    registry = Metrics(buckets=(0.01, 0.1))
+    registry.describe("stage_duration_seconds", "Time per stage.")
+    registry.observe("stage_duration_seconds", 0.005, stage="parse")
+    registry.observe("stage_duration_seconds", 0.05, stage="parse")
+    registry.observe("stage_duration_seconds", 3.0, stage="parse")
+    registry.inc("rows_total", 2, source='a "quoted" name')
+
+    text = registry.render(gauges={"queued": {(): 3}})
+
+    assert "# HELP lda_stage_duration_seconds Time per stage." in text
+    assert "# TYPE lda_stage_duration_seconds histogram" in text
+    assert 'lda_stage_duration_seconds_bucket{stage="parse",le="0.01"} 1' in text
+    assert 'lda_stage_duration_seconds_bucket{stage="parse",le="0.1"} 2' in text
+    assert 'lda_stage_duration_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'lda_stage_duration_seconds_count{stage="parse"} 3' in text
+    assert 'lda_rows_total{source="a \\"quoted\\" name"} 2' in text
+    assert "# TYPE lda_queued gauge\nlda_queued 3" in text
+
+
+def test_stage_timings_are_collected_only_inside_the_context():
+    with stage("outside"):
+        pass
+    with collect_timings() as timings:
+        with stage("inside"):
+            pass
+        with stage("inside"):
+            pass
+
+    assert list(timings) == ["inside"]
+    assert metrics.histogram_count("stage_duration_seconds", stage="inside") == 2
+    assert metrics.histogram_count("stage_duration_seconds", stage="outside") == 1
+
+
+def test_chat_reports_stage_timings_when_requested(client: TestClient, fake_ollama):
+    plain = client.post("/api/chat", json={"question": "Who is in HR?"}).json()
+    timed = client.post("/api/chat", json={"question": "Who works in Engineering?", "timings": True}).json()
+
+    assert "timings_ms" not in plain
+    stages = timed["timings_ms"]
+    assert {"aggregate", "retrieval", "pack_context", "answer_cache", "llm_queue", "llm", "total"} <= set(stages)
+    assert stages["total"] >= stages["llm"] >= 0
+    assert metrics.counter_value("chat_answers_total", result="model") == 2
+    assert metrics.counter_value("retrieval_rows_returned_total", engine="filters") >= 2
+
+
+def test_metrics_endpoint_exposes_request_stage_and_cache_series(client: TestClient, fake_ollama):
+    client.post("/api/chat", json={"question": "Who is in HR?"})
+    client.post("/api/chat", json={"question": "Who is in HR?"})
+    with Path("data/sample/employees.csv").open("rb") as stream:
+        client.post("/api/upload", files={"file": ("employees.csv", stream, "text/csv")})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'lda_http_requests_total{method="POST",route="/api/chat",status="200"} 2' in text
+    assert 'lda_answer_cache_lookups_total{result="hit"} 1' in text
+    assert 'lda_chat_answers_total{result="cached"} 1' in text
+    assert 'lda_stage_duration_seconds_count{stage="ingest_parse"}' in text
+    assert 'lda_stage_duration_seconds_count{stage="upload_spool"} 1' in text
+    assert 'lda_ingest_bytes_parsed_total{file_type="csv"} ' in text
+    assert 'lda_ingest_rows_total{file_type="csv"} ' in text
+    assert "lda_llm_in_flight 0" in text
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from app.services.parsing import estimate_row_count, iter_tabular_file, parse_tabular_file
+
+
+def _write(tmp_path, name: str, content: str):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def test_csv_streams_in_chunks_matching_full_parse(tmp_path):
+    content = "name,department,salary\n" + "".join(f"emp{i},HR,{i}\n" for i in range(7))
+    path = _write(tmp_path, "people.csv", content)
+
+    file_type, chunks = iter_tabular_file("people.csv", path, chunk_size=3)
+    chunks = list(chunks)
+
+    assert file_type == "csv"
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert [row for chunk in chunks for row in chunk] == parse_tabular_file(
+        "people.csv", content.encode("utf-8")
+    )[1]
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        [{"id": 1, "name": "A"}, {"id": 2, "name": None}, "skip", {"id": 12345, "name": "C"}],
+        {"meta": {"source": "x"}, "records": [{"id": 1}, {"id": 2.5}]},
+        {"id": 7, "tags": ["a", "b"], "name": "solo"},
+        [],
+    ],
+)
+def test_json_streaming_matches_full_parse(tmp_path, monkeypatch, payload):
+    content = json.dumps(payload, indent=2)
+    path = _write(tmp_path, "data.json", content)
+    monkeypatch.setattr("app.services.parsing._JsonStreamReader.READ_SIZE", 4)
+
+    file_type, chunks = iter_tabular_file("data.json", path, chunk_size=2)
+
+    assert file_type == "json"
+    assert [row for chunk in chunks for row in chunk] == parse_tabular_file(
+        "data.json", content.encode("utf-8")
+    )[1]
+
+
+def test_stream_rejects_unsupported_extension(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported file type"):
+        iter_tabular_file("notes.txt", tmp_path / "notes.txt", chunk_size=10)
+
+
+@pytest.mark.parametrize(
+    ("name", "content", "expected"),
+    [
+        ("people.csv", "name,city\nAsha,Pune\nRavi,Delhi\n", 2),
+        ("people.csv", "name,city\nAsha,Pune\nRavi,Delhi", 2),
+        ("people.json", '[{"name": "Asha"}, {"name": "Ravi"}]', 2),
+        ("people.json", ' {"records": [{"name": "Asha"}, {"name": "Ravi"}]}', 2),
+    ],
+)
+def test_row_count_estimate_matches_plain_files(tmp_path, name, content, expected):
+    assert estimate_row_count(name, _write(tmp_path, name, content)) == expected
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import db as db_service
+from app.services import ingestion, profiling
+from app.services.profiling import DatasetProfiler, profile_rows
+
+ROWS = [
+    {"name": "Asha", "department": "HR", "salary": "95000", "rating": "4.5"},
+    {"name": "Chris", "department": "Engineering", "salary": "120000", "rating": ""},
+    {"name": "Ravi", "department": "HR", "salary": "88000"},
+    {"name": "Mina", "department": "Finance", "salary": "101000", "rating": "3.75", "remote": "yes"},
+]
+
+
+def _by_name(profiles: list[dict]) -> dict[str, dict]:
+    return {profile["name"]: profile for profile in profiles}
+
+
+def test_profile_infers_types_nulls_and_top_values():
+    profiles = _by_name(profile_rows(ROWS))
+
+    assert [profile["name"] for profile in profile_rows(ROWS)] == [
+        "name",
+        "department",
+        "salary",
+        "rating",
+        "remote",
+    ]
+    salary = profiles["salary"]
+    assert salary["type"] == "integer"
+    assert (salary["min"], salary["max"]) == (88000, 120000)
+    assert sum(salary["histogram"]["counts"]) == 4
+    assert profiles["rating"]["type"] == "float"
+    assert profiles["rating"]["null_count"] == 2
+    assert profiles["rating"]["null_rate"] == 0.5
+    assert profiles["remote"]["null_count"] == 3
+    department = profiles["department"]
+    assert department["type"] == "string"
+    assert department["distinct_count"] == 3
+    assert department["top_values"][0] == {"value": "HR", "count": 2}
+    assert department["min"] is None and department["histogram"] is None
+
+
+def test_chunked_profiles_merge_to_the_same_result():
+    chunked = DatasetProfiler()
+    for start in range(0, len(ROWS), 3):
+        chunked.update(ROWS[start : start + 3])
+
+    merged = DatasetProfiler()
+    for row in ROWS:
+        part = DatasetProfiler()
+        part.update([row])
+        merged.merge(part)
+
+    expected = profile_rows(ROWS)
+    assert chunked.finalize() == expected
+    assert merged.finalize() == expected
+
+
+def test_stored_state_keeps_merging_like_a_live_profiler():
+    stored = DatasetProfiler()
+    stored.update(ROWS[:4])
+    restored = DatasetProfiler.from_states(json.loads(json.dumps(stored.to_states())))
+    appended = DatasetProfiler()
+    appended.update(ROWS[4:])
+    restored.merge(appended)
+
+    assert restored.finalize() == profile_rows(ROWS)
+
+
+def test_distinct_count_is_estimated_beyond_sketch(monkeypatch):
+    monkeypatch.setattr(profiling, "DISTINCT_SKETCH_SIZE", 64)
+    rows = [{"code": f"c{index}"} for index in range(2000)]
+
+    profile = profile_rows(rows)[0]
+
+    assert profile["distinct_is_estimate"] is True
+    assert 1400 < profile["distinct_count"] < 2600
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_service, "SQLITE_PATH", str(tmp_path / "test.db"), raising=False)
+    db_service.init_db()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_upload_stores_profile_served_by_endpoint(client: TestClient, monkeypatch):
+    monkeypatch.setattr(ingestion, "INGEST_CHUNK_SIZE", 2)
+    content = "name,department,salary\nAsha,HR,95000\nChris,Engineering,120000\nRavi,HR,88000\n"
+    dataset_id = client.post(
+        "/api/upload", files={"file": ("people.csv", content, "text/csv")}
+    ).json()["dataset_id"]
+
+    response = client.get(f"/api/datasets/{dataset_id}/profile")
+
+    assert response.status_code == 200
+    profiles = _by_name(response.json()["columns"])
+    assert profiles["salary"]["count"] == 3
+    assert profiles["salary"]["max"] == 120000
+    assert profiles["department"]["top_values"][0] == {"value": "HR", "count": 2}
+
+    db_service.delete_dataset(dataset_id)
+    with db_service.get_connection() as conn:
+        remaining = conn.execute(
+            "SELECT COUNT(*) FROM column_profiles WHERE dataset_id = ?", (dataset_id,)
+        ).fetchone()[0]
+    assert remaining == 0
+
+
+def test_profile_is_backfilled_for_older_datasets(client: TestClient):
+    with db_service.get_connection() as conn:
+        conn.execute("DELETE FROM column_profiles")
+
+    response = client.get(f"/api/datasets/{db_service.DEFAULT_DATASET_ID}/profile")
+
+    assert response.status_code == 200
+    assert response.json()["columns"]
+    assert client.get("/api/datasets/missing/profile").status_code == 404
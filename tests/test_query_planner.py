@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+
+from app.services.query_planner import detect_operation, execute_plan, plan_aggregate
+
+FRAME = pd.DataFrame(
+    {
+        "name": ["Alice", "Bob", "Carol", "David", "Erin"],
+        "department": ["Engineering", "Sales", "HR", "Engineering", "HR"],
+        "salary": [120000, 90000, 95000, 115000, 85000],
+    }
+)
+
+
+def _answer(question: str):
+    plan = plan_aggregate(question, FRAME, detect_operation(question))
+    return plan, execute_plan(plan, FRAME)
+
+
+def test_count_with_value_filter():
+    plan, result = _answer("How many employees are in HR?")
+
+    assert plan.filters == {"department": ["HR"]}
+    assert result.rows == [{"count": 2}]
+    assert result.answer == "Count of rows where department = HR: 2."
+
+
+def test_average_grouped_by_column():
+    plan, result = _answer("average salary by department")
+
+    assert (plan.operation, plan.column, plan.group_by) == ("mean", "salary", "department")
+    assert result.rows == [
+        {"department": "Engineering", "mean_salary": 117500},
+        {"department": "HR", "mean_salary": 90000},
+        {"department": "Sales", "mean_salary": 90000},
+    ]
+
+
+def test_distinct_count_of_mentioned_column():
+    plan, result = _answer("How many departments are there?")
+
+    assert plan.operation == "count_distinct"
+    assert result.rows == [{"department": 3}]
+
+
+@pytest.mark.parametrize(
+    ("question", "positions"),
+    [("Who has the highest salary?", [0]), ("Which employee has the lowest salary?", [4])],
+)
+def test_who_questions_select_the_rows_holding_the_extreme(question, positions):
+    plan, result = _answer(question)
+
+    assert plan.select_rows
+    assert result.row_positions == positions
+
+
+def test_value_questions_do_not_select_rows():
+    plan, result = _answer("What is the highest salary?")
+
+    assert not plan.select_rows
+    assert result.row_positions == []
+    assert result.rows == [{"max_salary": 120000}]
+
+
+@pytest.mark.parametrize("question", ["Who works in HR?", "What is the phone number of Alice?"])
+def test_non_aggregate_questions_are_not_planned(question):
+    assert detect_operation(question) is None
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "How many employees are in Marketing?",
+        "How many people live in Tokyo?",
+        "What is the max salary in Marketing?",
+        "How many years has Alice worked here?",
+    ],
+)
+def test_terms_matching_no_column_or_value_are_not_planned(question):
+    assert plan_aggregate(question, FRAME, detect_operation(question)) is None
+
+
+def test_numeric_aggregate_without_numeric_column_is_not_planned():
+    assert plan_aggregate("average name", FRAME, "mean") is None
@@ -0,0 +1,277 @@
+import random
+from collections import Counter
+
+import pytest
+
+from app.services import db as db_service
+from app.services import retrieval
+from app.services.incidence import TokenIncidence
+from app.services.retrieval import retrieve_across_datasets, retrieve_relevant_rows
+from app.services.row_cache import RowCache, row_cache
+
+ROWS = [
+    {"name": "Asha", "department": "HR", "city": "Pune"},
+    {"name": "Chris", "department": "Engineering", "city": "Three Rivers"},
+    {"name": "Ravi", "department": "HR", "city": "Delhi"},
+]
+
+
+@pytest.fixture()
+def dataset_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_service, "SQLITE_PATH", str(tmp_path / "test.db"), raising=False)
+    db_service.init_db()
+    db_service.insert_dataset("people", "people.csv", "csv", len(ROWS), "2026-01-01T00:00:00+00:00")
+    db_service.insert_records("people", ROWS)
+    return "people"
+
+
+def test_field_values_resolve_as_exact_filters(dataset_id):
+    result = retrieve_relevant_rows(dataset_id, "Who in HR lives in Delhi?")
+
+    assert [row["row_index"] for row in result.rows] == [2]
+    assert result.filters == {"department": ["hr"], "city": ["delhi"]}
+    assert result.best_score == 2
+    assert result.question_tokens == ["hr", "lives", "delhi"]
+
+
+def test_field_filters_narrow_every_engine_and_keep_thresholds(dataset_id, monkeypatch):
+    for engine in ("fts", "vector"):
+        result = retrieve_relevant_rows(dataset_id, "Who in HR lives in Delhi?", engine=engine)
+
+        assert [row["row_index"] for row in result.rows] == [2]
+        assert result.filters == {"department": ["hr"], "city": ["delhi"]}
+
+    monkeypatch.setattr(retrieval, "VECTOR_MIN_SIMILARITY", 0.99)
+    assert retrieve_relevant_rows(dataset_id, "Who in HR lives in Delhi?", engine="vector").rows == []
+
+
+def test_filler_values_do_not_become_filters(dataset_id):
+    db_service.insert_dataset("flags", "flags.csv", "csv", 3, "2026-01-02T00:00:00+00:00")
+    db_service.insert_records(
+        "flags",
+        [
+            {"name": "Omar", "remote": "yes", "grade": "a"},
+            {"name": "Mira", "remote": "no", "grade": "b"},
+            {"name": "Lee", "remote": "yes", "grade": "b"},
+        ],
+    )
+
+    result = retrieve_relevant_rows("flags", "Is Mira a remote worker, yes or no?")
+
+    assert result.filters == {"name": ["mira"]}
+    assert [row["row_index"] for row in result.rows] == [1]
+
+
+def test_field_filters_rank_matches_by_remaining_tokens(dataset_id):
+    db_service.insert_dataset("other", "other.csv", "csv", 3, "2026-01-02T00:00:00+00:00")
+    db_service.insert_records(
+        "other",
+        [
+            {"name": "Omar", "department": "HR", "city": "Pune"},
+            {"name": "Mira", "department": "HR", "city": "New Delhi"},
+            {"name": "Lee", "department": "Sales", "city": "New Delhi"},
+        ],
+    )
+
+    result = retrieve_relevant_rows("other", "Who in HR is near Delhi?")
+
+    assert [row["row_index"] for row in result.rows] == [1, 0]
+    assert result.filters == {"department": ["hr"]}
+
+
+def test_partial_values_fall_back_to_token_scoring(dataset_id):
+    result = retrieve_relevant_rows(dataset_id, "Who lives by the rivers?")
+
+    assert [row["row_index"] for row in result.rows] == [1]
+    assert result.filters == {}
+
+
+def test_retrieval_matches_whole_terms_only(dataset_id):
+    result = retrieve_relevant_rows(dataset_id, "hr")
+
+    assert [row["row_index"] for row in result.rows] == [0, 2]
+
+
+def test_retrieval_without_matches_returns_no_rows(dataset_id):
+    result = retrieve_relevant_rows(dataset_id, "quarterly revenue")
+
+    assert result.rows == []
+    assert result.best_score == 0
+
+
+def test_federated_retrieval_merges_per_dataset_rankings_by_score(dataset_id):
+    db_service.insert_dataset("teams", "teams.csv", "csv", 2, "2026-01-02T00:00:00+00:00")
+    db_service.insert_records(
+        "teams",
+        [
+            {"team": "Platform", "focus": "search"},
+            {"team": "Rivers data", "focus": "Pune search"},
+        ],
+    )
+
+    result = retrieve_across_datasets([dataset_id, "teams"], "pune search", limit=2, engine="lexical")
+
+    # "pune search" is a whole field value in teams, "pune" alone one in people.
+    assert [(source, row["row_index"]) for source, row in result.hits] == [("teams", 1), (dataset_id, 0)]
+    assert result.results[dataset_id].scores == [1]
+    assert result.results["teams"].scores == [2]
+    assert result.filters == {"focus": ["pune search"], "city": ["pune"]}
+
+
+def test_postings_migration_backfills_existing_records(dataset_id):
+    with db_service.get_connection() as conn:
+        conn.execute("DELETE FROM record_postings WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("UPDATE schema_version SET version = 1")
+
+    db_service.init_db()
+
+    assert db_service.fetch_postings(dataset_id, ["engineering"]) == {"engineering": [1]}
+
+
+def test_field_postings_migration_backfills_existing_records(dataset_id):
+    with db_service.get_connection() as conn:
+        conn.execute("DELETE FROM field_postings WHERE dataset_id = ?", (dataset_id,))
+        conn.execute("UPDATE schema_version SET version = 7")
+
+    db_service.init_db()
+
+    assert db_service.fetch_field_postings(dataset_id, ["three rivers", "hr"]) == {
+        "hr": {"department": [0, 2]},
+        "three rivers": {"city": [1]},
+    }
+
+
+def test_fts_engine_ranks_rare_terms_first(dataset_id):
+    lexical = retrieve_relevant_rows(dataset_id, "chris hr", engine="lexical")
+    fts = retrieve_relevant_rows(dataset_id, "chris hr", engine="fts")
+
+    assert [row["row_index"] for row in lexical.rows] == [0, 1, 2]
+    assert [row["row_index"] for row in fts.rows][0] == 1
+    assert fts.best_score == lexical.best_score == 1
+
+
+def test_fts_engine_is_scoped_to_dataset(dataset_id):
+    db_service.insert_dataset("other", "other.csv", "csv", 1, "2026-01-02T00:00:00+00:00")
+    db_service.insert_records("other", [{"name": "Mira", "department": "HR"}])
+
+    result = retrieve_relevant_rows("other", "hr", engine="fts")
+
+    assert [row["row_index"] for row in result.rows] == [0]
+    assert "Mira" in result.rows[0]["row_text"]
+
+
+def test_fts_match_is_restricted_to_the_dataset(dataset_id):
+    db_service.insert_dataset("people-2", "more.csv", "csv", 1, "2026-01-02T00:00:00+00:00")
+    db_service.insert_records("people-2", [{"name": "Mira", "department": "HR"}])
+    with db_service.get_connection() as conn:
+        conn.execute("UPDATE schema_version SET version = 12")
+
+    db_service.init_db()
+
+    with db_service.get_connection() as conn:
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'records_fts'").fetchone()["sql"]
+    assert "UNINDEXED" not in sql
+    assert [row["row_index"] for row in db_service.search_fts(dataset_id, ["hr"], 5)] == [0, 2]
+    assert [row["row_text"] for row in db_service.search_fts("people-2", ["hr"], 5)] == [
+        "name: Mira | department: HR"
+    ]
+    assert db_service.search_fts(dataset_id, ["people"], 5) == []
+
+
+def test_hot_dataset_is_served_from_row_cache(dataset_id, monkeypatch):
+    retrieve_relevant_rows(dataset_id, "hr")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("SQLite should not be read for a cached dataset")
+
+    monkeypatch.setattr(retrieval, "fetch_postings", fail)
+    monkeypatch.setattr(retrieval, "fetch_rows_by_index", fail)
+    monkeypatch.setattr(retrieval, "fetch_field_postings", fail)
+    result = retrieve_relevant_rows(dataset_id, "Who in HR lives in Delhi?")
+
+    assert [row["row_index"] for row in result.rows] == [2]
+    assert result.rows[0]["record"]["city"] == "Delhi"
+    assert row_cache.stats()["hits"] >= 1
+
+
+def test_row_cache_respects_memory_budget(dataset_id):
+    small_cache = RowCache(budget_bytes=10)
+
+    assert small_cache.get(dataset_id) is None
+    assert small_cache.stats()["skipped_oversized"] == 1
+    assert RowCache(budget_bytes=1 << 20).get(dataset_id) is not None
+
+
+def test_row_cache_does_not_keep_unknown_datasets(dataset_id):
+    cache = RowCache(budget_bytes=1 << 20)
+
+    assert cache.get("missing") is None
+    assert cache.stats()["datasets"] == 0
+    cache.get(dataset_id)
+    cache.invalidate(dataset_id)
+    assert cache._build_locks == {}
+
+
+def test_row_cache_evicts_least_recently_used_dataset(dataset_id):
+    db_service.insert_dataset("other", "other.csv", "csv", 1, "2026-01-02T00:00:00+00:00")
+    db_service.insert_records("other", [{"name": "Mira", "department": "HR"}])
+    probe = RowCache(budget_bytes=1 << 20)
+    budget = probe.get(dataset_id).size_bytes + 1
+    cache = RowCache(budget_bytes=budget)
+
+    cache.get(dataset_id)
+    cache.get("other")
+
+    assert cache.peek(dataset_id) is None
+    assert cache.peek("other") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.parametrize("row_count", [40, 5000])
+def test_incidence_scorer_matches_postings_scorer(row_count):
+    rng = random.Random(row_count)
+    terms = [f"t{index}" for index in range(30)]
+    postings = {
+        term: sorted(rng.sample(range(row_count), rng.randint(1, max(1, row_count // 4)))) for term in terms
+    }
+    incidence = TokenIncidence.from_postings(postings)
+
+    for _ in range(50):
+        token_counts = Counter(rng.choices(terms + ["missing"], k=rng.randint(1, 6)))
+        limit = rng.choice([1, 3, 6, 50])
+        question_postings = {term: postings[term] for term in token_counts if term in postings}
+        assert incidence.score(token_counts, limit) == retrieval._score_postings(
+            question_postings, token_counts, limit
+        )
+
+
+
+def test_incidence_delta_matches_rebuilt_matrix():
+    rng = random.Random(3)
+    terms = [f"t{index}" for index in range(12)]
+    rows = {row_index: set(rng.sample(terms, 3)) for row_index in range(200)}
+    incidence = TokenIncidence.from_postings(_postings(rows))
+
+    for _ in range(5):
+        previous = {}
+        current = {}
+        for row_index in rng.sample(range(len(rows) + 20), 30):
+            if row_index in rows:
+                previous[row_index] = rows[row_index]
+            rows[row_index] = current[row_index] = set(rng.sample(terms, 3))
+        incidence.apply_changes(previous, current)
+
+    rebuilt = TokenIncidence.from_postings(_postings(rows))
+    assert not incidence.needs_compaction
+    for _ in range(30):
+        token_counts = Counter(rng.choices(terms, k=rng.randint(1, 4)))
+        assert incidence.score(token_counts, 10) == rebuilt.score(token_counts, 10)
+        assert incidence.posting_count(token_counts) == rebuilt.posting_count(token_counts)
+
+
+def _postings(rows: dict[int, set[str]]) -> dict[str, list[int]]:
+    postings: dict[str, list[int]] = {}
+    for row_index in sorted(rows):
+        for term in rows[row_index]:
+            postings.setdefault(term, []).append(row_index)
+    return postings
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from app.services import db as db_service
+from app.services import retrieval, vector_index
+from app.services.embeddings import embed_texts
+from app.services.retrieval import retrieve_relevant_rows
+
+ROWS = [
+    {"name": "Asha", "department": "Human Resources", "city": "Pune"},
+    {"name": "Chris", "department": "Engineering", "city": "Three Rivers"},
+    {"name": "Ravi", "department": "Finance", "city": "Delhi"},
+]
+
+
+@pytest.fixture()
+def dataset_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_service, "SQLITE_PATH", str(tmp_path / "test.db"), raising=False)
+    db_service.init_db()
+    db_service.insert_dataset("people", "people.csv", "csv", len(ROWS), "2026-01-01T00:00:00+00:00")
+    db_service.insert_records("people", ROWS)
+    return "people"
+
+
+def test_hashing_embeddings_are_deterministic_unit_vectors():
+    first = embed_texts(["department: Engineering", "city: Pune"], batch_size=1)
+    second = embed_texts(["department: Engineering", "city: Pune"])
+
+    assert first.dtype == np.float32
+    assert np.allclose(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+
+
+def test_vector_engine_embeds_lazily_and_matches_partial_words(dataset_id):
+    result = retrieve_relevant_rows(dataset_id, "Who are the engineers?", limit=1, engine="vector")
+
+    assert [row["row_index"] for row in result.rows] == [1]
+    assert len(db_service.fetch_embeddings(dataset_id)) == len(ROWS)
+
+
+def test_ivf_search_agrees_with_exact_search(monkeypatch):
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(400, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    row_indexes = np.arange(len(vectors))
+    exact = vector_index.VectorIndex(row_indexes, vectors)
+    monkeypatch.setattr(vector_index, "VECTOR_IVF_MIN_ROWS", 100)
+    monkeypatch.setattr(vector_index, "VECTOR_IVF_PROBES", 1000)
+    approximate = vector_index.VectorIndex(row_indexes, vectors)
+
+    assert exact.centroids is None
+    assert approximate.centroids is not None
+    assert approximate.search(vectors[42], 5) == exact.search(vectors[42], 5)
+    assert exact.search(vectors[42], 1)[0][0] == 42
+
+
+def test_hybrid_engine_fuses_lexical_and_vector_rankings(dataset_id):
+    lexical = retrieve_relevant_rows(dataset_id, "engineers in Delhi", engine="lexical")
+    hybrid = retrieve_relevant_rows(dataset_id, "engineers in Delhi", engine="hybrid")
+
+    assert [row["row_index"] for row in lexical.rows] == [2]
+    assert {row["row_index"] for row in hybrid.rows[:2]} == {1, 2}
+    assert 0 < hybrid.best_score <= 2 / 61
+
+
+def test_hybrid_engine_keeps_no_context_guardrail(dataset_id, monkeypatch):
+    monkeypatch.setattr(retrieval, "VECTOR_MIN_SIMILARITY", 0.99)
+    result = retrieve_relevant_rows(dataset_id, "quarterly revenue forecast", engine="hybrid")
+
+    assert result.rows == []
+
+
+def test_reembedded_rows_patch_the_loaded_index(dataset_id):
+    changed = {1: "name: Chris | department: Payroll", 3: "name: Lee | city: Oslo"}
+    loaded = vector_index.get_vector_index(dataset_id)
+    vector_index.reindex_embeddings(dataset_id, changed)
+
+    patched = vector_index.get_vector_index(dataset_id)
+    assert patched is not loaded and patched.vectors is loaded.vectors
+    assert patched.overlay_indexes.tolist() == [1, 3]
+    texts = [db_service.row_to_text(row) for row in ROWS] + [changed[3]]
+    texts[1] = changed[1]
+    reloaded = vector_index.VectorIndex(np.arange(len(texts)), embed_texts(texts))
+    query = embed_texts([changed[3]])[0]
+    assert patched.search(query, 4) == reloaded.search(query, 4)
+    assert patched.search(query, 1)[0][0] == 3
+
+
+def test_empty_index_is_not_re_embedded_on_every_search(dataset_id, monkeypatch):
+    db_service.insert_dataset("empty", "empty.csv", "csv", 0, "2026-01-01T00:00:00+00:00")
+    calls = []
+    embed_stored_rows = vector_index._embed_stored_rows
+
+    def counting_embed(target):
+        calls.append(target)
+        embed_stored_rows(target)
+
+    monkeypatch.setattr(vector_index, "_embed_stored_rows", counting_embed)
+    assert vector_index.search_vectors("empty", "engineers", 5) == []
+    assert vector_index.search_vectors("empty", "engineers", 5) == []
+
+    assert calls == ["empty"]
+
+
+def test_stored_rows_are_embedded_batch_by_batch(dataset_id, monkeypatch):
+    monkeypatch.setattr(vector_index, "EMBEDDING_BATCH_SIZE", 2)
+    batches = []
+    index_embeddings = vector_index.index_embeddings
+
+    def recording_index(target, texts, start_index=0):
+        batches.append((start_index, len(texts)))
+        index_embeddings(target, texts, start_index)
+
+    monkeypatch.setattr(vector_index, "index_embeddings", recording_index)
+    vector_index._embed_stored_rows(dataset_id)
+
+    assert batches == [(0, 2), (2, 1)]
+    assert [row_index for row_index, _ in db_service.fetch_embeddings(dataset_id)] == [0, 1, 2]